@@ -11,6 +11,10 @@ import string
 
 # Create your models here.
 
+# fixed-size avatar variants (width, height), retina is the card variant for high density screens
+AVATAR_VARIANTS = {'card': (96, 96), 'retina': (192, 192), 'detail': (256, 256)}
+
+
 def generate_random_otp_code():
     return ''.join(random.choices(string.digits, k=6))
 
@@ -63,6 +67,8 @@ class User(AbstractUser):
         ('admin', 'Admin'),
     )
     avatar = models.ImageField(upload_to='users/avatars/', null=True, blank=True)
+    # resized avatar files, generated in the background
+    avatar_variants = models.JSONField(default=dict, blank=True, editable=False)
     bio = models.TextField(null=True, blank=True)
     phone_number = models.CharField(max_length=11, unique=True, validators=[phone_regex])
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default='student')
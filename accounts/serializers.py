@@ -2,13 +2,23 @@ from rest_framework import serializers
 from rest_framework.fields import empty
 from django.contrib.auth import password_validation
 from utils.validators import phone_regex
+from utils.images import ImageVariantsField
+from utils.serializers import ValuesSerializerMixin
 from .models import Otp, User, TeacherSocialAccount
+from .tasks import send_sms_otp
 # other module
-from moviepy import VideoFileClip
-import tempfile
+from datetime import timedelta
+from decimal import Decimal
 import os
+from django.utils import timezone
+from django.db import transaction
+from utils.video import probe_file_duration
 # courses module
-from courses.models import Course, CourseHeadlines, SeasonVideos, Enrollment
+from courses.models import Course, CourseHeadlines, SeasonVideos, Enrollment, add_headline_duration
+from courses.cache import invalidate_course_document
+from courses.serializers import HlsPlaylistUrlField
+from courses.search import schedule_index_course
+from courses.tasks import probe_video_durations, package_video_hls
 
 
 class OtpRequestSerializer(serializers.Serializer):
@@ -24,7 +34,7 @@ class OtpRequestSerializer(serializers.Serializer):
         # checks otp delay
         if otp.valid_delay():
             otp.regenerate_otp()
-            otp.send_sms_otp()
+            send_sms_otp.enqueue(otp_id=otp.pk)
         else:
             raise serializers.ValidationError({'message': 'Otp code has not expired'})
         return otp
@@ -196,9 +206,12 @@ class SeasonVideoSerializer(serializers.ModelSerializer):
     of the course associated with the headline, and also calculates the video's duration.
     """
 
+    hls_playlist_url = HlsPlaylistUrlField()  # Adaptive-bitrate master playlist
+
     class Meta:
         model = SeasonVideos
-        fields = ['headline', 'video_title', 'video_file', 'description', 'attached_file', 'duration']
+        fields = ['headline', 'video_title', 'video_file', 'description', 'attached_file', 'duration',
+                  'hls_status', 'hls_playlist_url']
 
     def validate(self, data):
         """
@@ -214,7 +227,7 @@ class SeasonVideoSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         """
-        Creates a new season video, calculates the video duration, and deletes the temporary video file.
+        Creates a new season video with the duration read from the video container.
         """
         return self._set_video_duration(validated_data)
 
@@ -223,46 +236,95 @@ class SeasonVideoSerializer(serializers.ModelSerializer):
         Updates an existing season video, recalculates the video duration if the video file is changed.
         """
         video_file = validated_data.get('video_file', None)
+        duration = None
         if video_file:
-            validated_data['duration'] = self._calculate_video_duration(video_file)
-        return super().update(instance, validated_data)
+            duration = self._calculate_video_duration(video_file)
+            validated_data['duration'] = duration or 0
+        instance = super().update(instance, validated_data)
+
+        if video_file and duration is None:
+            probe_video_durations.enqueue(video_ids=[instance.pk])
+        return instance
 
     def _set_video_duration(self, validated_data):
         """
         Sets the video duration during creation.
         """
         video_file = validated_data.get('video_file')
-        duration = 0
-
-        if video_file:
-            duration = self._calculate_video_duration(video_file)
+        validated_data.pop('duration', None)
+        duration = self._calculate_video_duration(video_file) if video_file else 0
 
         # save video with calculated duration
-        season_video = SeasonVideos.objects.create(duration=duration, **validated_data)
+        season_video = SeasonVideos.objects.create(duration=duration or 0, **validated_data)
+
+        if duration is None:
+            probe_video_durations.enqueue(video_ids=[season_video.pk])
         return season_video
 
     def _calculate_video_duration(self, video_file):
         """
-        Calculates the duration of the video file and returns it.
+        Reads the duration of the video file from its container metadata.
+        Returns None for formats that must be decoded, they are probed by a background job.
         """
-        duration = 0
-        try:
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as temp_video:
-                temp_video.write(video_file.read())  # write file in temporary memory
-                temp_video_path = temp_video.name  # get the temporary file path
+        return probe_file_duration(video_file)
 
-            # calculate video duration
-            clip = VideoFileClip(temp_video_path)
-            duration = clip.duration
-            clip.close()
-            # delete file from temporary memory
-            os.remove(temp_video_path)
 
-            duration = round(duration / 60, 2)
-        except Exception as e:
-            print(f"Error processing video file: {e}")
+class BulkSeasonVideoSerializer(serializers.Serializer):
+    """
+    Serializer for uploading many videos to a headline in a single request.
+    The video durations are read from the container metadata, the videos are inserted with one bulk insert
+    and the headline and course durations are updated once. Videos that must be decoded are probed
+    in parallel by a single background job.
+    """
+    headline = serializers.PrimaryKeyRelatedField(queryset=CourseHeadlines.objects.select_related('course'))
+    videos = serializers.ListField(child=serializers.FileField(), allow_empty=False)
+    titles = serializers.ListField(child=serializers.CharField(max_length=200), required=False)
+    is_free = serializers.BooleanField(default=False)
 
-        return duration
+    def validate(self, data):
+        """
+        Validates that the authenticated user is the instructor of the course associated with the headline.
+        """
+        teacher = self.context['request'].user
+        if data['headline'].course.teacher != teacher:
+            raise serializers.ValidationError({'error : ': 'You are not the instructor of this course'})
+
+        titles = data.get('titles')
+        if titles is not None and len(titles) != len(data['videos']):
+            raise serializers.ValidationError({'titles': 'Provide one title per video'})
+        return data
+
+    def create(self, validated_data):
+        headline = validated_data['headline']
+        videos = validated_data['videos']
+        # without titles the file names are used
+        titles = validated_data.get('titles') or [
+            os.path.splitext(video.name)[0].replace('_', ' ')[:200] for video in videos
+        ]
+
+        # only the container headers are read here, serially: a few small reads per file, cheaper than
+        # a process pool. The files that must be decoded are probed on a pool by `probe_video_durations`.
+        durations = [probe_file_duration(video) for video in videos]
+
+        season_videos = [
+            SeasonVideos(headline=headline, video_title=title, video_file=video, duration=duration or 0,
+                         is_free=validated_data['is_free'])
+            for title, video, duration in zip(titles, videos, durations)
+        ]
+        with transaction.atomic():
+            season_videos = SeasonVideos.objects.bulk_create(season_videos)
+            # bulk_create skips save() and signals
+            add_headline_duration(headline.pk, sum(Decimal(str(duration or 0)) for duration in durations))
+
+            pending = [video.pk for video, duration in zip(season_videos, durations) if duration is None]
+            if pending:
+                probe_video_durations.enqueue(video_ids=pending)
+            for video in season_videos:
+                package_video_hls.enqueue(video_id=video.pk)
+
+        invalidate_course_document(headline.course_id)
+        schedule_index_course(headline.course_id)
+        return season_videos
 
 
 class TeacherSocialAccountSerializer(serializers.ModelSerializer):
@@ -285,9 +347,11 @@ class TeacherProfileSerializer(serializers.ModelSerializer):
     Ensures email uniqueness across users except for the current user.
     """
 
+    avatar_variants = ImageVariantsField(image_field='avatar')  # Resized avatar URLs
+
     class Meta:
         model = User
-        fields = ['avatar', 'username', 'first_name', 'last_name', 'bio', 'email']
+        fields = ['avatar', 'avatar_variants', 'username', 'first_name', 'last_name', 'bio', 'email']
 
     def validate_email(self, value):
         user = self.context['request'].user
@@ -295,13 +359,36 @@ class TeacherProfileSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("This email is already taken.")
         return value
 
+
+class TeacherDashboardQuerySerializer(serializers.Serializer):
+    """
+    Validates the date range of the teacher dashboard, the last 30 days by default.
+    The range is bounded so the dashboard reads a bounded number of rollup rows.
+    """
+    DEFAULT_DAYS = 30
+    MAX_DAYS = 366
+
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+
+    def validate(self, data):
+        end = data.get('end') or timezone.localdate()
+        start = data.get('start') or end - timedelta(days=self.DEFAULT_DAYS - 1)
+        if start > end:
+            raise serializers.ValidationError({'message': 'start must not be after end'})
+        if (end - start).days >= self.MAX_DAYS:
+            raise serializers.ValidationError({'message': f'The range can not exceed {self.MAX_DAYS} days'})
+        return {'start': start, 'end': end}
+
 # ---------------------------------- end teacher panel -------------------------------------------------------------
 
-class EnrollmentSerializer(serializers.ModelSerializer):
+class EnrollmentSerializer(ValuesSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for displaying enrollment details including course, student, and purchase time.
     Formats the 'purchased_at' field for better readability.
     """
+    PURCHASED_AT_FORMAT = '%m/%d/%Y %H:%M'
+
     course = serializers.StringRelatedField()
     student = serializers.StringRelatedField()
     purchased_at = serializers.SerializerMethodField()
@@ -309,9 +396,15 @@ class EnrollmentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Enrollment
         fields = ['student', 'course', 'purchased_at']
+        values_sources = {
+            'student': 'student__username',
+            'course': ('course__title', 'course__teacher__username', Course.format_label),
+            'purchased_at': ('purchased_at', lambda purchased_at: purchased_at.strftime(
+                EnrollmentSerializer.PURCHASED_AT_FORMAT)),
+        }
 
     def get_purchased_at(self, obj):
-        return obj.purchased_at.strftime('%m/%d/%Y %H:%M')
+        return obj.purchased_at.strftime(self.PURCHASED_AT_FORMAT)
 
 
 class UserInfoSerializer(serializers.ModelSerializer):
@@ -319,9 +412,11 @@ class UserInfoSerializer(serializers.ModelSerializer):
     Serializer for displaying and validating user profile information.
     Ensures the email is unique among users except for the current user.
     """
+    avatar_variants = ImageVariantsField(image_field='avatar')  # Resized avatar URLs
+
     class Meta:
         model = User
-        fields = ['avatar', 'username', 'first_name', 'last_name', 'bio', 'email']
+        fields = ['avatar', 'avatar_variants', 'username', 'first_name', 'last_name', 'bio', 'email']
 
     def validate_email(self, value):
         user = self.context['request'].user
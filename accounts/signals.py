@@ -0,0 +1,34 @@
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.db.models.functions import Now
+from django.dispatch import receiver
+
+from utils.images import needs_variants, remember_image_variants, delete_image_variants_on_commit
+
+from courses.cache import invalidate_course_document
+from courses.models import Course
+
+from .models import User
+from .tasks import generate_avatar_variants
+
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(sender, instance, **kwargs):
+    if kwargs.get('signal') is post_save:
+        update_fields = kwargs.get('update_fields')
+        if instance.is_teacher() and (update_fields is None or 'username' in update_fields):
+            # the teacher name is part of the course documents and lists
+            course_ids = list(instance.courses.values_list('id', flat=True))
+            if course_ids:
+                Course.objects.filter(pk__in=course_ids).update(updated=Now())
+                for course_id in course_ids:
+                    invalidate_course_document(course_id)
+        if (update_fields is None or 'avatar' in update_fields) and \
+                needs_variants(instance, 'avatar', 'avatar_variants'):
+            generate_avatar_variants.enqueue(user_id=instance.pk)
+    else:
+        delete_image_variants_on_commit(instance, 'avatar', 'avatar_variants')
+
+
+@receiver(pre_delete, sender=User)
+def user_deleting(sender, instance, **kwargs):
+    remember_image_variants(instance, 'avatar_variants')
@@ -0,0 +1,24 @@
+from jobs.queue import task
+from utils.images import build_image_variants, needs_variants
+
+from .models import Otp, User, AVATAR_VARIANTS
+
+
+@task
+def send_sms_otp(otp_id):
+    """
+    Sends the otp code by sms.
+    """
+    otp = Otp.objects.filter(pk=otp_id).first()
+    if otp is not None:
+        otp.send_sms_otp()
+
+
+@task
+def generate_avatar_variants(user_id):
+    """
+    Generates the card, retina and detail variants of a user avatar.
+    """
+    user = User.objects.filter(pk=user_id).first()
+    if user is not None and needs_variants(user, 'avatar', 'avatar_variants'):
+        build_image_variants(user, 'avatar', 'avatar_variants', AVATAR_VARIANTS)
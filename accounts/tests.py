@@ -1,3 +1,140 @@
-from django.test import TestCase
+import datetime
+import decimal
+import io
+import uuid
 
-# Create your tests here.
+import orjson
+from django.test import SimpleTestCase, TestCase, RequestFactory
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.permissions import AllowAny
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+from rest_framework.views import APIView
+
+from courses.models import Category, Course, Enrollment
+from courses.serializers import CourseListSerializer
+from order.models import Order, OrderItem
+from order.serializers import OrderListSerializer
+from utils.renderers import ORJSONParser, ORJSONRenderer
+from .models import User
+from .serializers import EnrollmentSerializer
+
+
+class ValuesSerializersParityTest(TestCase):
+    """
+    The values() read mode of the account list serializers must render the same bytes as the instance mode.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user(phone_number='09120000001', password='x', username='teacher',
+                                               role='teacher')
+        cls.student = User.objects.create_user(phone_number='09120000002', password='x', username='student')
+        category = Category.objects.create(name='Python', slug='python')
+        courses = [
+            Course.objects.create(
+                category=category, teacher=cls.teacher, thumbnail=f'courses/images/thumbnail/{index}.png',
+                title=f'Course {index}', description='d', slug=f'course-{index}', price=1000 * index,
+                release_status='published',
+            )
+            for index in range(1, 4)
+        ]
+        for course in courses[:2]:
+            Enrollment.objects.create(student=cls.student, course=course)
+
+        paid = Order.objects.create(student=cls.student, is_paid=True, total_cost=3000)
+        OrderItem.objects.create(order=paid, course=courses[0], price=1000)
+        OrderItem.objects.create(order=paid, course=courses[1], price=2000)
+        Order.objects.create(student=cls.student)  # without items
+        cls.request = Request(RequestFactory().get('/accounts/user/orders/'))
+
+    def assertParity(self, serializer_class, queryset):
+        context = {'request': self.request}
+        expected = serializer_class(queryset, many=True, context=context).data
+        actual = serializer_class.values_data(queryset, context=context)
+        self.assertTrue(actual)
+        self.assertEqual(JSONRenderer().render(actual), JSONRenderer().render(expected))
+
+    def test_enrollments(self):
+        self.assertParity(EnrollmentSerializer, Enrollment.objects.filter(student=self.student).order_by('pk'))
+
+    def test_orders(self):
+        self.assertParity(OrderListSerializer, Order.objects.filter(student=self.student))
+
+    def test_teacher_courses(self):
+        self.assertParity(CourseListSerializer, Course.objects.filter(teacher=self.teacher).order_by('pk'))
+
+
+class EchoView(APIView):
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        return Response({'title': 'Python', 'price': decimal.Decimal('10.50')})
+
+    def post(self, request):
+        return Response(request.data)
+
+
+class ORJSONRendererTest(SimpleTestCase):
+    """
+    The orjson renderer and parser must behave like DRF's JSONRenderer and JSONParser.
+    """
+
+    def test_parity_with_json_renderer(self):
+        data = {
+            'decimal': decimal.Decimal('12.50'),
+            'datetime': datetime.datetime(2024, 1, 2, 3, 4, 5, 123456, tzinfo=datetime.timezone.utc),
+            'whole_second': datetime.datetime(2024, 1, 2, 3, 4, 5, tzinfo=datetime.timezone.utc),
+            'naive': datetime.datetime(2024, 1, 2, 3, 4, 5),
+            'date': datetime.date(2024, 1, 2),
+            'time': datetime.time(3, 4, 5),
+            'timedelta': datetime.timedelta(seconds=90),
+            'uuid': uuid.UUID(int=5),
+            'lazy': gettext_lazy('Course not found'),
+            'text': 'آموزش پایتون',
+            'numbers': [1, 2.5, True, None],
+            'keys': {1: 'one'},
+        }
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(ORJSONRenderer().render(None), JSONRenderer().render(None))
+
+    def test_indent(self):
+        # orjson indents with two spaces, whatever the requested width
+        data, indented = {'courses': [1]}, b'{\n  "courses": [\n    1\n  ]\n}'
+        for media_type in ('application/json; indent=4', 'application/json; indent=2; charset=utf-8'):
+            self.assertEqual(ORJSONRenderer().render(data, media_type), indented)
+        self.assertEqual(ORJSONRenderer().render(data, 'application/json', {'indent': 4}), indented)
+        for media_type in ('application/json', 'application/json; indent=0', 'application/json; indent=x'):
+            self.assertEqual(ORJSONRenderer().render(data, media_type), b'{"courses":[1]}')
+
+    def test_accepted_media_type(self):
+        factory = APIRequestFactory()
+        response = EchoView.as_view()(factory.get('/', HTTP_ACCEPT='application/json; indent=4'))
+        response.render()
+        self.assertEqual(orjson.loads(response.content), {'title': 'Python', 'price': 10.5})
+        self.assertIn(b'\n  "title"', response.content)
+
+        response = EchoView.as_view()(factory.get('/'))
+        response.render()
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(response.content, b'{"title":"Python","price":10.5}')
+
+    def test_parse(self):
+        data = {'title': 'آموزش', 'ids': [1, 2]}
+        self.assertEqual(ORJSONParser().parse(io.BytesIO(orjson.dumps(data))), data)
+        for body in (b'{"title": ', b'{title: 1}', b'\xff\xfe', b''):
+            with self.assertRaises(ParseError, msg=body):
+                ORJSONParser().parse(io.BytesIO(body))
+
+    def test_malformed_body_is_a_bad_request(self):
+        factory = APIRequestFactory()
+        request = factory.post('/', b'{"course_id": 1,', content_type='application/json')
+        response = EchoView.as_view()(request)
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(response.data['detail'].startswith('JSON parse error'))
+
+        request = factory.post('/', orjson.dumps({'course_id': 1}), content_type='application/json')
+        self.assertEqual(EchoView.as_view()(request).data, {'course_id': 1})
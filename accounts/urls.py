@@ -24,6 +24,7 @@ urlpatterns = [
     path('teacher/info/', views.TeacherInfoView.as_view(), name='teacher_info'),
 
     path('teacher/courses/', views.TeacherCoursesListView.as_view(), name='teacher_courses'),
+    path('teacher/dashboard/', views.TeacherDashboardView.as_view(), name='teacher_dashboard'),
 
 
     # user dashboard
@@ -1,15 +1,19 @@
 # django
+from django.db.models import Sum
 from django.shortcuts import get_object_or_404
 # rest framework
 from rest_framework.exceptions import PermissionDenied
 from rest_framework.response import Response
 from rest_framework import views, status, permissions, viewsets
+from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
 from rest_framework_simplejwt.tokens import RefreshToken
 
 # this app serializers
 from .serializers import OtpRequestSerializer, OtpVerificationSerializer, ResetPasswordSerializer, \
     ChangePhoneNumberSerializer, CourseSerializer, HeadlineSerializer, SeasonVideoSerializer, \
-    TeacherProfileSerializer, TeacherSocialAccountSerializer, EnrollmentSerializer, UserInfoSerializer
+    BulkSeasonVideoSerializer, TeacherProfileSerializer, TeacherSocialAccountSerializer, EnrollmentSerializer, \
+    UserInfoSerializer, TeacherDashboardQuerySerializer
 from .models import User, TeacherSocialAccount
 # utils
 from utils.permissions import IsTeacher
@@ -19,7 +23,8 @@ from courses.models import Course, CourseHeadlines, SeasonVideos, Enrollment
 from courses.serializers import CourseDetailSerializer, CourseListSerializer
 
 # orders
-from order.models import Order
+from order.models import Order, DailyCourseSales
+from order.pagination import OrderCursorPagination
 from order.serializers import OrderListSerializer
 
 
@@ -153,6 +158,18 @@ class SeasonVideoViewSet(BaseViewSet):
     serializer_class = SeasonVideoSerializer
     queryset = SeasonVideos.objects.all()
 
+    @action(detail=False, methods=['post'], url_path='bulk-upload', parser_classes=[MultiPartParser],
+            serializer_class=BulkSeasonVideoSerializer)
+    def bulk_upload(self, request):
+        """
+        Uploads many videos to a headline in a single multipart request.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        season_videos = serializer.save()
+        return Response({'message': f'{len(season_videos)} videos {self.create_message}'},
+                        status=status.HTTP_201_CREATED)
+
 
 class TeacherInfoView(views.APIView):
     """
@@ -220,8 +237,41 @@ class TeacherCoursesListView(views.APIView):
 
     def get(self, request):
         courses = Course.objects.filter(teacher=request.user)
-        serializer = CourseListSerializer(courses, many=True, context={'request': request})
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        data = CourseListSerializer.values_data(courses, context={'request': request})
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class TeacherDashboardView(views.APIView):
+    """
+    Returns the teacher's sales and revenue over a date range, per day and per course.
+    Read from the daily sales rollups, one row per course and day with sales.
+    """
+    permission_classes = [permissions.IsAuthenticated, IsTeacher]
+
+    def get(self, request):
+        query = TeacherDashboardQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        start, end = query.validated_data['start'], query.validated_data['end']
+
+        rollups = DailyCourseSales.objects.filter(teacher=request.user, day__range=(start, end)).order_by()
+        days = list(rollups.values('day').annotate(sales_count=Sum('sales_count'), revenue=Sum('revenue'))
+                    .order_by('day'))
+        courses = list(
+            rollups.values('course', 'course__title', 'course__slug')
+            .annotate(sales_count=Sum('sales_count'), revenue=Sum('revenue')).order_by('-revenue', 'course')
+        )
+        return Response({
+            'start': start,
+            'end': end,
+            'sales_count': sum(day['sales_count'] for day in days),
+            'revenue': sum(day['revenue'] for day in days),
+            'days': days,
+            'courses': [
+                {'id': row['course'], 'title': row['course__title'], 'slug': row['course__slug'],
+                 'sales_count': row['sales_count'], 'revenue': row['revenue']}
+                for row in courses
+            ],
+        }, status=status.HTTP_200_OK)
 
 
 # - - - - - - - - - - - - - - - - - - - - - - - - user views  - - - - - - - - - - - - - - - - - - - - - - - - - -
@@ -253,18 +303,21 @@ class UserEnrollmentsView(views.APIView):
 
     def get(self, request, *args, **kwargs):
         enrollments = Enrollment.objects.filter(student_id=request.user.id)
-        serializer = self.serializer_class(enrollments, many=True, context={'request': request})
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        data = self.serializer_class.values_data(enrollments, context={'request': request})
+        return Response(data, status=status.HTTP_200_OK)
 
 
 class UserOrdersView(views.APIView):
     """
-    Fetches the list of orders made by the authenticated user.
+    Fetches the list of orders made by the authenticated user, newest first and paginated.
+    Served from values() queries, the items are loaded with one more query.
     """
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = OrderListSerializer
 
     def get(self, request, *args, **kwargs):
         orders = Order.objects.filter(student_id=request.user.id)
-        serializer = self.serializer_class(orders, many=True, context={'request': request})
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        compiler = self.serializer_class.get_values_compiler(context={'request': request})
+        paginator = OrderCursorPagination()
+        page = paginator.paginate_queryset(compiler.values(orders, extra=['created', 'id']), request, view=self)
+        return paginator.get_paginated_response(compiler.represent(page))
@@ -0,0 +1,117 @@
+"""
+Compares DRF's JSONRenderer / JSONParser with the orjson backed ones on a course detail document.
+
+The document is the CourseDetailSerializer output of an in-memory course, with the full curriculum
+(CourseHeadlineSerializer with videos) in place of the headline summaries, so no database is needed.
+
+Usage:
+    python benchmarks/json_rendering.py [--headlines 40] [--videos 25] [--repeat 200]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'love_code_learn.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.test import RequestFactory  # noqa: E402
+from django.utils import timezone  # noqa: E402
+from rest_framework.parsers import JSONParser  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+from rest_framework.request import Request  # noqa: E402
+
+from accounts.models import User  # noqa: E402
+from courses.models import Category, Course, CourseHeadlines, CourseSubDescription, SeasonVideos  # noqa: E402
+from courses.serializers import CourseDetailSerializer, CourseHeadlineSerializer  # noqa: E402
+from utils.renderers import ORJSONRenderer, ORJSONParser  # noqa: E402
+
+
+class CurriculumDetailSerializer(CourseDetailSerializer):
+    """
+    The course detail with every headline and video, read from the prefetch cache.
+    """
+
+    def get_headlines(self, obj):
+        return CourseHeadlineSerializer(instance=obj.headlines.all(), many=True, context=self.context).data
+
+
+def build_course(headline_count, video_count):
+    now = timezone.now()
+    teacher = User(id=1, username='teacher', phone_number='09120000000', role='teacher')
+    course = Course(
+        id=1, category=Category(id=1, name='Python', slug='python'), teacher=teacher,
+        thumbnail='courses/images/thumbnail/python.png', title='Python from zero to hero',
+        description='A long course description. ' * 40, slug='python-from-zero-to-hero', price=2_500_000,
+        off=Decimal('250.00'), final_price=2_499_750, duration=Decimal('1234.56'), release_status='published',
+        created=now - timedelta(days=30), updated=now, rating_count=120, rating_sum=540,
+    )
+    sub_descriptions = [
+        CourseSubDescription(id=index, course=course, sub_title=f'What you learn {index}',
+                             sub_description='Sub description text. ' * 20, updated=now)
+        for index in range(1, 6)
+    ]
+    headlines = []
+    for number in range(1, headline_count + 1):
+        headline = CourseHeadlines(id=number, course=course, headline_title=f'Chapter {number}',
+                                   chapter_number=number, duration=Decimal('45.30'), updated=now)
+        videos = [
+            SeasonVideos(id=number * 1000 + index, headline=headline, video_title=f'Lesson {number}.{index}',
+                         video_file=f'courses/videos/chapter_{number}/lesson_{index}.mp4',
+                         description='Lesson description. ' * 5, duration=Decimal('12.75'), is_free=index == 1,
+                         updated=now)
+            for index in range(1, video_count + 1)
+        ]
+        headline._prefetched_objects_cache = {'videos': videos}
+        headlines.append(headline)
+    course._prefetched_objects_cache = {'sub_descriptions': sub_descriptions, 'headlines': headlines}
+    return course
+
+
+def measure(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--headlines', type=int, default=40)
+    parser.add_argument('--videos', type=int, default=25)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    request = Request(RequestFactory().get('/courses/python-from-zero-to-hero', HTTP_HOST='localhost'))
+    course = build_course(args.headlines, args.videos)
+    data = CurriculumDetailSerializer(instance=course, context={'request': request}).data
+
+    drf_body = JSONRenderer().render(data)
+    orjson_body = ORJSONRenderer().render(data)
+    print(f'document: {args.headlines} headlines x {args.videos} videos, {len(drf_body) / 1024:.0f} KiB')
+    print(f'identical output: {drf_body == orjson_body}')
+
+    results = [
+        ('render', 'JSONRenderer', measure(lambda: JSONRenderer().render(data), args.repeat)),
+        ('render', 'ORJSONRenderer', measure(lambda: ORJSONRenderer().render(data), args.repeat)),
+        ('parse', 'JSONParser', measure(lambda: JSONParser().parse(BytesIO(drf_body)), args.repeat)),
+        ('parse', 'ORJSONParser', measure(lambda: ORJSONParser().parse(BytesIO(drf_body)), args.repeat)),
+    ]
+    print(f'{"":8}{"implementation":<16}{"median ms":>10}')
+    for operation, name, median in results:
+        print(f'{operation:<8}{name:<16}{median:>10.3f}')
+    print(f'render speedup: {results[0][2] / results[1][2]:.1f}x, parse speedup: {results[2][2] / results[3][2]:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
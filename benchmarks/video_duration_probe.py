@@ -0,0 +1,74 @@
+"""
+Compares the memory and latency of the video duration probes.
+
+    legacy: reads the whole upload into memory, writes a temporary copy and decodes it with moviepy
+    header: reads only the container metadata (MP4/MOV `moov/mvhd`, Matroska/WebM segment info)
+
+Usage:
+    python benchmarks/video_duration_probe.py path/to/video.mp4 [path/to/other.webm ...] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.video import probe_file_duration  # noqa: E402
+
+
+def legacy_probe(path):
+    """
+    The previous SeasonVideoSerializer._calculate_video_duration implementation.
+    """
+    from moviepy import VideoFileClip
+
+    with open(path, 'rb') as video_file:
+        with tempfile.NamedTemporaryFile(delete=False, suffix='.mp4') as temp_video:
+            temp_video.write(video_file.read())
+            temp_video_path = temp_video.name
+    clip = VideoFileClip(temp_video_path)
+    duration = clip.duration
+    clip.close()
+    os.remove(temp_video_path)
+    return round(duration / 60, 2)
+
+
+def header_probe(path):
+    with open(path, 'rb') as video_file:
+        return probe_file_duration(video_file)
+
+
+def measure(probe, path, repeat):
+    timings = []
+    peak = 0
+    result = None
+    for _ in range(repeat):
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = probe(path)
+        timings.append(time.perf_counter() - start)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return result, min(timings), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='+')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'file':<40} {'probe':<8} {'minutes':>8} {'best ms':>10} {'peak KiB':>10}")
+    for path in args.paths:
+        size = os.path.getsize(path)
+        for name, probe in (('legacy', legacy_probe), ('header', header_probe)):
+            result, best, peak = measure(probe, path, args.repeat)
+            label = f'{os.path.basename(path)} ({size / 1024 / 1024:.1f} MiB)'
+            print(f'{label:<40} {name:<8} {str(result):>8} {best * 1000:>10.2f} {peak / 1024:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Cart, CartItem
+from .models import Cart, CartItem, IdempotencyKey, get_cart_total
 # Register your models here.
 
 
@@ -10,4 +10,19 @@ class CartItemInline(admin.TabularInline):
 @admin.register(Cart)
 class CartAdmin(admin.ModelAdmin):
     list_display = ['user', 'cart_total_price']
+    list_select_related = ['user']
     inlines = [CartItemInline]
+
+    def get_queryset(self, request):
+        # the totals of the listed carts are computed in the list query
+        return super().get_queryset(request).annotate(total_price=get_cart_total())
+
+    @admin.display(description='cart total price', ordering='total_price')
+    def cart_total_price(self, obj):
+        return obj.cart_total_price
+
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ['key', 'user', 'status_code', 'created']
+    raw_id_fields = ['user']
@@ -0,0 +1,101 @@
+import functools
+import hashlib
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+def purge_idempotency_keys():
+    """
+    Deletes the keys older than IDEMPOTENCY_KEY_TTL, returns their number.
+    """
+    expired = timezone.now() - settings.IDEMPOTENCY_KEY_TTL
+    deleted, _ = IdempotencyKey.objects.filter(created__lt=expired).delete()
+    return deleted
+
+
+def idempotent(method):
+    """
+    Makes an authenticated APIView handler idempotent when the client sends an `Idempotency-Key` header.
+
+    The first request claims the key and runs the handler, its successful response is stored and replayed
+    for the repeated requests without running the handler again. A repeated request arriving while the first
+    one is in flight gets a 409, a key reused with another method, path or body gets a 422.
+    Failed responses are not stored, the key is released so the request can be retried.
+    """
+
+    @functools.wraps(method)
+    def wrapper(view, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if key is None:
+            return method(view, request, *args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return Response({'message': f'{IDEMPOTENCY_HEADER} must be 1 to {MAX_KEY_LENGTH} characters'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        fingerprint = hashlib.sha256(b'\n'.join(
+            [request.method.encode(), request.path.encode(), request.body]
+        )).hexdigest()
+        record, response = claim_key(request.user, key, fingerprint)
+        if response is not None:
+            return response
+
+        try:
+            response = method(view, request, *args, **kwargs)
+        except Exception:
+            record.delete()
+            raise
+
+        if status.is_success(response.status_code):
+            record.status_code = response.status_code
+            record.response_body = response.data
+            record.save(update_fields=['status_code', 'response_body'])
+        else:
+            record.delete()
+        return response
+
+    return wrapper
+
+
+def claim_key(user, key, fingerprint):
+    """
+    Returns (record, None) when the request owns the key and must run the handler,
+    (None, response) when the response to send is already known.
+    """
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(user=user, key=key, fingerprint=fingerprint, created=now), None
+    except IntegrityError:
+        pass
+
+    record = IdempotencyKey.objects.filter(user=user, key=key).first()
+    if record is None:
+        # released by a failed request meanwhile
+        return claim_key(user, key, fingerprint)
+    if record.fingerprint != fingerprint:
+        return None, Response({'message': f'{IDEMPOTENCY_HEADER} was already used for another request'},
+                              status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    if record.status_code is not None:
+        response = Response(record.response_body, status=record.status_code)
+        response['Idempotent-Replayed'] = 'true'
+        return None, response
+
+    # the first request died without releasing the key, take it over
+    if record.created < now - settings.IDEMPOTENCY_LOCK_TIMEOUT and IdempotencyKey.objects.filter(
+            pk=record.pk, status_code__isnull=True, created=record.created).update(created=now):
+        record.created = now
+        return record, None
+
+    response = Response({'message': 'A request with this Idempotency-Key is in progress'},
+                        status=status.HTTP_409_CONFLICT)
+    response['Retry-After'] = '1'
+    return None, response
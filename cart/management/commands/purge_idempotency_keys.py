@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from cart.idempotency import purge_idempotency_keys
+
+
+class Command(BaseCommand):
+    help = 'Deletes the idempotency keys older than IDEMPOTENCY_KEY_TTL, run it periodically.'
+
+    def handle(self, *args, **options):
+        deleted = purge_idempotency_keys()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired idempotency keys.'))
@@ -1,4 +1,7 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.db.models import Sum, Value
+from django.db.models.functions import Coalesce
 from accounts.models import User
 from courses.models import Course
 
@@ -19,9 +22,22 @@ class Cart(models.Model):
     @property
     def cart_total_price(self):
         """
-        The sum total of the cart prices
+        The sum total of the cart prices.
+        Read from the `total_price` annotation (see get_cart_total) or the prefetched items with their courses
+        when present, otherwise computed with one aggregate query.
         """
-        return sum(item.course.final_price for item in self.items.all())
+        if hasattr(self, 'total_price'):
+            return self.total_price
+        if 'items' in getattr(self, '_prefetched_objects_cache', {}):
+            return sum(item.course.final_price for item in self.items.all())
+        return self.items.aggregate(total=Coalesce(Sum('course__final_price'), Value(0)))['total']
+
+
+def get_cart_total():
+    """
+    Returns the sum of the course prices of the outer cart, annotate it as `total_price`.
+    """
+    return Coalesce(Sum('items__course__final_price'), Value(0))
 
 
 class CartItem(models.Model):
@@ -30,4 +46,35 @@ class CartItem(models.Model):
     This Model is used the cart item
     """
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='items')
-    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='cart_courses')
\ No newline at end of file
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='cart_courses')
+
+    class Meta:
+        constraints = [
+            # a course is in a cart at most once, concurrent adds can not duplicate it
+            models.UniqueConstraint(fields=['cart', 'course'], name='cart_item_unique'),
+        ]
+
+
+class IdempotencyKey(models.Model):
+    """
+    The response of a cart mutation sent with an `Idempotency-Key` header, replayed for the repeated requests.
+    A key without a status code belongs to a request still in flight.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=255)
+    # hash of the method, path and body, a key reused for another request is rejected
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response_body = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    created = models.DateTimeField()
+
+    def __str__(self):
+        return self.key
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='idempotency_key_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['created'], name='idempotency_key_created_idx'),
+        ]
@@ -1,8 +1,12 @@
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import serializers
 from .models import Cart, CartItem
 
+from courses.counters import add_students
 from courses.models import Course, Enrollment
 from order.models import Order, OrderItem
+from order.rollups import add_sales
 
 class CartItemSerializer(serializers.ModelSerializer):
     course = serializers.SerializerMethodField()
@@ -24,46 +28,85 @@ class CartSerializer(serializers.ModelSerializer):
         fields = ['id', 'user', 'items', 'cart_total_price']
 
 
-class UpdateCartSerializer(serializers.Serializer):
+class CartOperationSerializer(serializers.Serializer):
     """
-    Serializer for updating cart.
-    Supported add and remove actions.
+    A single add or remove action on the cart.
     """
     course_id = serializers.IntegerField()
     action = serializers.ChoiceField(choices=['add', 'remove'])
 
-    def validate(self, data):
-        course_id = data.get('course_id')
 
-        try:
-            Course.objects.get(id=course_id)
-        except Course.DoesNotExist:
+class UpdateCartSerializer(serializers.Serializer):
+    """
+    Serializer for updating cart.
+    Supported add and remove actions, either a single one:
+
+        {"course_id": 1, "action": "add"}
+
+    or a list of them applied together, the last action on a course wins:
+
+        {"operations": [{"course_id": 1, "action": "add"}, {"course_id": 2, "action": "remove"}]}
+
+    All the courses are checked with one query, additions are inserted and counted with two queries and removals
+    deleted with one query.
+    """
+    MAX_OPERATIONS = 100
+
+    course_id = serializers.IntegerField(required=False)
+    action = serializers.ChoiceField(choices=['add', 'remove'], required=False)
+    operations = CartOperationSerializer(many=True, required=False)
+
+    def validate(self, data):
+        operations = data.get('operations')
+        if operations is None:
+            if 'course_id' not in data or 'action' not in data:
+                raise serializers.ValidationError({'message': 'course_id and action, or operations, are required'})
+            operations = [{'course_id': data['course_id'], 'action': data['action']}]
+        elif not operations:
+            raise serializers.ValidationError({'operations': 'At least one operation is required'})
+        elif len(operations) > self.MAX_OPERATIONS:
+            raise serializers.ValidationError({'operations': f'At most {self.MAX_OPERATIONS} operations are allowed'})
+
+        actions = {operation['course_id']: operation['action'] for operation in operations}
+        found = set(Course.objects.filter(id__in=actions).values_list('id', flat=True))
+        if len(found) != len(actions):
             raise serializers.ValidationError({'message': 'Course Not Found'})
 
-        return data
+        return {'actions': actions, 'single': 'operations' not in data}
 
     def update(self, instance, validated_data):
         cart = instance
-        course_id = validated_data['course_id']
-        action = validated_data['action']
-
-        if action == 'add':
-            # check exist cart item
-            if CartItem.objects.filter(cart=cart, course_id=course_id).exists():
+        actions = validated_data['actions']
+        add_ids = [course_id for course_id, action in actions.items() if action == 'add']
+        remove_ids = [course_id for course_id, action in actions.items() if action == 'remove']
+        added = removed = 0
+
+        with transaction.atomic():
+            if add_ids:
+                existing = set(CartItem.objects.filter(cart=cart, course_id__in=add_ids).values_list(
+                    'course_id', flat=True))
+                new_items = [CartItem(cart=cart, course_id=course_id) for course_id in add_ids
+                             if course_id not in existing]
+                # the unique constraint skips the items a concurrent request inserted meanwhile,
+                # so the added items are counted from the rows rather than from new_items
+                if new_items:
+                    CartItem.objects.bulk_create(new_items, ignore_conflicts=True)
+                    added = CartItem.objects.filter(cart=cart, course_id__in=add_ids).count() - len(existing)
+            if remove_ids:
+                removed, _ = CartItem.objects.filter(cart=cart, course_id__in=remove_ids).delete()
+
+        if validated_data['single']:
+            # the single action format reports what it could not do
+            if add_ids and not added:
                 raise serializers.ValidationError({'message': 'Course already exists in cart'})
-            CartItem.objects.create(cart=cart, course_id=course_id)
-
-        elif action == 'remove':
-            try:
-                cart_item = CartItem.objects.get(cart=cart, course_id=course_id)
-                cart_item.delete()
-                # check empty cart and delete it
-                if cart.is_empty():
-                    cart.delete()
-            except CartItem.DoesNotExist:
+            if remove_ids and not removed:
                 raise serializers.ValidationError({'message': 'Course not found in cart'})
 
-        return cart
+        # check empty cart and delete it
+        if removed and cart.is_empty():
+            cart.delete()
+
+        return {'added': added, 'removed': removed}
 
 
 class PurchaseCartSerializer(serializers.Serializer):
@@ -82,28 +125,42 @@ class PurchaseCartSerializer(serializers.Serializer):
         return cart
 
     def create(self, validated_data):
+        """
+        Buys the cart courses the user does not own yet, in one transaction and a fixed number of queries.
+        The cart row is locked, so a concurrent checkout of the same cart waits and then finds it gone.
+        """
         user = self.context['request'].user
-        cart = validated_data['cart_id']
-        # create order
-        order = Order.objects.create(student=user)
-
-
-        purchased_courses = []
-
-        # check and buy cart courses
-        for item in cart.items.all():
-            course = item.course
-            if not Enrollment.objects.filter(student=user, course=course).exists():
-                Enrollment.objects.create(student=user, course=course)
-                # add to order item
-                OrderItem.objects.create(order=order, course=item.course, price=item.course.final_price)
-                # append to list
-                purchased_courses.append(course)
-        # delete cart after buy
-        cart.delete()
-
-        # set True for order is_paid field
-        order.is_paid = True
-        order.save()
+
+        with transaction.atomic():
+            cart = Cart.objects.select_for_update().filter(pk=validated_data['cart_id'].pk).first()
+            if cart is None:
+                raise serializers.ValidationError({'cart_id': ['cart does not exist']})
+
+            # cart courses, in the order they were added
+            courses = list(Course.objects.filter(cart_courses__cart=cart).order_by('cart_courses__id').only(
+                'id', 'title', 'teacher_id', 'final_price'))
+            # emptied by a concurrent update since the validation
+            if not courses:
+                raise serializers.ValidationError({'cart_id': ['cart is empty']})
+            owned = set(Enrollment.objects.filter(student=user, course__in=courses).values_list(
+                'course_id', flat=True))
+            purchased_courses = [course for course in courses if course.pk not in owned]
+
+            # create the paid order
+            order = Order.objects.create(student=user, is_paid=True,
+                                         total_cost=sum(course.final_price for course in purchased_courses))
+            Enrollment.objects.bulk_create([Enrollment(student=user, course=course) for course in purchased_courses])
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, course=course, price=course.final_price) for course in purchased_courses
+            ])
+
+            # bulk_create skips the enrollment signals, count the students here
+            add_students([course.pk for course in purchased_courses], 1)
+            # teacher dashboard rollups
+            add_sales([(course.teacher_id, course.pk, course.final_price) for course in purchased_courses],
+                      day=timezone.localdate(order.created))
+
+            # delete cart after buy
+            cart.delete()
 
         return {"purchased_courses": purchased_courses}
@@ -1,3 +1,232 @@
-from django.test import TestCase
+import hashlib
+import json
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.db.models import Sum
+from django.test import Client, TestCase
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.models import User
+from courses.counters import schedule_fold
+from courses.models import Category, Course, CourseStudentCounter, Enrollment
+from order.models import DailyCourseSales, Order, OrderItem
+from .models import Cart, CartItem, IdempotencyKey
+from .serializers import PurchaseCartSerializer
+
+
+class CartTestCase(TestCase):
+    """
+    A student with a JWT authenticated client and three published courses.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user(phone_number='09120000001', password='x', username='teacher',
+                                               role='teacher')
+        cls.student = User.objects.create_user(phone_number='09120000002', password='x', username='student')
+        category = Category.objects.create(name='Python', slug='python')
+        cls.courses = [
+            Course.objects.create(
+                category=category, teacher=cls.teacher, thumbnail='', title=f'Course {index}', description='d',
+                slug=f'course-{index}', price=1000 * index, release_status='published',
+            )
+            for index in range(1, 4)
+        ]
+
+    def setUp(self):
+        self.client = Client(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.student).access_token}')
+
+    def post(self, path, data, **headers):
+        return self.client.post(path, json.dumps(data), content_type='application/json', headers=headers)
+
+    def cart_course_ids(self):
+        return set(CartItem.objects.filter(cart__user=self.student).values_list('course_id', flat=True))
+
+
+class IdempotencyTest(CartTestCase):
+
+    def add(self, course, key):
+        return self.post('/cart/update/', {'course_id': course.pk, 'action': 'add'}, idempotency_key=key)
+
+    def test_replay_returns_stored_response(self):
+        first = self.add(self.courses[0], 'add-1')
+        self.assertEqual(first.status_code, 200)
+        self.assertNotIn('Idempotent-Replayed', first)
+
+        # without the key the repeated add would fail with "already exists in cart"
+        replay = self.add(self.courses[0], 'add-1')
+        self.assertEqual(replay.status_code, 200)
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(replay.json(), first.json())
+        self.assertEqual(self.cart_course_ids(), {self.courses[0].pk})
+
+    def test_key_reused_with_another_body(self):
+        self.assertEqual(self.add(self.courses[0], 'add-1').status_code, 200)
+        response = self.add(self.courses[1], 'add-1')
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(self.cart_course_ids(), {self.courses[0].pk})
+
+    def test_key_in_flight(self):
+        body = json.dumps({'course_id': self.courses[0].pk, 'action': 'add'}).encode()
+        IdempotencyKey.objects.create(
+            user=self.student, key='add-1', created=timezone.now(),
+            fingerprint=hashlib.sha256(b'\n'.join([b'POST', b'/cart/update/', body])).hexdigest(),
+        )
+        response = self.add(self.courses[0], 'add-1')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(self.cart_course_ids(), set())
+
+    def test_dead_request_key_is_taken_over(self):
+        body = json.dumps({'course_id': self.courses[0].pk, 'action': 'add'}).encode()
+        IdempotencyKey.objects.create(
+            user=self.student, key='add-1', created=timezone.now() - timedelta(hours=1),
+            fingerprint=hashlib.sha256(b'\n'.join([b'POST', b'/cart/update/', body])).hexdigest(),
+        )
+        self.assertEqual(self.add(self.courses[0], 'add-1').status_code, 200)
+        self.assertEqual(IdempotencyKey.objects.get(key='add-1').status_code, 200)
+
+    def test_failed_response_releases_key(self):
+        response = self.post('/cart/update/', {'course_id': self.courses[0].pk, 'action': 'remove'},
+                             idempotency_key='remove-1')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.filter(key='remove-1').exists())
+
+    def test_keys_are_per_user(self):
+        self.assertEqual(self.add(self.courses[0], 'add-1').status_code, 200)
+        other = User.objects.create_user(phone_number='09120000003', password='x', username='other')
+        self.client = Client(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(other).access_token}')
+        response = self.add(self.courses[0], 'add-1')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Idempotent-Replayed', response)
+
+
+class PurchaseTest(CartTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.cart = Cart.objects.create(user=self.student)
+        CartItem.objects.bulk_create([CartItem(cart=self.cart, course=course) for course in self.courses])
+        # already owned, not bought again
+        Enrollment.objects.create(student=self.student, course=self.courses[2])
+
+    def buy(self):
+        return self.post('/cart/buy/', {'cart_id': self.cart.pk})
+
+    def test_purchase(self):
+        response = self.buy()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['courses'], ['Course 1', 'Course 2'])
+
+        order = Order.objects.get(student=self.student)
+        self.assertTrue(order.is_paid)
+        self.assertEqual(order.total_cost, 3000)
+        self.assertEqual(set(OrderItem.objects.filter(order=order).values_list('course_id', 'price')),
+                         {(self.courses[0].pk, 1000), (self.courses[1].pk, 2000)})
+        self.assertEqual(Enrollment.objects.filter(student=self.student).count(), 3)
+        self.assertEqual(DailyCourseSales.objects.aggregate(revenue=Sum('revenue'))['revenue'], 3000)
+        self.assertFalse(Cart.objects.filter(pk=self.cart.pk).exists())
+
+    def test_purchase_queries(self):
+        # with the student counter folds already pending, as for the courses selling often,
+        # the purchase takes a fixed number of queries however many courses the cart holds
+        schedule_fold([course.pk for course in self.courses])
+        with self.assertNumQueries(18):
+            self.assertEqual(self.buy().status_code, 201)
+
+    def test_failed_purchase_rolls_back(self):
+        with mock.patch('cart.serializers.add_sales', side_effect=RuntimeError), self.assertRaises(RuntimeError):
+            self.buy()
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+        self.assertEqual(Enrollment.objects.filter(student=self.student).count(), 1)
+        self.assertFalse(CourseStudentCounter.objects.filter(course__in=self.courses[:2], count__gt=0).exists())
+        self.assertEqual(self.cart_course_ids(), {course.pk for course in self.courses})
+
+    def test_cart_emptied_after_validation(self):
+        request = mock.Mock(user=self.student)
+        serializer = PurchaseCartSerializer(data={'cart_id': self.cart.pk}, context={'request': request})
+        self.assertTrue(serializer.is_valid())
+        CartItem.objects.filter(cart=self.cart).delete()
+        with self.assertRaises(ValidationError):
+            serializer.save()
+        self.assertFalse(Order.objects.exists())
+
+    def test_empty_cart(self):
+        CartItem.objects.filter(cart=self.cart).delete()
+        self.assertEqual(self.buy().status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+
+class UpdateCartTest(CartTestCase):
+
+    def update(self, data):
+        return self.post('/cart/update/', data)
+
+    def operations(self, *operations):
+        return self.update({'operations': [{'course_id': course.pk, 'action': action}
+                                           for course, action in operations]})
+
+    def test_mixed_batch(self):
+        self.update({'course_id': self.courses[0].pk, 'action': 'add'})
+        response = self.operations(
+            (self.courses[1], 'add'), (self.courses[2], 'add'), (self.courses[0], 'remove'),
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'message': 'action successfully.', 'added': 2, 'removed': 1})
+        self.assertEqual(self.cart_course_ids(), {self.courses[1].pk, self.courses[2].pk})
+
+    def test_last_action_on_a_course_wins(self):
+        response = self.operations((self.courses[0], 'add'), (self.courses[0], 'remove'), (self.courses[0], 'add'))
+        self.assertEqual(response.json()['added'], 1)
+        self.assertEqual(self.cart_course_ids(), {self.courses[0].pk})
+
+    def test_duplicate_add(self):
+        self.assertEqual(self.update({'course_id': self.courses[0].pk, 'action': 'add'}).status_code, 200)
+        response = self.update({'course_id': self.courses[0].pk, 'action': 'add'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'message': 'Course already exists in cart'})
+
+        # the batch format skips it
+        response = self.operations((self.courses[0], 'add'), (self.courses[1], 'add'))
+        self.assertEqual(response.json()['added'], 1)
+        self.assertEqual(CartItem.objects.filter(cart__user=self.student).count(), 2)
+
+    def test_added_counts_inserted_rows(self):
+        self.update({'course_id': self.courses[2].pk, 'action': 'add'})
+        # the insert skips every row, as when they conflict with the rows of a concurrent request
+        with mock.patch.object(CartItem.objects, 'bulk_create', return_value=[]):
+            response = self.operations((self.courses[0], 'add'), (self.courses[1], 'add'))
+            self.assertEqual(response.json()['added'], 0)
+            response = self.update({'course_id': self.courses[0].pk, 'action': 'add'})
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.cart_course_ids(), {self.courses[2].pk})
+
+    def test_remove_missing_item(self):
+        self.update({'course_id': self.courses[0].pk, 'action': 'add'})
+        response = self.update({'course_id': self.courses[1].pk, 'action': 'remove'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'message': 'Course not found in cart'})
+
+        response = self.operations((self.courses[1], 'remove'))
+        self.assertEqual(response.json()['removed'], 0)
+        self.assertEqual(self.cart_course_ids(), {self.courses[0].pk})
+
+    def test_removing_last_item_deletes_cart(self):
+        self.operations((self.courses[0], 'add'), (self.courses[1], 'add'))
+        self.update({'course_id': self.courses[0].pk, 'action': 'remove'})
+        self.assertTrue(Cart.objects.filter(user=self.student).exists())
+        response = self.update({'course_id': self.courses[1].pk, 'action': 'remove'})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Cart.objects.filter(user=self.student).exists())
+
+    def test_invalid_operations(self):
+        self.assertEqual(self.update({'course_id': 0, 'action': 'add'}).json(), {'message': ['Course Not Found']})
+        self.assertEqual(self.update({'operations': []}).status_code, 400)
+        too_many = [{'course_id': self.courses[0].pk, 'action': 'add'}] * 101
+        self.assertEqual(self.update({'operations': too_many}).status_code, 400)
+        self.assertEqual(self.update({'course_id': self.courses[0].pk}).status_code, 400)
+        self.assertEqual(self.cart_course_ids(), set())
@@ -1,9 +1,11 @@
+from django.db.models import Prefetch
 from django.shortcuts import get_object_or_404
 from rest_framework import generics, views, status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
-from .models import Cart
+from .idempotency import idempotent
+from .models import Cart, CartItem
 from .serializers import CartSerializer, UpdateCartSerializer, PurchaseCartSerializer
 from courses.models import Enrollment, Course
 
@@ -12,27 +14,41 @@ from courses.models import Enrollment, Course
 
 
 class CartItemsListView(generics.ListAPIView):
+    """
+    Lists the user's cart, its items are prefetched with their course titles and prices in one query.
+    """
     serializer_class = CartSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return Cart.objects.filter(user=self.request.user)
+        items = CartItem.objects.select_related('course').only('cart_id', 'course__title', 'course__final_price')
+        return Cart.objects.filter(user=self.request.user).select_related('user').prefetch_related(
+            Prefetch('items', queryset=items)
+        )
 
 
 class UpdateCartView(views.APIView):
+    """
+    Adds or removes cart courses, idempotent with an Idempotency-Key header.
+    """
     permission_classes = [IsAuthenticated]
 
+    @idempotent
     def post(self, request):
         cart, _ = Cart.objects.get_or_create(user=request.user)
         serializer = UpdateCartSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        serializer.update(cart, serializer.validated_data)
-        return Response({'message': 'action successfully.'}, status=status.HTTP_200_OK)
+        result = serializer.update(cart, serializer.validated_data)
+        return Response({'message': 'action successfully.', **result}, status=status.HTTP_200_OK)
 
 
 class PurchaseCartView(views.APIView):
+    """
+    Buys the cart, idempotent with an Idempotency-Key header.
+    """
     permission_classes = [IsAuthenticated]
 
+    @idempotent
     def post(self, request):
         serializer = PurchaseCartSerializer(data=request.data, context={'request': request})
         serializer.is_valid(raise_exception=True)
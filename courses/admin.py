@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Course, CourseSubDescription, CourseHeadlines, SeasonVideos, Category, Enrollment
+from .models import Course, CourseSubDescription, CourseHeadlines, SeasonVideos, Category, Enrollment, CourseReview
 # Register your models here.
 
 class SubDescriptionInline(admin.StackedInline):
@@ -24,8 +24,14 @@ class CategoryAdmin(admin.ModelAdmin):
 
 @admin.register(SeasonVideos)
 class SeasonVideosAdmin(admin.ModelAdmin):
-    list_display = ['video_title', 'duration', 'is_free']
+    list_display = ['video_title', 'duration', 'is_free', 'hls_status']
 
 @admin.register(Enrollment)
 class EnrollmentAdmin(admin.ModelAdmin):
     list_display = ['student', 'course']
+
+
+@admin.register(CourseReview)
+class CourseReviewAdmin(admin.ModelAdmin):
+    list_display = ['course', 'student', 'rating', 'created']
+    list_filter = ['rating']
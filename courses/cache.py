@@ -0,0 +1,176 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+
+from .models import Category
+from .serializers import CourseDetailSerializer, CategorySerializer
+
+# how long a built document lives in the cache (seconds)
+COURSE_DOCUMENT_TIMEOUT = 60 * 60 * 24
+# how long a rebuild may hold the lock before another request takes over
+REBUILD_LOCK_TIMEOUT = 30
+# how long a request waits for another request's rebuild before building itself
+REBUILD_WAIT_TIMEOUT = 5
+REBUILD_POLL_INTERVAL = 0.05
+
+# the versions are bumped by the web processes and the background jobs alike,
+# the cache backend must be shared by all of them (see CACHES in the settings)
+CATALOG_VERSION_KEY = 'course_catalog_version'
+CATEGORIES_VERSION_KEY = 'course_categories_version'
+# safety net for changes made without signals (queryset updates), invalidation keeps it fresh otherwise.
+# The version expires with the categories, so the process copies are reloaded as well.
+CATEGORIES_TIMEOUT = 60 * 60
+# how long a process serves the categories from its own memory before checking the shared version (seconds),
+# the other processes see a change after at most this long
+CATEGORIES_LOCAL_TIMEOUT = 5
+
+# the categories of this process: (version, categories, monotonic time of the last version check)
+_local_categories = None
+
+
+def _version_key(course_id):
+    return f'course_document_version:{course_id}'
+
+
+def _document_key(slug, version):
+    return f'course_document:{slug}:v{version}'
+
+
+def get_course_document_version(course_id):
+    """
+    Returns the current document version of the course.
+    A missing version starts from the current time, so versions are never reused after a cache flush.
+    """
+    key = _version_key(course_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate_course_document(course_id):
+    """
+    Bumps the course document version, the old document is never read again and expires on its own.
+    Also moves the catalog version, course lists show part of the document.
+    The bump waits for the current transaction to commit, so no request caches the old content
+    under the new version.
+    """
+    transaction.on_commit(lambda: _bump_course_document(course_id))
+
+
+def _bump_course_document(course_id):
+    try:
+        cache.incr(_version_key(course_id))
+    except ValueError:
+        # no version yet, the next read starts a fresh one
+        pass
+    cache.set(CATALOG_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def get_catalog_version():
+    """
+    Returns the catalog-wide version, the time in nanoseconds of the last change to any course.
+    """
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def invalidate_catalog():
+    transaction.on_commit(lambda: cache.set(CATALOG_VERSION_KEY, time.time_ns(), timeout=None))
+
+
+def build_course_document(course):
+    """
+    Serializes the full course detail document.
+    """
+    course = type(course).objects.select_related('teacher').prefetch_related('sub_descriptions').get(pk=course.pk)
+    return dict(CourseDetailSerializer(instance=course).data)
+
+
+def get_course_document(course):
+    """
+    Returns the cached course detail document, building it on a miss.
+    Concurrent misses are coalesced: one request rebuilds while the others wait for its result.
+    """
+    version = get_course_document_version(course.pk)
+    key = _document_key(course.slug, version)
+
+    document = cache.get(key)
+    if document is not None:
+        return document
+
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, 1, timeout=REBUILD_LOCK_TIMEOUT):
+        try:
+            document = build_course_document(course)
+            cache.set(key, document, timeout=COURSE_DOCUMENT_TIMEOUT)
+        finally:
+            cache.delete(lock_key)
+        return document
+
+    # another request is rebuilding this document, wait for it
+    deadline = time.monotonic() + REBUILD_WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(REBUILD_POLL_INTERVAL)
+        document = cache.get(key)
+        if document is not None:
+            return document
+        if cache.get(lock_key) is None:
+            break
+
+    return build_course_document(course)
+
+
+def _categories_key(version):
+    return f'course_categories:v{version}'
+
+
+def get_categories():
+    """
+    Returns the categories with their number of published courses, counted in one annotated query.
+    Served from the process memory, the shared cache is read only to check the version every
+    CATEGORIES_LOCAL_TIMEOUT seconds and to load a new version.
+    """
+    global _local_categories
+    now = time.monotonic()
+    if _local_categories is not None and now - _local_categories[2] < CATEGORIES_LOCAL_TIMEOUT:
+        return _local_categories[1]
+
+    version = cache.get(CATEGORIES_VERSION_KEY)
+    if version is None:
+        cache.add(CATEGORIES_VERSION_KEY, time.time_ns(), timeout=CATEGORIES_TIMEOUT)
+        version = cache.get(CATEGORIES_VERSION_KEY)
+    if _local_categories is not None and _local_categories[0] == version:
+        _local_categories = (version, _local_categories[1], now)
+        return _local_categories[1]
+
+    key = _categories_key(version)
+    categories = cache.get(key)
+    if categories is None:
+        queryset = Category.objects.annotate(
+            courses_count=Count('courses', filter=Q(courses__release_status='published'))
+        ).order_by('name')
+        categories = [dict(category) for category in CategorySerializer(instance=queryset, many=True).data]
+        cache.set(key, categories, timeout=CATEGORIES_TIMEOUT)
+    _local_categories = (version, categories, now)
+    return categories
+
+
+def invalidate_categories():
+    """
+    Moves the categories version once the current transaction commits, so they are never rebuilt from
+    uncommitted data. This process drops its copy at once, the others on their next version check.
+    """
+    transaction.on_commit(_bump_categories)
+
+
+def _bump_categories():
+    global _local_categories
+    cache.set(CATEGORIES_VERSION_KEY, time.time_ns(), timeout=CATEGORIES_TIMEOUT)
+    _local_categories = None
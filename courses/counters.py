@@ -0,0 +1,136 @@
+import random
+from collections import Counter
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Now
+
+from .cache import invalidate_course_document
+from .models import Course, CourseStudentCounter, Enrollment
+
+# counter rows per course
+STUDENT_COUNTER_SHARDS = 16
+# delay between a counter change and its fold into Course.number_of_students,
+# the changes made within the delay are folded together
+FOLD_DELAY = timedelta(seconds=60)
+
+
+def _fold_key(course_id):
+    return f'student_counter_fold:{course_id}'
+
+
+def add_students(course_ids, delta=1):
+    """
+    Adds delta to the enrollment counters of the courses, a course listed twice is counted twice.
+    Increments go to one randomly picked shard shared by all the courses of the call, so a batch costs
+    two queries. Decrements are applied a unit at a time to a random shard above zero, so they are spread
+    like the increments and never drive a shard negative. They never create a shard, so they are safe
+    while the course itself is being deleted.
+    Schedules a fold into Course.number_of_students for the courses without a pending one.
+    """
+    counts = Counter(course_ids)
+    if not counts:
+        return
+
+    if delta > 0:
+        shard = random.randrange(STUDENT_COUNTER_SHARDS)
+        CourseStudentCounter.objects.bulk_create(
+            [CourseStudentCounter(course_id=course_id, shard=shard) for course_id in counts],
+            ignore_conflicts=True,
+        )
+        by_multiplier = {}
+        for course_id, multiplier in counts.items():
+            by_multiplier.setdefault(multiplier, []).append(course_id)
+        for multiplier, ids in by_multiplier.items():
+            CourseStudentCounter.objects.filter(course_id__in=ids, shard=shard).update(
+                count=F('count') + delta * multiplier
+            )
+    elif delta < 0:
+        shards = {}
+        for pk, course_id, count in CourseStudentCounter.objects.filter(
+                course_id__in=counts, count__gt=0).values_list('pk', 'course', 'count'):
+            shards.setdefault(course_id, {})[pk] = count
+        taken = Counter()
+        for course_id, multiplier in counts.items():
+            remaining = shards.get(course_id, {})
+            for _ in range(-delta * multiplier):
+                candidates = [pk for pk, count in remaining.items() if count > taken[pk]]
+                if not candidates:
+                    break
+                taken[random.choice(candidates)] += 1
+        if taken:
+            # a shard emptied by a concurrent decrement meanwhile is left alone
+            guard = Q()
+            for pk, amount in taken.items():
+                guard |= Q(pk=pk, count__gte=amount)
+            CourseStudentCounter.objects.filter(guard).update(
+                count=F('count') - Case(*[When(pk=pk, then=Value(amount)) for pk, amount in taken.items()])
+            )
+
+    schedule_fold(counts)
+
+
+def schedule_fold(course_ids):
+    """
+    Enqueues a delayed fold of the courses, the cache keeps a single pending fold per course.
+    """
+    from .tasks import fold_student_counters
+
+    # one read skips the courses already pending, the usual case for the busy ones
+    scheduled = cache.get_many([_fold_key(course_id) for course_id in course_ids])
+    pending = [course_id for course_id in course_ids if _fold_key(course_id) not in scheduled
+               and cache.add(_fold_key(course_id), True, timeout=FOLD_DELAY.total_seconds())]
+    if pending:
+        fold_student_counters.enqueue(delay=FOLD_DELAY, course_ids=pending)
+
+
+def get_student_total():
+    """
+    Returns the sum of the counter shards of the outer course.
+    """
+    totals = CourseStudentCounter.objects.filter(course=OuterRef('pk')).order_by().values(
+        'course').annotate(total=Sum('count')).values('total')
+    return Coalesce(Subquery(totals), Value(0))
+
+
+def fold_student_counters(course_ids=None):
+    """
+    Writes the sum of the counter shards to Course.number_of_students of the given courses, or of all courses.
+    Only the courses whose number changed are updated, returns their number.
+    """
+    courses = Course.objects.annotate(student_total=get_student_total()).exclude(
+        number_of_students=F('student_total')
+    )
+    if course_ids is not None:
+        courses = courses.filter(pk__in=course_ids)
+        # changes made from now on schedule a new fold
+        cache.delete_many([_fold_key(course_id) for course_id in course_ids])
+
+    changed = list(courses.values_list('pk', flat=True))
+    if changed:
+        Course.objects.filter(pk__in=changed).update(number_of_students=get_student_total(), updated=Now())
+        for course_id in changed:
+            invalidate_course_document(course_id)
+    return len(changed)
+
+
+def rebuild_student_counters():
+    """
+    Resets the counter shards from the enrollments, for existing data or after a drift.
+    Each course is rebuilt in its own transaction with the course row locked, new enrollments of the course
+    wait for it. The shards are deleted before the enrollments are counted, so the decrements committed
+    meanwhile are in the count. Returns the number of rebuilt courses.
+    """
+    rebuilt = 0
+    for course_id in Course.objects.order_by('pk').values_list('pk', flat=True).iterator():
+        with transaction.atomic():
+            if not Course.objects.select_for_update().filter(pk=course_id).values_list('pk', flat=True):
+                continue
+            CourseStudentCounter.objects.filter(course_id=course_id).delete()
+            total = Enrollment.objects.filter(course_id=course_id).count()
+            if total:
+                CourseStudentCounter.objects.create(course_id=course_id, shard=0, count=total)
+        rebuilt += 1
+    return rebuilt
@@ -0,0 +1,150 @@
+from django.db.models import BooleanField, Case, When, Value, CharField, Count, Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from .models import Course
+
+# final price buckets of the price facet: (label, minimum, maximum), bounds are inclusive
+PRICE_RANGES = (
+    ('0-500000', 0, 500_000),
+    ('500001-1000000', 500_001, 1_000_000),
+    ('1000001-2000000', 1_000_001, 2_000_000),
+    ('2000001+', 2_000_001, None),
+)
+
+BOOLEAN_VALUES = {'true': True, '1': True, 'false': False, '0': False}
+
+
+class CourseFacetFilterBackend(BaseFilterBackend):
+    """
+    Filters the course catalog by category, final price range, is_free, status and minimum rating.
+    Also computes the facet counts in one grouped aggregate query, each facet counted with the filters
+    of the other facets only, so the client can switch or combine values of a facet.
+
+    Query parameters:
+        category: category slug, several slugs can be separated by commas
+        min_price, max_price: final price range
+        is_free: true or false
+        status: completed or in_progress
+        rating: minimum rating (1-5)
+    """
+
+    def get_filters(self, request):
+        """
+        Returns the conditions of the requested filters, keyed by the facet they narrow.
+        """
+        params = request.query_params
+        filters = {}
+
+        category = params.get('category')
+        if category:
+            filters['category'] = Q(category__slug__in=[slug for slug in category.split(',') if slug])
+
+        price = Q()
+        min_price = self._get_int(params, 'min_price')
+        if min_price is not None:
+            price &= Q(final_price__gte=min_price)
+        max_price = self._get_int(params, 'max_price')
+        if max_price is not None:
+            price &= Q(final_price__lte=max_price)
+        if price:
+            filters['price_range'] = price
+
+        is_free = params.get('is_free')
+        if is_free is not None:
+            if is_free.lower() not in BOOLEAN_VALUES:
+                raise ValidationError({'is_free': 'Must be true or false.'})
+            filters['is_free'] = Q(is_free=BOOLEAN_VALUES[is_free.lower()])
+
+        course_status = params.get('status')
+        if course_status is not None:
+            if course_status not in Course.CourseStatus.values:
+                raise ValidationError({'status': f'Must be one of {", ".join(Course.CourseStatus.values)}.'})
+            filters['status'] = Q(status=course_status)
+
+        rating = self._get_int(params, 'rating')
+        if rating is not None:
+            filters['rating'] = Q(rating__gte=rating)
+
+        return filters
+
+    def filter_queryset(self, request, queryset, view):
+        for condition in self.get_filters(request).values():
+            queryset = queryset.filter(condition)
+        return queryset
+
+    def get_facet_counts(self, request, queryset):
+        """
+        Returns the number of courses per category, price range, is_free, status and rating value.
+        `queryset` is the catalog before the facet filters. Every requested filter is annotated as a match flag
+        and all facets are folded from a single GROUP BY over their combinations: a facet counts the rows
+        matching the filters of the other facets.
+        """
+        filters = self.get_filters(request)
+        price_range = Case(
+            *[
+                When(Q(final_price__gte=low) & (Q(final_price__lte=high) if high is not None else Q()), then=Value(label))
+                for label, low, high in PRICE_RANGES
+            ],
+            output_field=CharField(),
+        )
+        flags = {
+            f'match_{facet}': Case(When(condition, then=Value(True)), default=Value(False), output_field=BooleanField())
+            for facet, condition in filters.items()
+        }
+        rows = queryset.order_by().annotate(price_range=price_range, **flags).values(
+            'category__slug', 'category__name', 'price_range', 'is_free', 'status', 'rating', *flags
+        ).annotate(count=Count('id'))
+
+        categories = {}
+        facets = {'price_range': {}, 'is_free': {}, 'status': {}, 'rating': {}}
+        for row in rows:
+            count = row['count']
+            failed = [facet for facet in filters if not row[f'match_{facet}']]
+            if len(failed) > 1:
+                continue
+            # a row failing one filter only counts in the facet of that filter
+            counted = failed or ['category', *facets]
+            if 'category' in counted:
+                category = categories.setdefault(
+                    row['category__slug'], {'slug': row['category__slug'], 'name': row['category__name'], 'count': 0}
+                )
+                category['count'] += count
+            for facet, values in facets.items():
+                if facet in counted:
+                    values[row[facet]] = values.get(row[facet], 0) + count
+
+        return {
+            'category': sorted(categories.values(), key=lambda item: -item['count']),
+            'price_range': [
+                {'value': label, 'count': facets['price_range'][label]}
+                for label, _, _ in PRICE_RANGES if label in facets['price_range']
+            ],
+            'is_free': [{'value': value, 'count': count} for value, count in sorted(facets['is_free'].items())],
+            'status': [{'value': value, 'count': count} for value, count in sorted(facets['status'].items())],
+            'rating': [{'value': value, 'count': count} for value, count in sorted(facets['rating'].items())],
+        }
+
+    def get_schema_operation_parameters(self, view):
+        parameters = [
+            ('category', 'string', 'Category slug, several slugs can be separated by commas.'),
+            ('min_price', 'integer', 'Minimum final price.'),
+            ('max_price', 'integer', 'Maximum final price.'),
+            ('is_free', 'boolean', 'Only free or only paid courses.'),
+            ('status', 'string', 'Course status, completed or in_progress.'),
+            ('rating', 'integer', 'Minimum course rating.'),
+        ]
+        return [
+            {'name': name, 'required': False, 'in': 'query', 'description': description, 'schema': {'type': kind}}
+            for name, kind, description in parameters
+        ]
+
+    @staticmethod
+    def _get_int(params, name):
+        value = params.get(name)
+        if value is None or value == '':
+            return None
+        try:
+            return int(value)
+        except ValueError:
+            raise ValidationError({name: 'A valid integer is required.'})
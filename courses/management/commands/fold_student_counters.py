@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from courses.counters import fold_student_counters, rebuild_student_counters
+
+
+class Command(BaseCommand):
+    help = 'Writes the sharded enrollment counters to Course.number_of_students, run it periodically.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Recount the enrollments into the counters first.')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            rebuilt = rebuild_student_counters()
+            self.stdout.write(f'Rebuilt the counters of {rebuilt} courses.')
+        changed = fold_student_counters()
+        self.stdout.write(self.style.SUCCESS(f'Updated the number of students of {changed} courses.'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from courses.models import Course, CourseSearchDocument, CourseSearchTerm
+from courses.search import index_course, rebuild_search_stats
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the course search index from scratch.'
+
+    def handle(self, *args, **options):
+        CourseSearchTerm.objects.all().delete()
+        CourseSearchDocument.objects.all().delete()
+
+        course_ids = Course.objects.filter(
+            release_status=Course.CourseReleaseStatus.published
+        ).values_list('id', flat=True)
+
+        count = 0
+        for course_id in course_ids.iterator():
+            index_course(course_id)
+            count += 1
+        rebuild_search_stats()
+
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} courses.'))
@@ -0,0 +1,26 @@
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.core.management.base import BaseCommand
+
+from courses.cache import invalidate_course_document
+from courses.models import Course, CourseHeadlines, SeasonVideos
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the duration totals of all headlines and courses from their videos.'
+
+    def handle(self, *args, **options):
+        headline_totals = SeasonVideos.objects.filter(headline=OuterRef('pk')).order_by().values(
+            'headline').annotate(total=Sum('duration')).values('total')
+        course_totals = CourseHeadlines.objects.filter(course=OuterRef('pk')).order_by().values(
+            'course').annotate(total=Sum('duration')).values('total')
+
+        with transaction.atomic():
+            headlines = CourseHeadlines.objects.update(duration=Coalesce(Subquery(headline_totals), Value(0)))
+            courses = Course.objects.update(duration=Coalesce(Subquery(course_totals), Value(0)))
+
+        for course_id in Course.objects.values_list('id', flat=True).iterator():
+            invalidate_course_document(course_id)
+
+        self.stdout.write(self.style.SUCCESS(f'Recomputed durations of {headlines} headlines and {courses} courses.'))
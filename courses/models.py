@@ -1,11 +1,18 @@
-from django.db import models
+from decimal import Decimal
+
+from django.db import models, transaction
 from django.core.validators import MinValueValidator, MaxValueValidator
 from accounts.models import User
-from django.db.models import Sum
+from django.db.models import Sum, F, Case, When, Value, FloatField, OuterRef, Subquery
+from django.db.models.functions import Cast, Coalesce, Greatest, Now, Round
 
 
 # Create your models here.
 
+# fixed-size image variants (width, height), retina is the card variant for high density screens
+THUMBNAIL_VARIANTS = {'card': (480, 270), 'retina': (960, 540), 'detail': (1280, 720)}
+SUB_DESCRIPTION_IMAGE_VARIANTS = {'card': (640, 360), 'retina': (1280, 720), 'detail': (1600, 900)}
+
 
 class Category(models.Model):
     name = models.CharField(max_length=155)
@@ -45,6 +52,8 @@ class Course(models.Model):
 
     # image
     thumbnail = models.ImageField(upload_to="courses/images/thumbnail/")
+    # resized thumbnail files, generated in the background
+    thumbnail_variants = models.JSONField(default=dict, blank=True, editable=False)
     # title
     title = models.CharField(max_length=100)
     # description
@@ -53,8 +62,16 @@ class Course(models.Model):
     teacher = models.ForeignKey(User, on_delete=models.CASCADE, related_name='courses')
     # slug
     slug = models.SlugField(max_length=100, unique=True)
-    # rate
+    # rate, the rounded average of the reviews
     rating = models.PositiveIntegerField(default=5, validators=[MinValueValidator(1), MaxValueValidator(5)])
+    # review aggregates, maintained by CourseReview
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_1 = models.PositiveIntegerField(default=0, editable=False)
+    rating_2 = models.PositiveIntegerField(default=0, editable=False)
+    rating_3 = models.PositiveIntegerField(default=0, editable=False)
+    rating_4 = models.PositiveIntegerField(default=0, editable=False)
+    rating_5 = models.PositiveIntegerField(default=0, editable=False)
 
     number_of_students = models.PositiveIntegerField(default=0)
 
@@ -73,8 +90,41 @@ class Course(models.Model):
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # keyset pagination of the published catalog on (created, id)
+            models.Index(fields=['release_status', '-created', '-id'], name='course_published_created_idx'),
+            # catalog facet filters
+            models.Index(fields=['release_status', 'category', 'final_price'], name='course_category_price_idx'),
+            models.Index(fields=['release_status', 'is_free', 'final_price'], name='course_free_price_idx'),
+            models.Index(fields=['release_status', 'status'], name='course_status_idx'),
+            models.Index(fields=['release_status', 'rating'], name='course_rating_idx'),
+        ]
+
     def __str__(self):
-        return f'{self.title} - {self.teacher}'
+        return self.format_label(self.title, self.teacher)
+
+    @staticmethod
+    def format_label(title, teacher):
+        """
+        The course label, shared by __str__ and the serializers built from values() rows.
+        """
+        return f'{title} - {teacher}'
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remember the stored catalog placement, the category counts change only when it does
+        instance._stored_placement = (instance.__dict__.get('release_status'), instance.__dict__.get('category_id'))
+        return instance
+
+    def catalog_placement_changed(self):
+        """
+        Checks whether the release status or the category differ from the loaded values.
+        Instances that were not loaded from the database count as changed.
+        """
+        stored = getattr(self, '_stored_placement', None)
+        return stored is None or stored != (self.release_status, self.category_id)
 
     def save(self, *args, **kwargs):
 
@@ -88,23 +138,44 @@ class Course(models.Model):
         self.final_price = self.price - self.off
 
         super().save(*args, **kwargs)
+        self._stored_placement = (self.release_status, self.category_id)
+
+    @property
+    def rating_average(self):
+        """
+        The average review rating with two decimals, None without reviews.
+        """
+        return self.compute_rating_average(self.rating_sum, self.rating_count)
+
+    @staticmethod
+    def compute_rating_average(rating_sum, rating_count):
+        if not rating_count:
+            return None
+        return round(Decimal(rating_sum) / rating_count, 2)
+
+    @property
+    def rating_histogram(self):
+        return {value: getattr(self, f'rating_{value}') for value in range(1, 6)}
 
     def update_duration(self):
         """
-        Updates the total duration of the course based on its videos.
+        Recomputes the total duration of the course from its videos.
+        Video saves keep the total up to date with deltas, this is only needed for repairs.
         """
         total_duration = SeasonVideos.objects.filter(headline__course=self).aggregate(
             total_duration=Sum('duration')
         )['total_duration'] or 0
         self.duration = total_duration
-        self.save()
+        self.save(update_fields=['duration'])
 
 
 class CourseSubDescription(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='sub_descriptions')
     sub_title = models.CharField(max_length=200)
     image = models.ImageField(upload_to="courses/images/sub_descriptions/", null=True, blank=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     sub_description = models.TextField()
+    updated = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f'{self.course} - {self.sub_title}'
@@ -116,15 +187,20 @@ class CourseHeadlines(models.Model):
     chapter_number = models.PositiveIntegerField()
     duration = models.DecimalField(default=0, max_digits=6, decimal_places=2)
     is_active = models.BooleanField(default=True)
+    updated = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.headline_title
 
     def update_duration(self):
+        """
+        Recomputes the duration of the headline from its videos.
+        Video saves keep the total up to date with deltas, this is only needed for repairs.
+        """
         total_duration = SeasonVideos.objects.filter(headline=self).aggregate(
             total_duration=Sum('duration'))['total_duration'] or 0
         self.duration = total_duration
-        self.save()
+        self.save(update_fields=['duration'])
 
     class Meta:
         ordering = ['chapter_number']
@@ -135,17 +211,63 @@ class CourseHeadlines(models.Model):
         verbose_name_plural = 'Headlines'
 
 
+def add_headline_duration(headline_id, delta):
+    """
+    Adds delta to the duration of the headline and of its course, with atomic F() updates.
+    """
+    if not delta:
+        return
+    CourseHeadlines.objects.filter(pk=headline_id).update(duration=F('duration') + delta, updated=Now())
+    Course.objects.filter(headlines=headline_id).update(duration=F('duration') + delta, updated=Now())
+
+
+def touch_course(course_id):
+    """
+    Marks the course as modified, for changes its `updated` field does not see (child deletes, queryset updates).
+    """
+    Course.objects.filter(pk=course_id).update(updated=Now())
+
+
+def get_content_updated():
+    """
+    Returns the latest `updated` of the outer course and of its sub descriptions, headlines and videos.
+    """
+    children = [
+        CourseSubDescription.objects.filter(course=OuterRef('pk')),
+        CourseHeadlines.objects.filter(course=OuterRef('pk')),
+        SeasonVideos.objects.filter(headline__course=OuterRef('pk')),
+    ]
+    latest = [
+        Coalesce(Subquery(queryset.order_by('-updated').values('updated')[:1]), F('updated'))
+        for queryset in children
+    ]
+    return Greatest(F('updated'), *latest)
+
+
 def video_upload_path(instance, filename):
     path = instance.headline.headline_title.replace(' ', '_')
     return f"courses/videos/{path}/{filename}"
 
 
+def hls_upload_dir(instance, token):
+    return f"courses/hls/{instance.pk}/{token}"
+
+
 def attached_file_upload_path(instance, filename):
     path = instance.video_title.replace(' ', '_')
     return f"attached_files/{path}/{filename}"
 
 
 class SeasonVideos(models.Model):
+    class HlsStatus(models.TextChoices):
+        """
+        choices a HLS packaging status of the video
+        """
+        pending = ('pending', 'Pending')
+        processing = ('processing', 'Processing')
+        ready = ('ready', 'Ready')
+        failed = ('failed', 'Failed')
+
     headline = models.ForeignKey(CourseHeadlines, on_delete=models.CASCADE, related_name='videos')
     video_title = models.CharField(max_length=200)
     video_file = models.FileField(upload_to=video_upload_path)
@@ -153,24 +275,70 @@ class SeasonVideos(models.Model):
     attached_file = models.FileField(upload_to=attached_file_upload_path, null=True, blank=True)
     duration = models.DecimalField(default=0, max_digits=6, decimal_places=2)
     is_free = models.BooleanField(default=False)
+    # HLS renditions, packaged in the background from video_file
+    hls_status = models.CharField(max_length=10, choices=HlsStatus.choices, default=HlsStatus.pending,
+                                  editable=False)
+    hls_playlist = models.CharField(max_length=255, blank=True, editable=False)  # master playlist name in storage
+    hls_source = models.CharField(max_length=255, blank=True, editable=False)  # video_file the playlist was built from
+    updated = models.DateTimeField(auto_now=True)
 
-    def save(self, *args, **kwargs):
+    def needs_hls_packaging(self):
+        return bool(self.video_file) and self.hls_source != self.video_file.name
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remember the stored headline and duration, save() applies the difference to the totals
+        instance._stored_headline_id = instance.__dict__.get('headline_id')
+        instance._stored_duration = instance.__dict__.get('duration')
+        # and the stored video file, a save queues the HLS packaging only when it changes
+        instance._stored_video_file = instance.__dict__.get('video_file')
+        return instance
+
+    def video_file_changed(self):
         """
-        Update the course duration when a new video is added or modified.
+        Returns whether video_file differs from the stored one, unknown is treated as changed.
         """
-        super().save(*args, **kwargs)
-        self.headline.update_duration()
-        self.headline.course.update_duration()
+        stored = getattr(self, '_stored_video_file', None)
+        return stored is None or stored != self.video_file.name
+
+    def get_stored_duration(self):
+        """
+        Returns the (headline_id, duration) pair currently stored in the database.
+        """
+        if self._state.adding:
+            return None, 0
+        headline_id = getattr(self, '_stored_headline_id', None)
+        duration = getattr(self, '_stored_duration', None)
+        if headline_id is None or duration is None:
+            stored = SeasonVideos.objects.filter(pk=self.pk).values_list('headline_id', 'duration').first()
+            headline_id, duration = stored or (None, 0)
+        return headline_id, duration
 
-    def delete(self, *args, **kwargs):
+    def save(self, *args, **kwargs):
         """
-        Update the course duration when a video is deleted.
+        Applies the duration change of the video to the headline and course totals.
+        The totals are moved by the difference between the stored and the new duration,
+        the video delete is handled by the post_delete signal.
         """
-        headline = self.headline
-        course = headline.course
-        headline.update_duration()
-        course.update_duration()
-        super().delete(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        tracked = update_fields is None or bool({'duration', 'headline', 'headline_id'} & set(update_fields))
+        self.duration = self._meta.get_field('duration').to_python(self.duration)
+
+        with transaction.atomic():
+            if tracked:
+                stored_headline_id, stored_duration = self.get_stored_duration()
+            super().save(*args, **kwargs)
+            if tracked:
+                if stored_headline_id == self.headline_id:
+                    add_headline_duration(self.headline_id, self.duration - stored_duration)
+                else:
+                    if stored_headline_id is not None:
+                        add_headline_duration(stored_headline_id, -stored_duration)
+                    add_headline_duration(self.headline_id, self.duration)
+
+        self._stored_headline_id, self._stored_duration = self.headline_id, self.duration
+        self._stored_video_file = self.video_file.name
 
     def __str__(self):
         return f'{self.headline} - {self.video_title}'
@@ -185,4 +353,142 @@ class Enrollment(models.Model):
         unique_together = ('student', 'course')
 
     def __str__(self):
-        return f"{self.student.phone_number} -> {self.course.title}"
\ No newline at end of file
+        return f"{self.student.phone_number} -> {self.course.title}"
+
+
+def add_course_rating(course_id, old_rating=None, new_rating=None):
+    """
+    Moves a review rating in the course aggregates: adds new_rating, removes old_rating, or replaces one by the other.
+    The sum, count and histogram are changed with F() expressions and the rounded average is derived from
+    the updated row in the same transaction, so concurrent reviews never lose an update.
+    Without reviews the rating falls back to the field default.
+    """
+    changes = {}
+    for rating, delta in ((old_rating, -1), (new_rating, 1)):
+        if rating is None:
+            continue
+        changes['rating_sum'] = changes.get('rating_sum', F('rating_sum')) + rating * delta
+        changes['rating_count'] = changes.get('rating_count', F('rating_count')) + delta
+        field = f'rating_{rating}'
+        changes[field] = changes.get(field, F(field)) + delta
+    if not changes:
+        return
+
+    course_default = Course._meta.get_field('rating').default
+    with transaction.atomic():
+        courses = Course.objects.filter(pk=course_id)
+        courses.update(updated=Now(), **changes)
+        courses.update(rating=Case(
+            When(rating_count=0, then=Value(course_default)),
+            default=Round(Cast(F('rating_sum'), FloatField()) / F('rating_count')),
+            output_field=models.PositiveIntegerField(),
+        ))
+
+
+class CourseReview(models.Model):
+    """
+    A review of a course by one of its enrolled students.
+    Saving and deleting a review keeps the rating aggregates of the course up to date.
+    """
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='reviews')
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='course_reviews')
+    rating = models.PositiveSmallIntegerField(validators=[MinValueValidator(1), MaxValueValidator(5)])
+    comment = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('course', 'student')
+        indexes = [
+            models.Index(fields=['course', '-created', '-id'], name='review_course_created_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remember the stored rating, save() moves the course aggregates by the difference
+        instance._stored_rating = instance.__dict__.get('rating')
+        return instance
+
+    def save(self, *args, **kwargs):
+        """
+        Applies the rating change to the course aggregates, the delete is handled by the post_delete signal.
+        """
+        update_fields = kwargs.get('update_fields')
+        tracked = update_fields is None or 'rating' in update_fields
+        adding = self._state.adding
+
+        with transaction.atomic():
+            if tracked and not adding:
+                stored_rating = getattr(self, '_stored_rating', None)
+                if stored_rating is None:
+                    stored_rating = CourseReview.objects.filter(pk=self.pk).values_list('rating', flat=True).first()
+            super().save(*args, **kwargs)
+            if adding:
+                add_course_rating(self.course_id, new_rating=self.rating)
+            elif tracked and stored_rating != self.rating:
+                add_course_rating(self.course_id, old_rating=stored_rating, new_rating=self.rating)
+
+        self._stored_rating = self.rating
+
+    def __str__(self):
+        return f'{self.student} -> {self.course}: {self.rating}'
+
+
+class CourseStudentCounter(models.Model):
+    """
+    A shard of the enrollment counter of a course.
+    Enrollments increment a random shard, so concurrent purchases of one course rarely wait on the same row.
+    Removed enrollments decrement a random non-empty shard, the sum of the shards is the number of students.
+    """
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='student_counters')
+    shard = models.PositiveSmallIntegerField()
+    count = models.BigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('course', 'shard')
+
+    def __str__(self):
+        return f'{self.course_id} #{self.shard}: {self.count}'
+
+
+class CourseSearchDocument(models.Model):
+    """
+    A course entry of the search index.
+    Holds the weighted token count of the course, used for BM25 length normalization.
+    Only published courses are indexed.
+    """
+    course = models.OneToOneField(Course, on_delete=models.CASCADE, related_name='search_document')
+    length = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.course} ({self.length})'
+
+
+class CourseSearchStats(models.Model):
+    """
+    The single row of the search index totals used by BM25: the number of indexed courses and their summed length.
+    Kept up to date by the indexing with F() deltas, so a search never scans the whole index.
+    """
+    documents = models.IntegerField(default=0)
+    total_length = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.documents} documents'
+
+
+class CourseSearchTerm(models.Model):
+    """
+    A posting of the inverted search index: the weighted frequency of a term in a course.
+    """
+    term = models.CharField(max_length=64)
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='search_terms')
+    frequency = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['term', 'course'], name='unique_search_term_per_course')
+        ]
+
+    def __str__(self):
+        return f'{self.term} -> {self.course_id}'
@@ -0,0 +1,37 @@
+from rest_framework.pagination import PageNumberPagination
+
+from utils.pagination import KeysetPagination
+
+
+class CourseCursorPagination(KeysetPagination):
+    """
+    Cursor pagination for the course catalog, newest courses first.
+    Backed by the `course_published_created_idx` index on Course.
+    """
+    ordering = ('-created', '-id')
+    page_size = 20
+
+
+class HeadlineCursorPagination(KeysetPagination):
+    """
+    Cursor pagination for a course curriculum, in chapter order.
+    """
+    ordering = ('chapter_number', 'id')
+    page_size = 10
+
+
+class ReviewCursorPagination(KeysetPagination):
+    """
+    Cursor pagination for the reviews of a course, newest reviews first.
+    """
+    ordering = ('-created', '-id')
+    page_size = 10
+
+
+class CourseSearchPagination(PageNumberPagination):
+    """
+    Page number pagination for ranked search results.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
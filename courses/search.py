@@ -0,0 +1,170 @@
+import heapq
+import logging
+import math
+import re
+from collections import Counter, defaultdict
+
+from django.db import DatabaseError, transaction
+from django.db.models import Count, F, Sum
+
+from .models import (
+    Course, CourseSubDescription, SeasonVideos, CourseSearchDocument, CourseSearchStats, CourseSearchTerm,
+)
+
+# weight of each indexed field, a term in the title counts as three occurrences
+FIELD_WEIGHTS = {
+    'title': 3,
+    'sub_title': 2,
+    'video_title': 2,
+    'description': 1,
+    'sub_description': 1,
+}
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+MAX_TERM_LENGTH = 64
+MAX_QUERY_TERMS = 10
+# best matches kept by a search, deeper pages are not served
+MAX_SEARCH_RESULTS = 200
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+logger = logging.getLogger(__name__)
+
+
+def tokenize(text):
+    """
+    Splits text into lowercase index terms.
+    """
+    if not text:
+        return []
+    return [token[:MAX_TERM_LENGTH] for token in TOKEN_RE.findall(text.lower()) if len(token) > 1]
+
+
+def course_terms(course):
+    """
+    Returns the weighted term frequencies of a course.
+    """
+    terms = Counter()
+
+    def add(text, field):
+        weight = FIELD_WEIGHTS[field]
+        for token in tokenize(text):
+            terms[token] += weight
+
+    add(course.title, 'title')
+    add(course.description, 'description')
+
+    for sub_title, sub_description in CourseSubDescription.objects.filter(course=course).values_list(
+            'sub_title', 'sub_description'):
+        add(sub_title, 'sub_title')
+        add(sub_description, 'sub_description')
+
+    for video_title in SeasonVideos.objects.filter(headline__course=course).values_list('video_title', flat=True):
+        add(video_title, 'video_title')
+
+    return terms
+
+
+def index_course(course_id):
+    """
+    Rebuilds the index entries of a single course.
+    Unpublished or deleted courses are removed from the index.
+    """
+    with transaction.atomic():
+        # the course row lock serializes the reindexes of the course, two of them can not insert the same terms
+        # or both read the old document length
+        course = Course.objects.select_for_update().filter(pk=course_id).first()
+        CourseSearchTerm.objects.filter(course_id=course_id).delete()
+
+        if course is None or course.release_status != Course.CourseReleaseStatus.published:
+            CourseSearchDocument.objects.filter(course_id=course_id).delete()
+            return
+
+        terms = course_terms(course)
+        CourseSearchTerm.objects.bulk_create(
+            CourseSearchTerm(term=term, course_id=course_id, frequency=frequency)
+            for term, frequency in terms.items()
+        )
+        length = sum(terms.values())
+        old_length = CourseSearchDocument.objects.filter(course_id=course_id).values_list('length', flat=True).first()
+        CourseSearchDocument.objects.update_or_create(course_id=course_id, defaults={'length': length})
+        if old_length is None:
+            add_search_stats(1, length)
+        else:
+            add_search_stats(0, length - old_length)
+
+
+def add_search_stats(documents, length):
+    """
+    Adds deltas to the index totals, the row is rebuilt from the index when it is missing.
+    Document deletions, cascades included, are counted by the CourseSearchDocument post_delete signal.
+    """
+    if not CourseSearchStats.objects.filter(pk=1).update(
+            documents=F('documents') + documents, total_length=F('total_length') + length):
+        rebuild_search_stats()
+
+
+def rebuild_search_stats():
+    """
+    Recomputes the index totals from the indexed courses, returns (documents, total_length).
+    """
+    totals = CourseSearchDocument.objects.aggregate(documents=Count('id'), total_length=Sum('length'))
+    documents, total_length = totals['documents'], totals['total_length'] or 0
+    CourseSearchStats.objects.update_or_create(
+        pk=1, defaults={'documents': documents, 'total_length': total_length}
+    )
+    return documents, total_length
+
+
+def schedule_index_course(course_id):
+    """
+    Reindexes the course once the current transaction commits.
+    """
+    transaction.on_commit(lambda: _index_or_retry(course_id))
+
+
+def _index_or_retry(course_id):
+    # runs after the request's writes are committed, a failure is retried by a job instead of a 500
+    try:
+        index_course(course_id)
+    except DatabaseError:
+        logger.exception('Reindexing course %s failed, retrying in the background', course_id)
+        from .tasks import reindex_course
+
+        reindex_course.enqueue(course_id=course_id)
+
+
+def search_courses(query):
+    """
+    Ranks the indexed courses against the query with BM25.
+    Returns the MAX_SEARCH_RESULTS best (course_id, score) pairs, best match first.
+    The index totals are read from CourseSearchStats, only the postings of the query terms are loaded.
+    """
+    terms = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+    if not terms:
+        return []
+
+    stats = CourseSearchStats.objects.filter(pk=1).values_list('documents', 'total_length').first()
+    total, total_length = stats if stats is not None else rebuild_search_stats()
+    if total <= 0:
+        return []
+    average_length = total_length / total or 1
+
+    postings = defaultdict(list)
+    for term, course_id, frequency, length in CourseSearchTerm.objects.filter(term__in=terms).values_list(
+            'term', 'course_id', 'frequency', 'course__search_document__length'):
+        postings[term].append((course_id, frequency, length or 0))
+
+    scores = defaultdict(float)
+    for term, entries in postings.items():
+        document_frequency = len(entries)
+        idf = math.log(1 + (total - document_frequency + 0.5) / (document_frequency + 0.5))
+        for course_id, frequency, length in entries:
+            norm = K1 * (1 - B + B * length / average_length)
+            scores[course_id] += idf * frequency * (K1 + 1) / (frequency + norm)
+
+    # ties go to the lower course id, as with a full sort
+    return heapq.nlargest(MAX_SEARCH_RESULTS, scores.items(), key=lambda item: (item[1], -item[0]))
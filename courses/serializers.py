@@ -1,16 +1,47 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count
 from rest_framework import serializers
-from .models import Category, Course, CourseSubDescription, CourseHeadlines, SeasonVideos
+from rest_framework.reverse import reverse
+
+from utils.images import ImageVariantsField
+from utils.serializers import ValuesSerializerMixin
+from .models import Category, Course, CourseSubDescription, CourseHeadlines, SeasonVideos, CourseReview, Enrollment
+
+
+class HlsPlaylistUrlField(serializers.Field):
+    """
+    Read-only field returning the URL of the video's HLS master playlist,
+    None until the current video file is packaged.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, video):
+        if video.hls_status != SeasonVideos.HlsStatus.ready or video.needs_hls_packaging():
+            return None
+        return reverse('courses:video_hls', kwargs={'pk': video.pk, 'name': 'master.m3u8'},
+                       request=self.context.get('request'))
 
 
 class SeasonVideosSerializer(serializers.ModelSerializer):
     """
       Serializer for SeasonVideos model.
       Converts SeasonVideos instances into JSON format and vice versa.
+      The video file is exposed through the enrollment-checked stream URL.
     """
 
+    # URL to stream the video
+    stream_url = serializers.HyperlinkedIdentityField(view_name='courses:video_stream')
+    # adaptive-bitrate master playlist
+    hls_playlist_url = HlsPlaylistUrlField()
+
     class Meta:
         model = SeasonVideos
-        fields = ['video_title', 'video_file', 'description', 'attached_file', 'duration', 'is_free']
+        fields = ['video_title', 'stream_url', 'hls_playlist_url', 'description', 'attached_file', 'duration',
+                  'is_free']
 
 
 class CourseHeadlineSerializer(serializers.ModelSerializer):
@@ -31,15 +62,35 @@ class CourseHeadlineSerializer(serializers.ModelSerializer):
         return f'{duration} min'
 
 
+class CourseHeadlineSummarySerializer(serializers.ModelSerializer):
+    """
+    Lightweight serializer for CourseHeadlines used in the course detail.
+    Expects the queryset to be annotated with `videos_count`, the videos are served by the curriculum endpoint.
+    """
+
+    duration = serializers.SerializerMethodField()
+    videos_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = CourseHeadlines
+        fields = ['headline_title', 'chapter_number', 'duration', 'videos_count']
+
+    def get_duration(self, obj):
+        duration = str(obj.duration).replace('.', ':')
+        return f'{duration} min'
+
+
 class CategorySerializer(serializers.ModelSerializer):
     """
     Serializer for the Category model.
     Provides category name and slug information.
+    Expects the queryset to be annotated with `courses_count`, the number of published courses.
     """
+    courses_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Category
-        fields = ['name', 'slug']
+        fields = ['name', 'slug', 'courses_count']
 
 
 class CourseSubDescriptionSerializer(serializers.ModelSerializer):
@@ -47,18 +98,54 @@ class CourseSubDescriptionSerializer(serializers.ModelSerializer):
     Serializer for the CourseSubDescription model.
     Handles course sub-title, image, and sub-description fields.
     """
+    image_variants = ImageVariantsField(image_field='image')  # Resized image URLs
 
     class Meta:
         model = CourseSubDescription
-        fields = ['sub_title', 'image', 'sub_description']
+        fields = ['sub_title', 'image', 'image_variants', 'sub_description']
+
 
+class CourseReviewSerializer(serializers.ModelSerializer):
+    """
+    Serializer for course reviews.
+    Only enrolled students can review a course, once.
+    """
+    student = serializers.StringRelatedField()  # Reviewer name
 
-class CourseListSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CourseReview
+        fields = ['id', 'student', 'rating', 'comment', 'created', 'updated']
+
+    def validate(self, data):
+        if self.instance is None:
+            course = self.context['course']
+            student = self.context['request'].user
+            if not Enrollment.objects.filter(student=student, course=course).exists():
+                raise serializers.ValidationError({'message': 'Only enrolled students can review this course'})
+            if CourseReview.objects.filter(student=student, course=course).exists():
+                raise serializers.ValidationError({'message': 'You have already reviewed this course'})
+        return data
+
+    def create(self, validated_data):
+        # two concurrent requests can both pass validate(), the unique constraint rejects the second
+        try:
+            with transaction.atomic():
+                return CourseReview.objects.create(
+                    course=self.context['course'], student=self.context['request'].user, **validated_data
+                )
+        except IntegrityError:
+            raise serializers.ValidationError({'message': 'You have already reviewed this course'})
+
+
+class CourseListSerializer(ValuesSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for listing courses with essential details.
+    Supports the values() read mode for the list endpoints.
     """
     category = serializers.StringRelatedField()  # Course category name
     teacher = serializers.StringRelatedField()  # Course instructor name
+    thumbnail_variants = ImageVariantsField(image_field='thumbnail')  # Resized thumbnail URLs
+    rating_average = serializers.DecimalField(max_digits=3, decimal_places=2, read_only=True)
 
     # URL to course details
     detail_url = serializers.HyperlinkedIdentityField(
@@ -69,27 +156,39 @@ class CourseListSerializer(serializers.ModelSerializer):
     class Meta:
         model = Course
         fields = [
-            'category', 'title', 'thumbnail', 'teacher', 'price', 'final_price', 'detail_url', 'is_free'
+            'category', 'title', 'thumbnail', 'thumbnail_variants', 'teacher', 'price', 'final_price', 'detail_url',
+            'is_free', 'rating', 'rating_average', 'rating_count'
         ]
+        values_sources = {
+            'category': 'category__name',
+            'teacher': 'teacher__username',
+            'rating_average': ('rating_sum', 'rating_count', Course.compute_rating_average),
+        }
 
 
 class CourseDetailSerializer(serializers.ModelSerializer):
     """
     Serializer for retrieving detailed course information.
+    number_of_students is folded from the sharded enrollment counters by a delayed job,
+    it lags the enrollments by up to FOLD_DELAY (see courses/counters.py).
     """
     sub_descriptions = CourseSubDescriptionSerializer(many=True)  # Additional course descriptions
-    headlines = serializers.SerializerMethodField()  # Active course sections
+    headlines = serializers.SerializerMethodField()  # Active course sections summary
     teacher = serializers.StringRelatedField()  # Course instructor name
+    thumbnail_variants = ImageVariantsField(image_field='thumbnail')  # Resized thumbnail URLs
     duration = serializers.SerializerMethodField()
+    rating_average = serializers.DecimalField(max_digits=3, decimal_places=2, read_only=True)
+    rating_histogram = serializers.DictField(child=serializers.IntegerField(), read_only=True)  # Reviews per rating
 
     class Meta:
         model = Course
-        fields = '__all__'
+        exclude = ['rating_sum', 'rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5']
 
     def get_duration(self, obj):
         duration = str(obj.duration).replace('.', ':')
         return f'{duration} min'
 
     def get_headlines(self, obj):
-        result = obj.headlines.filter(is_active=True)
-        return CourseHeadlineSerializer(instance=result, many=True).data
\ No newline at end of file
+        result = obj.headlines.filter(is_active=True).annotate(videos_count=Count('videos')).order_by(
+            'chapter_number', 'id')
+        return CourseHeadlineSummarySerializer(instance=result, many=True).data
\ No newline at end of file
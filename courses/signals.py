@@ -0,0 +1,139 @@
+import os
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from utils.hls import delete_hls_files
+from utils.images import needs_variants, remember_image_variants, delete_image_variants_on_commit
+
+from .cache import invalidate_course_document, invalidate_categories, invalidate_catalog
+from .counters import add_students
+from .models import (
+    Category, Course, CourseSubDescription, CourseHeadlines, SeasonVideos, Enrollment, CourseReview, add_headline_duration,
+    add_course_rating, touch_course, CourseSearchDocument,
+)
+from .search import schedule_index_course, add_search_stats
+from .tasks import generate_thumbnail_variants, generate_sub_description_image_variants, package_video_hls
+
+# fields whose change requires the course to be reindexed
+COURSE_SEARCH_FIELDS = {'title', 'description', 'release_status'}
+VIDEO_SEARCH_FIELDS = {'video_title', 'headline'}
+
+
+def _touches(update_fields, fields):
+    return update_fields is None or bool(fields & set(update_fields))
+
+
+@receiver([post_save, post_delete], sender=Course)
+def course_changed(sender, instance, **kwargs):
+    invalidate_course_document(instance.pk)
+    if kwargs.get('signal') is post_save:
+        if instance.catalog_placement_changed():
+            invalidate_categories()
+        if _touches(kwargs.get('update_fields'), COURSE_SEARCH_FIELDS):
+            schedule_index_course(instance.pk)
+        if _touches(kwargs.get('update_fields'), {'thumbnail'}) and \
+                needs_variants(instance, 'thumbnail', 'thumbnail_variants'):
+            generate_thumbnail_variants.enqueue(course_id=instance.pk)
+    else:
+        invalidate_categories()
+        delete_image_variants_on_commit(instance, 'thumbnail', 'thumbnail_variants')
+
+
+@receiver([post_save, post_delete], sender=Category)
+def category_changed(sender, instance, **kwargs):
+    invalidate_categories()
+    invalidate_catalog()
+
+
+@receiver([post_save, post_delete], sender=CourseSubDescription)
+def sub_description_changed(sender, instance, **kwargs):
+    invalidate_course_document(instance.course_id)
+    schedule_index_course(instance.course_id)
+    if kwargs.get('signal') is post_save:
+        if needs_variants(instance, 'image', 'image_variants'):
+            generate_sub_description_image_variants.enqueue(sub_description_id=instance.pk)
+    else:
+        touch_course(instance.course_id)
+        delete_image_variants_on_commit(instance, 'image', 'image_variants')
+
+
+@receiver(pre_delete, sender=Course)
+def course_deleting(sender, instance, **kwargs):
+    remember_image_variants(instance, 'thumbnail_variants')
+
+
+@receiver(pre_delete, sender=CourseSubDescription)
+def sub_description_deleting(sender, instance, **kwargs):
+    remember_image_variants(instance, 'image_variants')
+
+
+@receiver([post_save, post_delete], sender=CourseHeadlines)
+def headline_changed(sender, instance, **kwargs):
+    invalidate_course_document(instance.course_id)
+    if kwargs.get('signal') is post_delete:
+        touch_course(instance.course_id)
+
+
+@receiver([post_save, post_delete], sender=SeasonVideos)
+def video_changed(sender, instance, **kwargs):
+    course_id = instance.headline.course_id
+    invalidate_course_document(course_id)
+    if _touches(kwargs.get('update_fields'), VIDEO_SEARCH_FIELDS):
+        schedule_index_course(course_id)
+    if kwargs.get('signal') is post_save:
+        # a job already queued or running for this file packages it, saving other fields queues nothing
+        queued = instance.hls_status in (SeasonVideos.HlsStatus.pending, SeasonVideos.HlsStatus.processing)
+        if (_touches(kwargs.get('update_fields'), {'video_file'}) and instance.needs_hls_packaging()
+                and (instance.video_file_changed() or not queued)):
+            if instance.hls_status != SeasonVideos.HlsStatus.pending:
+                instance.hls_status = SeasonVideos.HlsStatus.pending
+                SeasonVideos.objects.filter(pk=instance.pk).update(hls_status=instance.hls_status)
+            package_video_hls.enqueue(video_id=instance.pk)
+    else:
+        touch_course(course_id)
+        if instance.hls_playlist:
+            storage, directory = instance.video_file.storage, os.path.dirname(instance.hls_playlist)
+            transaction.on_commit(lambda: delete_hls_files(storage, directory))
+
+
+@receiver(post_delete, sender=SeasonVideos)
+def video_deleted(sender, instance, **kwargs):
+    """
+    Removes the duration of a deleted video from its headline and course totals.
+    Runs for cascades and queryset deletes as well.
+    """
+    headline_id, duration = instance.headline_id, getattr(instance, '_stored_duration', None)
+    if duration is None:
+        duration = instance.duration
+    add_headline_duration(headline_id, -duration)
+
+
+@receiver([post_save, post_delete], sender=Enrollment)
+def enrollment_changed(sender, instance, **kwargs):
+    """
+    Counts the enrollment in the sharded student counters of the course.
+    Bulk enrollments skip the signals and call add_students themselves.
+    """
+    if kwargs.get('signal') is post_delete:
+        add_students([instance.course_id], -1)
+    elif kwargs.get('created'):
+        add_students([instance.course_id], 1)
+
+
+@receiver([post_save, post_delete], sender=CourseReview)
+def review_changed(sender, instance, **kwargs):
+    invalidate_course_document(instance.course_id)
+    if kwargs.get('signal') is post_delete:
+        # removes the rating of a deleted review from the course aggregates, for cascades as well
+        rating = getattr(instance, '_stored_rating', None) or instance.rating
+        add_course_rating(instance.course_id, old_rating=rating)
+
+
+@receiver(post_delete, sender=CourseSearchDocument)
+def search_document_deleted(sender, instance, **kwargs):
+    """
+    Removes the deleted course from the search index totals, for cascades as well.
+    """
+    add_search_stats(-1, -instance.length)
@@ -0,0 +1,107 @@
+import os
+import secrets
+import tempfile
+
+from django.core.files import File
+from django.db.models.functions import Now
+
+from jobs.queue import task
+from utils.hls import package_hls, delete_hls_files
+from utils.images import build_image_variants, needs_variants
+from utils.video import probe_durations
+
+from .cache import invalidate_course_document
+from .counters import fold_student_counters as fold_counters
+from .search import index_course
+from .models import (
+    Course, CourseSubDescription, SeasonVideos, THUMBNAIL_VARIANTS, SUB_DESCRIPTION_IMAGE_VARIANTS, hls_upload_dir,
+    touch_course,
+)
+
+
+@task
+def probe_video_durations(video_ids):
+    """
+    Decodes the videos whose container metadata could not be read and stores their durations.
+    The videos are probed in parallel, each save moves the headline and course totals.
+    """
+    videos = [video for video in SeasonVideos.objects.filter(pk__in=video_ids) if video.video_file]
+    durations = probe_durations(video.video_file.path for video in videos)
+    for video, duration in zip(videos, durations):
+        video.duration = duration
+        video.save(update_fields=['duration'])
+
+
+@task(max_attempts=3)
+def package_video_hls(video_id):
+    """
+    Transcodes a season video into HLS renditions and stores them in a new directory next to the videos.
+    The playlist of the previous upload is deleted once the new one is ready.
+    """
+    video = SeasonVideos.objects.select_related('headline').filter(pk=video_id).first()
+    if video is None or not video.needs_hls_packaging():
+        return
+
+    source = video.video_file.name
+    current = SeasonVideos.objects.filter(pk=video_id, video_file=source)
+    current.update(hls_status=SeasonVideos.HlsStatus.processing)
+
+    storage = video.video_file.storage
+    directory = hls_upload_dir(video, secrets.token_hex(6))
+    try:
+        with tempfile.TemporaryDirectory() as output_dir:
+            for name in package_hls(video.video_file.path, output_dir):
+                with open(os.path.join(output_dir, name), 'rb') as file:
+                    storage.save(f'{directory}/{name}', File(file))
+    except Exception:
+        delete_hls_files(storage, directory)
+        current.update(hls_status=SeasonVideos.HlsStatus.failed)
+        raise
+
+    # the video file may have been replaced meanwhile, its own job packages the new file
+    if current.update(hls_status=SeasonVideos.HlsStatus.ready, hls_playlist=f'{directory}/master.m3u8',
+                      hls_source=source, updated=Now()):
+        delete_hls_files(storage, os.path.dirname(video.hls_playlist))
+        invalidate_course_document(video.headline.course_id)
+    else:
+        delete_hls_files(storage, directory)
+
+
+@task
+def fold_student_counters(course_ids):
+    """
+    Writes the enrollment counter shards of the courses to Course.number_of_students.
+    """
+    fold_counters(course_ids)
+
+
+@task
+def reindex_course(course_id):
+    """
+    Retries a search reindex that failed in the request.
+    """
+    index_course(course_id)
+
+
+@task
+def generate_thumbnail_variants(course_id):
+    """
+    Generates the card, retina and detail variants of a course thumbnail.
+    """
+    course = Course.objects.filter(pk=course_id).first()
+    if course is not None and needs_variants(course, 'thumbnail', 'thumbnail_variants'):
+        build_image_variants(course, 'thumbnail', 'thumbnail_variants', THUMBNAIL_VARIANTS)
+        touch_course(course_id)
+        invalidate_course_document(course_id)
+
+
+@task
+def generate_sub_description_image_variants(sub_description_id):
+    """
+    Generates the card, retina and detail variants of a course sub description image.
+    """
+    sub_description = CourseSubDescription.objects.filter(pk=sub_description_id).first()
+    if sub_description is not None and needs_variants(sub_description, 'image', 'image_variants'):
+        build_image_variants(sub_description, 'image', 'image_variants', SUB_DESCRIPTION_IMAGE_VARIANTS)
+        touch_course(sub_description.course_id)
+        invalidate_course_document(sub_description.course_id)
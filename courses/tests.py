@@ -1,3 +1,1039 @@
-from django.test import TestCase
+import io
+import math
+import os
+import shutil
+import struct
+import tempfile
+import time
+from datetime import timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
+from django.db.models import Avg, Count, QuerySet, Sum
+from django.test import Client, SimpleTestCase, TestCase, RequestFactory, override_settings
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.models import User
+from jobs.models import Job
+from jobs.queue import claim_job, run_job
+from love_code_learn.urls import public_media_urlpatterns
+from utils.streaming import parse_range, stream_file
+from utils.video import probe_duration, probe_file_duration, read_container_duration
+from .models import (
+    Category, Course, CourseHeadlines, CourseReview, CourseSearchDocument, CourseSearchStats, CourseSearchTerm,
+    CourseStudentCounter, Enrollment, SeasonVideos,
+)
+from .cache import CATEGORIES_VERSION_KEY, get_catalog_version, get_categories, get_course_document_version
+from .counters import STUDENT_COUNTER_SHARDS, add_students
+from .filters import PRICE_RANGES
+from .search import index_course, rebuild_search_stats, schedule_index_course, search_courses
+from .serializers import CourseListSerializer
+
+
+class CourseListValuesParityTest(TestCase):
+    """
+    The values() read mode of CourseListSerializer must render the same bytes as the instance mode.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        teacher = User.objects.create_user(phone_number='09120000001', password='x', username='teacher',
+                                           role='teacher')
+        student = User.objects.create_user(phone_number='09120000002', password='x', username='student')
+        category = Category.objects.create(name='Python', slug='python')
+        cls.rated = Course.objects.create(
+            category=category, teacher=teacher, thumbnail='courses/images/thumbnail/python.png', title='Python',
+            description='d', slug='python', price=1000, release_status='published',
+        )
+        cls.free = Course.objects.create(
+            category=category, teacher=teacher, thumbnail='', title='Free', description='d',
+            slug='free-course', price=0, release_status='published',
+        )
+        cls.stale = Course.objects.create(
+            category=category, teacher=teacher, thumbnail='courses/images/thumbnail/py.png', title='Stale variants',
+            description='d', slug='old-variants', price=500, release_status='published',
+        )
+        Course.objects.filter(pk=cls.rated.pk).update(thumbnail_variants={
+            'source': 'courses/images/thumbnail/python.png',
+            'card': {'webp': 'courses/images/variants/python_card.webp',
+                     'jpeg': 'courses/images/variants/python_card.jpg'},
+        })
+        # variants of a previous thumbnail are not exposed
+        Course.objects.filter(pk=cls.stale.pk).update(thumbnail_variants={
+            'source': 'courses/images/thumbnail/old.png',
+            'card': {'webp': 'courses/images/variants/old_card.webp'},
+        })
+        Enrollment.objects.create(student=student, course=cls.rated)
+        CourseReview.objects.create(course=cls.rated, student=student, rating=4)
+
+    def assertParity(self, queryset, request):
+        context = {'request': request}
+        expected = CourseListSerializer(queryset, many=True, context=context).data
+        actual = CourseListSerializer.values_data(queryset, context=context)
+        self.assertEqual(JSONRenderer().render(actual), JSONRenderer().render(expected))
+
+    def test_values_data_matches_serializer(self):
+        request = Request(RequestFactory().get('/courses/'))
+        queryset = Course.objects.order_by('pk')
+        self.assertEqual(len(CourseListSerializer.values_data(queryset, context={'request': request})), 3)
+        self.assertParity(queryset, request)
+
+    def test_course_list_view_matches_serializer(self):
+        response = self.client.get('/courses/')
+        request = Request(RequestFactory().get('/courses/'))
+        courses = Course.objects.filter(release_status='published').order_by('-created', '-id')
+        expected = CourseListSerializer(courses, many=True, context={'request': request}).data
+        self.assertEqual(JSONRenderer().render(response.json()['results']), JSONRenderer().render(expected))
+
+
+def mp4_box(kind, body):
+    return struct.pack('>I4s', 8 + len(body), kind) + body
+
+
+def ebml_element(element_id, body, size=None):
+    """
+    Encodes a Matroska element, `size` overrides the encoded data size, 0xff is an unknown size.
+    """
+    return element_id + (size or bytes([0x80 | len(body)])) + body
+
+
+class ContainerDurationTest(SimpleTestCase):
+    """
+    The durations are read from the container headers, without decoding the video.
+    """
+
+    def test_mp4(self):
+        # mvhd version 0: flags, creation and modification time, timescale, duration
+        mvhd = mp4_box(b'mvhd', bytes(4) + bytes(8) + struct.pack('>II', 1000, 90_000) + bytes(80))
+        video = io.BytesIO(mp4_box(b'ftyp', b'isom' + bytes(4)) + mp4_box(b'moov', mvhd) + mp4_box(b'mdat', bytes(16)))
+        video.seek(5)
+        self.assertEqual(read_container_duration(video), 90)
+        self.assertEqual(video.tell(), 5)
+        self.assertEqual(probe_file_duration(video), 1.5)
+
+    def test_mp4_version_1(self):
+        mvhd = mp4_box(b'mvhd', b'\x01' + bytes(3) + bytes(16) + struct.pack('>IQ', 600, 600 * 150) + bytes(80))
+        video = io.BytesIO(mp4_box(b'ftyp', b'isom' + bytes(4)) + mp4_box(b'moov', mvhd))
+        self.assertEqual(probe_file_duration(video), 2.5)
+
+    def test_matroska(self):
+        info = ebml_element(b'\x15\x49\xa9\x66', (
+            ebml_element(b'\x2a\xd7\xb1', (1_000_000).to_bytes(3, 'big'))
+            + ebml_element(b'\x44\x89', struct.pack('>d', 120_000.0))
+        ))
+        video = io.BytesIO(
+            ebml_element(b'\x1a\x45\xdf\xa3', b'')
+            + ebml_element(b'\x18\x53\x80\x67', info, size=b'\xff')  # segment of unknown size
+        )
+        self.assertEqual(read_container_duration(video), 120)
+        self.assertEqual(probe_file_duration(video), 2)
+
+    def test_matroska_float_duration_and_scale(self):
+        info = ebml_element(b'\x15\x49\xa9\x66', (
+            ebml_element(b'\x2a\xd7\xb1', (10_000_000).to_bytes(3, 'big'))
+            + ebml_element(b'\x44\x89', struct.pack('>f', 4_500.0))
+        ))
+        video = io.BytesIO(ebml_element(b'\x1a\x45\xdf\xa3', b'') + ebml_element(b'\x18\x53\x80\x67', info))
+        self.assertEqual(read_container_duration(video), 45)
+
+    def test_unknown_or_truncated_container(self):
+        self.assertIsNone(read_container_duration(io.BytesIO(b'not a video file')))
+        self.assertIsNone(read_container_duration(io.BytesIO(mp4_box(b'ftyp', b'isom')[:10] + b'\x00\x00')))
+        self.assertIsNone(read_container_duration(io.BytesIO(b'\x1a\x45\xdf\xa3\x80\x18')))
+
+    def test_probe_duration_logs_unreadable_file(self):
+        with self.assertLogs('utils.video', level='ERROR') as logs:
+            self.assertEqual(probe_duration('/nonexistent/video.mp4'), 0)
+        self.assertIn('/nonexistent/video.mp4', logs.output[0])
+
+
+class VideoDurationTotalsTest(TestCase):
+    """
+    Saving and deleting videos keeps the headline and course durations equal to the sum of their videos.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        teacher = User.objects.create_user(phone_number='09120000001', password='x', username='teacher',
+                                           role='teacher')
+        category = Category.objects.create(name='Python', slug='python')
+        cls.course, cls.other_course = [
+            Course.objects.create(category=category, teacher=teacher, thumbnail='', title=slug, description='d',
+                                  slug=slug, price=1000, release_status='published')
+            for slug in ('python', 'django')
+        ]
+
+    def setUp(self):
+        self.first = CourseHeadlines.objects.create(course=self.course, headline_title='First', chapter_number=1)
+        self.second = CourseHeadlines.objects.create(course=self.course, headline_title='Second', chapter_number=2)
+        self.other = CourseHeadlines.objects.create(course=self.other_course, headline_title='Other',
+                                                    chapter_number=1)
+
+    def add_video(self, headline, duration):
+        return SeasonVideos.objects.create(headline=headline, video_title='video', video_file='video.mp4',
+                                           duration=duration)
+
+    def assertDurations(self, first, second, other):
+        durations = dict(CourseHeadlines.objects.values_list('pk', 'duration'))
+        self.assertEqual(
+            (durations[self.first.pk], durations[self.second.pk], durations[self.other.pk]),
+            (Decimal(first), Decimal(second), Decimal(other)),
+        )
+        courses = dict(Course.objects.values_list('pk', 'duration'))
+        self.assertEqual((courses[self.course.pk], courses[self.other_course.pk]),
+                         (Decimal(first) + Decimal(second), Decimal(other)))
+
+    def test_create_and_change(self):
+        video = self.add_video(self.first, '1.50')
+        self.add_video(self.first, 2)
+        self.assertDurations('3.50', 0, 0)
+
+        video.duration = '4.25'
+        video.save()
+        self.assertDurations('6.25', 0, 0)
+
+        video.duration = 1
+        video.save(update_fields=['duration'])
+        self.assertDurations('3', 0, 0)
+
+        # a copy loaded from the database saves the difference to its stored duration
+        loaded = SeasonVideos.objects.get(pk=video.pk)
+        loaded.duration = 2
+        loaded.save()
+        self.assertDurations('4', 0, 0)
+
+    def test_move_between_headlines(self):
+        video = self.add_video(self.first, '1.50')
+        self.add_video(self.first, 2)
+
+        video.headline = self.second
+        video.save()
+        self.assertDurations(2, '1.50', 0)
+
+        # to another course, with a new duration
+        video.headline = self.other
+        video.duration = 3
+        video.save()
+        self.assertDurations(2, 0, 3)
+
+    def test_delete(self):
+        video = self.add_video(self.first, '1.50')
+        self.add_video(self.first, 2)
+        self.add_video(self.second, 4)
+        self.add_video(self.other, 5)
+
+        video.delete()
+        self.assertDurations(2, 4, 5)
+        SeasonVideos.objects.filter(headline=self.second).delete()
+        self.assertDurations(2, 0, 5)
+        self.other.delete()
+        self.assertEqual(Course.objects.get(pk=self.other_course.pk).duration, 0)
+
+    def test_recompute_matches_totals(self):
+        self.add_video(self.first, '1.50')
+        self.add_video(self.second, '2.25')
+        self.add_video(self.other, 3)
+        CourseHeadlines.objects.update(duration=0)
+        Course.objects.update(duration=0)
+        call_command('recompute_durations', stdout=io.StringIO())
+        self.assertDurations('1.50', '2.25', 3)
+
+
+class BulkUploadTest(TestCase):
+    """
+    A bulk upload stores the videos with the durations read from their headers and defers
+    the files that must be decoded to one `probe_video_durations` job.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user(phone_number='09120000001', password='x', username='teacher',
+                                               role='teacher')
+        category = Category.objects.create(name='Python', slug='python')
+        cls.course = Course.objects.create(category=category, teacher=cls.teacher, thumbnail='', title='Python',
+                                           description='d', slug='python', price=1000, release_status='published')
+        cls.headline = CourseHeadlines.objects.create(course=cls.course, headline_title='First', chapter_number=1)
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = Client(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.teacher).access_token}')
+
+    def mp4(self, name, seconds):
+        mvhd = mp4_box(b'mvhd', bytes(4) + bytes(8) + struct.pack('>II', 1000, seconds * 1000) + bytes(80))
+        video = io.BytesIO(mp4_box(b'ftyp', b'isom' + bytes(4)) + mp4_box(b'moov', mvhd) + mp4_box(b'mdat', bytes(16)))
+        video.name = name
+        return video
+
+    def upload(self, videos, **data):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/accounts/videos/bulk-upload/', {'headline': self.headline.pk,
+                                                                      'videos': videos, **data})
+
+    def durations(self):
+        return (CourseHeadlines.objects.get(pk=self.headline.pk).duration,
+                Course.objects.get(pk=self.course.pk).duration)
+
+    def test_upload_and_deferred_probe(self):
+        undecodable = io.BytesIO(b'not a container header')
+        undecodable.name = 'closing_words.avi'
+        response = self.upload([self.mp4('intro.mp4', 90), self.mp4('part_two.mp4', 150), undecodable])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {'message': '3 videos successfully created!'})
+
+        videos = list(SeasonVideos.objects.filter(headline=self.headline).order_by('pk'))
+        self.assertEqual([(video.video_title, video.duration) for video in videos],
+                         [('intro', Decimal('1.50')), ('part two', Decimal('2.50')), ('closing words', 0)])
+        self.assertEqual(self.durations(), (Decimal('4.00'), Decimal('4.00')))
+
+        # one job decodes the files without a readable header, each video is packaged by its own job
+        probe = Job.objects.get(name='courses.tasks.probe_video_durations')
+        self.assertEqual(probe.payload, {'video_ids': [videos[2].pk]})
+        self.assertEqual(sorted(Job.objects.filter(name='courses.tasks.package_video_hls')
+                                .values_list('payload__video_id', flat=True)), [video.pk for video in videos])
+
+        with mock.patch('utils.video.probe_duration', return_value=3.25) as probe_duration:
+            self.assertEqual(run_job(probe).status, 'done')
+        probe_duration.assert_called_once_with(videos[2].video_file.path)
+        self.assertEqual(SeasonVideos.objects.get(pk=videos[2].pk).duration, Decimal('3.25'))
+        self.assertEqual(self.durations(), (Decimal('7.25'), Decimal('7.25')))
+
+    def test_no_deferred_probe(self):
+        response = self.upload([self.mp4('intro.mp4', 60), self.mp4('outro.mp4', 30)], titles=['Hello', 'Bye'])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(list(SeasonVideos.objects.order_by('pk').values_list('video_title', flat=True)),
+                         ['Hello', 'Bye'])
+        self.assertEqual(self.durations(), (Decimal('1.50'), Decimal('1.50')))
+        self.assertFalse(Job.objects.filter(name='courses.tasks.probe_video_durations').exists())
+
+    def test_invalid(self):
+        response = self.upload([self.mp4('intro.mp4', 60), self.mp4('outro.mp4', 30)], titles=['Hello'])
+        self.assertEqual(response.status_code, 400)
+
+        other = User.objects.create_user(phone_number='09120000002', password='x', username='other',
+                                         role='teacher')
+        self.client = Client(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(other).access_token}')
+        self.assertEqual(self.upload([self.mp4('intro.mp4', 60)]).status_code, 400)
+        self.assertFalse(SeasonVideos.objects.exists())
+        self.assertEqual(self.durations(), (0, 0))
+
+
+class ParseRangeTest(SimpleTestCase):
+
+    def test_ranges(self):
+        self.assertEqual(parse_range('bytes=0-99', 1000), (0, 99))
+        self.assertEqual(parse_range('bytes=900-2000', 1000), (900, 999))
+        # open-ended
+        self.assertEqual(parse_range('bytes=100-', 1000), (100, 999))
+        # suffix, longer than the file serves all of it
+        self.assertEqual(parse_range('bytes=-100', 1000), (900, 999))
+        self.assertEqual(parse_range('bytes=-5000', 1000), (0, 999))
+
+    def test_unsatisfiable(self):
+        self.assertIs(parse_range('bytes=1000-', 1000), False)
+        self.assertIs(parse_range('bytes=500-100', 1000), False)
+        self.assertIs(parse_range('bytes=-0', 1000), False)
+
+    def test_ignored(self):
+        for header in ('bytes=0-99,200-299', 'bytes=-', 'items=0-99', 'bytes=a-b'):
+            self.assertIsNone(parse_range(header, 1000), header)
+
+
+@override_settings(SENDFILE_BACKEND=None)
+class StreamFileTest(SimpleTestCase):
+    """
+    Range requests on a stored file, validated with If-Range.
+    """
+
+    def setUp(self):
+        file = tempfile.NamedTemporaryFile(suffix='.mp4', delete=False)
+        self.content = bytes(range(256)) * 4
+        file.write(self.content)
+        file.close()
+        self.addCleanup(os.remove, file.name)
+        self.field_file = SimpleNamespace(path=file.name, name='videos/video.mp4')
+
+    def get(self, **headers):
+        response = stream_file(RequestFactory().get('/video/', headers=headers), self.field_file)
+        self.addCleanup(response.close)
+        return response
+
+    def body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_full_file(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(self.body(response), self.content)
+
+    def test_range(self):
+        response = self.get(range='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/1024')
+        self.assertEqual(response['Content-Length'], '10')
+        self.assertEqual(self.body(response), self.content[10:20])
+
+    def test_suffix_and_open_ended_ranges(self):
+        response = self.get(range='bytes=-24')
+        self.assertEqual(response['Content-Range'], 'bytes 1000-1023/1024')
+        self.assertEqual(self.body(response), self.content[-24:])
+        response = self.get(range='bytes=1020-')
+        self.assertEqual(response['Content-Range'], 'bytes 1020-1023/1024')
+        self.assertEqual(self.body(response), self.content[1020:])
+
+    def test_unsatisfiable_range(self):
+        response = self.get(range='bytes=2000-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */1024')
+
+    def test_multiple_ranges_serve_the_whole_file(self):
+        response = self.get(range='bytes=0-9,20-29')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), self.content)
+
+    def test_if_range(self):
+        etag = self.get()['ETag']
+        last_modified = os.stat(self.field_file.path).st_mtime
+        self.assertEqual(self.get(range='bytes=0-9', if_range=etag).status_code, 206)
+        self.assertEqual(self.get(range='bytes=0-9', if_range=http_date(last_modified)).status_code, 206)
+
+        # a stale validator gets the whole current file
+        for validator in ('"stale"', f'W/{etag}', http_date(last_modified - 3600)):
+            response = self.get(range='bytes=0-9', if_range=validator)
+            self.assertEqual(response.status_code, 200, validator)
+            self.assertEqual(self.body(response), self.content)
+
+    def test_conditional_get(self):
+        etag = self.get()['ETag']
+        self.assertEqual(self.get(if_none_match=etag).status_code, 304)
+
+
+class PublicMediaTest(SimpleTestCase):
+    """
+    The development media serving exposes the images but not the videos and their HLS renditions.
+    """
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        for name in ('courses/images/thumbnail/python.png', 'courses/videos/Intro/intro.mp4',
+                     'courses/hls/1/abc/master.m3u8'):
+            os.makedirs(os.path.join(media_root, os.path.dirname(name)), exist_ok=True)
+            with open(os.path.join(media_root, name), 'wb') as file:
+                file.write(b'data')
+
+        with override_settings(MEDIA_ROOT=media_root):
+            urlconf = type('MediaUrlConf', (), {'urlpatterns': public_media_urlpatterns()})
+        settings_override = override_settings(MEDIA_ROOT=media_root, ROOT_URLCONF=urlconf)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_images_are_served(self):
+        response = self.client.get('/media/courses/images/thumbnail/python.png')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'data')
+
+    def test_videos_are_not_served(self):
+        for url in ('/media/courses/videos/Intro/intro.mp4', '/media/courses/hls/1/abc/master.m3u8',
+                    '/media/courses/images/../videos/Intro/intro.mp4',
+                    '/media/courses/images/%2E%2E/videos/Intro/intro.mp4'):
+            self.assertIn(self.client.get(url).status_code, (400, 404), url)
+
+
+class SearchIndexTest(TestCase):
+    """
+    The courses are indexed after commit, the BM25 totals follow the index.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user(phone_number='09120000001', password='x', username='teacher',
+                                               role='teacher')
+        cls.category = Category.objects.create(name='Python', slug='python')
+
+    def create_course(self, slug, title, description='d', release_status='published'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Course.objects.create(category=self.category, teacher=self.teacher, thumbnail='', title=title,
+                                         description=description, slug=slug, price=1000,
+                                         release_status=release_status)
+
+    def assertStatsConsistent(self):
+        stats = CourseSearchStats.objects.values_list('documents', 'total_length').get(pk=1)
+        self.assertEqual(stats, rebuild_search_stats())
+
+    def test_reindex_replaces_terms(self):
+        course = self.create_course('python', 'Python basics', 'Learn python')
+        terms = set(CourseSearchTerm.objects.filter(course=course).values_list('term', 'frequency'))
+        self.assertIn(('python', 4), terms)
+        index_course(course.pk)
+        index_course(course.pk)
+        self.assertEqual(set(CourseSearchTerm.objects.filter(course=course).values_list('term', 'frequency')), terms)
+        self.assertStatsConsistent()
+
+    def test_ranking(self):
+        title = self.create_course('python', 'Python for beginners', 'An introduction to programming')
+        description = self.create_course('web', 'Web development', 'Build websites with python and django')
+        both = self.create_course('django', 'Django with python', 'Django and python for the web')
+        self.create_course('go', 'Go basics', 'Learn go')
+
+        ranked = [course_id for course_id, _ in search_courses('python')]
+        # a title occurrence weighs three description ones
+        self.assertEqual(ranked, [both.pk, title.pk, description.pk])
+        # a course matching every term ranks first
+        self.assertEqual(search_courses('django python')[0][0], both.pk)
+        self.assertEqual(search_courses('rust'), [])
+        self.assertEqual(search_courses('  '), [])
+
+        response = self.client.get('/courses/search', {'q': 'python'})
+        self.assertEqual([course['title'] for course in response.json()['results']],
+                         ['Django with python', 'Python for beginners', 'Web development'])
+
+    def test_score(self):
+        course = self.create_course('python', 'Python', 'Python course')
+        self.create_course('go', 'Go', 'Go course')
+        # BM25 with the python posting: frequency 4 (title 3 + description 1), two documents of length 5
+        idf = math.log(1 + (2 - 1 + 0.5) / (1 + 0.5))
+        expected = idf * 4 * (1.2 + 1) / (4 + 1.2)
+        [(course_id, score)] = search_courses('python')
+        self.assertEqual(course_id, course.pk)
+        self.assertAlmostEqual(score, expected)
+
+    def test_unpublished_and_deleted_courses_are_removed(self):
+        course = self.create_course('python', 'Python')
+        draft = self.create_course('draft', 'Python drafts', release_status='draft')
+        self.assertEqual(search_courses('python'), [(course.pk, mock.ANY)])
+        self.assertFalse(CourseSearchDocument.objects.filter(course=draft).exists())
+
+        course.release_status = 'draft'
+        with self.captureOnCommitCallbacks(execute=True):
+            course.save()
+        self.assertEqual(search_courses('python'), [])
+        self.assertFalse(CourseSearchTerm.objects.filter(course=course).exists())
+        self.assertStatsConsistent()
+
+        draft.release_status = 'published'
+        with self.captureOnCommitCallbacks(execute=True):
+            draft.save()
+        self.assertEqual(search_courses('python'), [(draft.pk, mock.ANY)])
+        self.assertStatsConsistent()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            draft.delete()
+        self.assertEqual(search_courses('python'), [])
+        self.assertEqual(CourseSearchStats.objects.values_list('documents', 'total_length').get(pk=1), (0, 0))
+
+    def test_failed_reindex_is_retried_by_a_job(self):
+        course = self.create_course('python', 'Python')
+        with mock.patch('courses.search.index_course', side_effect=IntegrityError), \
+                self.assertLogs('courses.search', level='ERROR'), self.captureOnCommitCallbacks(execute=True):
+            schedule_index_course(course.pk)
+        job = Job.objects.get(name='courses.tasks.reindex_course')
+        self.assertEqual(job.payload, {'course_id': course.pk})
+
+
+class CourseListPaginationTest(TestCase):
+    """
+    The catalog pages with a (created, id) keyset cursor, each page costs the same queries at any depth.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        teacher = User.objects.create_user(phone_number='09120000001', password='x', username='teacher',
+                                           role='teacher')
+        category = Category.objects.create(name='Python', slug='python')
+        courses = [
+            Course.objects.create(category=category, teacher=teacher, thumbnail='', title=f'Course {index}',
+                                  description='d', slug=f'course-{index}', price=1000, release_status='published')
+            for index in range(7)
+        ]
+        # ties on `created`, the id decides their order
+        now = timezone.now()
+        Course.objects.filter(pk__in=[course.pk for course in courses[:4]]).update(created=now)
+        for offset, course in enumerate(courses[4:], start=1):
+            Course.objects.filter(pk=course.pk).update(created=now - timedelta(days=offset))
+        cls.expected = list(Course.objects.order_by('-created', '-id').values_list('title', flat=True))
+
+    def titles(self, response):
+        self.assertEqual(response.status_code, 200)
+        return [course['title'] for course in response.json()['results']]
+
+    def test_next_and_previous(self):
+        response = self.client.get('/courses/?page_size=3')
+        self.assertIsNone(response.json()['previous'])
+        pages = [self.titles(response)]
+        while response.json()['next']:
+            response = self.client.get(response.json()['next'])
+            pages.append(self.titles(response))
+        self.assertEqual(pages, [self.expected[:3], self.expected[3:6], self.expected[6:]])
+
+        # and back from the last page
+        for page in reversed(pages[:-1]):
+            response = self.client.get(response.json()['previous'])
+            self.assertEqual(self.titles(response), page)
+            self.assertIsNotNone(response.json()['next'])
+        self.assertIsNone(response.json()['previous'])
+
+    def test_invalid_cursor(self):
+        for cursor in ('x', 'eyJwIjpbMV19'):  # not base64 json, a position of the wrong length
+            self.assertEqual(self.client.get(f'/courses/?cursor={cursor}').status_code, 404)
+
+    def test_page_queries(self):
+        first = self.client.get('/courses/?page_size=2')
+        deep_url = self.client.get(first.json()['next']).json()['next']
+        # catalog version, the page with its category and teacher joined, the facet counts
+        with self.assertNumQueries(3):
+            self.client.get('/courses/?page_size=2')
+        with self.assertNumQueries(3):
+            self.assertEqual(self.titles(self.client.get(deep_url)), self.expected[4:6])
+
+
+class CourseDocumentCacheTest(TestCase):
+    """
+    Course, headline and video changes bump the cached document version, only once the transaction commits.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        teacher = User.objects.create_user(phone_number='09120000001', password='x', username='teacher',
+                                           role='teacher')
+        category = Category.objects.create(name='Python', slug='python')
+        cls.course = Course.objects.create(category=category, teacher=teacher, thumbnail='', title='Python',
+                                           description='d', slug='python', price=1000, release_status='published')
+
+    def assertBumpsAfterCommit(self, change):
+        version, catalog_version = get_course_document_version(self.course.pk), get_catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            result = change()
+            self.assertEqual(get_course_document_version(self.course.pk), version)
+        self.assertGreater(get_course_document_version(self.course.pk), version)
+        self.assertGreater(get_catalog_version(), catalog_version)
+        return result
+
+    def test_course_save(self):
+        self.course.title = 'Python 3'
+        self.assertBumpsAfterCommit(self.course.save)
+
+    def test_headline_and_video_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            headline = CourseHeadlines.objects.create(course=self.course, headline_title='Intro', chapter_number=1)
+        self.assertBumpsAfterCommit(lambda: CourseHeadlines.objects.create(
+            course=self.course, headline_title='Basics', chapter_number=2))
+        headline.headline_title = 'Introduction'
+        self.assertBumpsAfterCommit(headline.save)
+
+        video = self.assertBumpsAfterCommit(lambda: SeasonVideos.objects.create(
+            headline=headline, video_title='Setup', video_file='setup.mp4'))
+        video.video_title = 'Installing python'
+        self.assertBumpsAfterCommit(video.save)
+        self.assertBumpsAfterCommit(video.delete)
+        self.assertBumpsAfterCommit(headline.delete)
+
+    def test_rolled_back_change_keeps_the_version(self):
+        version = get_course_document_version(self.course.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.course.title = 'Python 3'
+                    self.course.save()
+                    raise IntegrityError
+            except IntegrityError:
+                pass
+        self.assertEqual(get_course_document_version(self.course.pk), version)
+
+    def test_detail_serves_the_new_document(self):
+        self.assertEqual(self.client.get('/courses/python').json()['title'], 'Python')
+        self.course.title = 'Python 3'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.course.save()
+        self.assertEqual(self.client.get('/courses/python').json()['title'], 'Python 3')
+
+
+class CategoriesCacheTest(TestCase):
+    """
+    The categories are served from the process memory, the shared cache only holds their version.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user(phone_number='09120000001', password='x', username='teacher',
+                                               role='teacher')
+        cls.python = Category.objects.create(name='Python', slug='python')
+        Category.objects.create(name='Web', slug='web')
+        Course.objects.create(category=cls.python, teacher=cls.teacher, thumbnail='', title='Python',
+                              description='d', slug='python', price=1000, release_status='published')
+
+    def setUp(self):
+        patcher = mock.patch('courses.cache._local_categories', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def counts(self):
+        return [(category['slug'], category['courses_count']) for category in get_categories()]
+
+    def test_served_from_memory(self):
+        self.assertEqual(self.counts(), [('python', 1), ('web', 0)])
+        with self.assertNumQueries(0):
+            response = self.client.get('/courses/categories')
+        self.assertEqual(response.json(), [{'name': 'Python', 'slug': 'python', 'courses_count': 1},
+                                           {'name': 'Web', 'slug': 'web', 'courses_count': 0}])
+
+    def test_version_checked_after_local_timeout(self):
+        self.counts()
+        with mock.patch('courses.cache.CATEGORIES_LOCAL_TIMEOUT', 0):
+            # the version is unchanged, the memory copy is kept
+            with self.assertNumQueries(1):
+                self.assertEqual(self.counts(), [('python', 1), ('web', 0)])
+
+    def test_change_in_this_process(self):
+        self.counts()
+        with self.captureOnCommitCallbacks(execute=True):
+            Course.objects.create(category=self.python, teacher=self.teacher, thumbnail='', title='Django',
+                                  description='d', slug='django', price=1000, release_status='published')
+            # not before the commit
+            self.assertEqual(self.counts(), [('python', 1), ('web', 0)])
+        self.assertEqual(self.counts(), [('python', 2), ('web', 0)])
+
+    def test_change_in_another_process(self):
+        self.counts()
+        # another process publishes a course and moves the shared version
+        Course.objects.create(category=self.python, teacher=self.teacher, thumbnail='', title='Django',
+                              description='d', slug='django', price=1000, release_status='published')
+        cache.set(CATEGORIES_VERSION_KEY, time.time_ns())
+        self.assertEqual(self.counts(), [('python', 1), ('web', 0)])
+        with mock.patch('courses.cache.CATEGORIES_LOCAL_TIMEOUT', 0):
+            self.assertEqual(self.counts(), [('python', 2), ('web', 0)])
+
+
+class CurriculumTest(TestCase):
+    """
+    The curriculum pages through the active headlines with their videos, the detail embeds their summaries.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        teacher = User.objects.create_user(phone_number='09120000001', password='x', username='teacher',
+                                           role='teacher')
+        category = Category.objects.create(name='Python', slug='python')
+        cls.course = Course.objects.create(category=category, teacher=teacher, thumbnail='', title='Python',
+                                           description='d', slug='python', price=1000, release_status='published')
+        for chapter in (3, 1, 4, 2, 5):
+            headline = CourseHeadlines.objects.create(course=cls.course, headline_title=f'Chapter {chapter}',
+                                                      chapter_number=chapter, is_active=chapter != 4)
+            for index in range(chapter % 3):
+                SeasonVideos.objects.create(headline=headline, video_title=f'Video {chapter}.{index}',
+                                            video_file='video.mp4', duration=Decimal('1.5'))
+
+    def test_pages(self):
+        response = self.client.get('/courses/python/curriculum?page_size=2')
+        pages = []
+        while True:
+            self.assertEqual(response.status_code, 200)
+            pages.append([(headline['headline_title'], [video['video_title'] for video in headline['videos']])
+                          for headline in response.json()['results']])
+            if not response.json()['next']:
+                break
+            response = self.client.get(response.json()['next'])
+
+        self.assertEqual(pages, [
+            [('Chapter 1', ['Video 1.0']), ('Chapter 2', ['Video 2.0', 'Video 2.1'])],
+            [('Chapter 3', []), ('Chapter 5', ['Video 5.0', 'Video 5.1'])],
+        ])
+
+    def test_page_queries(self):
+        second_page = self.client.get('/courses/python/curriculum?page_size=2').json()['next']
+        # course, document version, headlines page, their videos
+        for url in ('/courses/python/curriculum?page_size=2', second_page):
+            with self.assertNumQueries(4):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_not_modified(self):
+        response = self.client.get('/courses/python/curriculum')
+        self.assertEqual(self.client.get('/courses/python/curriculum',
+                                         headers={'if-none-match': response['ETag']}).status_code, 304)
+
+    def test_hidden_course(self):
+        Course.objects.filter(pk=self.course.pk).update(release_status='draft')
+        self.assertEqual(self.client.get('/courses/python/curriculum').status_code, 404)
+
+    def test_detail_headline_summaries(self):
+        headlines = self.client.get('/courses/python').json()['headlines']
+        self.assertEqual(
+            [(headline['headline_title'], headline['chapter_number'], headline['videos_count'])
+             for headline in headlines],
+            [('Chapter 1', 1, 1), ('Chapter 2', 2, 2), ('Chapter 3', 3, 0), ('Chapter 5', 5, 2)],
+        )
+        self.assertEqual(headlines[1]['duration'], '3:00 min')
+        self.assertNotIn('videos', headlines[0])
+
+
+class FacetCountsTest(TestCase):
+    """
+    Each facet is counted over the catalog filtered by the other facets only.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        teacher = User.objects.create_user(phone_number='09120000001', password='x', username='teacher',
+                                           role='teacher')
+        categories = [Category.objects.create(name=name, slug=name.lower()) for name in ('Python', 'Web')]
+        prices = (0, 400_000, 700_000, 1_500_000, 3_000_000)
+        for index in range(20):
+            course = Course.objects.create(category=categories[index % 2], teacher=teacher, thumbnail='',
+                                           title=f'Course {index}', description='d', slug=f'course-{index}',
+                                           release_status='published' if index != 19 else 'draft')
+            price = prices[index % 5]
+            Course.objects.filter(pk=course.pk).update(
+                price=price, final_price=price, is_free=price == 0, rating=index % 5 + 1,
+                status='completed' if index % 3 else 'in_progress',
+            )
+        cls.catalog = list(Course.objects.filter(release_status='published').select_related('category'))
+
+    def setUp(self):
+        get_catalog_version()
+
+    def expected_facets(self, filters):
+        def rows(facet):
+            return [course for course in self.catalog
+                    if all(condition(course) for name, condition in filters.items() if name != facet)]
+
+        def price_range(course):
+            return next(label for label, low, high in PRICE_RANGES
+                        if course.final_price >= low and (high is None or course.final_price <= high))
+
+        def counts(facet, key):
+            values = {}
+            for course in rows(facet):
+                values[key(course)] = values.get(key(course), 0) + 1
+            return values
+
+        categories = counts('category', lambda course: course.category.slug)
+        price_ranges = counts('price_range', price_range)
+        return {
+            'category': sorted(categories.items()),
+            'price_range': [(label, price_ranges[label]) for label, _, _ in PRICE_RANGES if label in price_ranges],
+            'is_free': sorted(counts('is_free', lambda course: course.is_free).items()),
+            'status': sorted(counts('status', lambda course: course.status).items()),
+            'rating': sorted(counts('rating', lambda course: course.rating).items()),
+        }
+
+    def facets(self, params):
+        with self.assertNumQueries(3):  # catalog version, page, facets
+            response = self.client.get('/courses/', params)
+        facets = response.json()['facets']
+        return response.json()['results'], {
+            'category': sorted((item['slug'], item['count']) for item in facets['category']),
+            **{facet: [(item['value'], item['count']) for item in facets[facet]]
+               for facet in ('price_range', 'is_free', 'status', 'rating')},
+        }
+
+    def test_without_filters(self):
+        _, facets = self.facets({})
+        self.assertEqual(facets, self.expected_facets({}))
+        self.assertEqual(sum(count for _, count in facets['category']), 19)
+
+    def test_each_facet_ignores_its_own_filter(self):
+        results, facets = self.facets({
+            'category': 'python', 'min_price': 1, 'max_price': 2_000_000, 'is_free': 'false',
+            'status': 'completed', 'rating': 2,
+        })
+        filters = {
+            'category': lambda course: course.category.slug == 'python',
+            'price_range': lambda course: 1 <= course.final_price <= 2_000_000,
+            'is_free': lambda course: not course.is_free,
+            'status': lambda course: course.status == 'completed',
+            'rating': lambda course: course.rating >= 2,
+        }
+        self.assertEqual(facets, self.expected_facets(filters))
+        # the selected category still shows the other one to switch to
+        self.assertEqual([slug for slug, _ in facets['category']], ['python', 'web'])
+        matching = [course for course in self.catalog if all(condition(course) for condition in filters.values())]
+        self.assertEqual(len(results), len(matching))
+
+    def test_invalid_filter(self):
+        self.assertEqual(self.client.get('/courses/', {'is_free': 'maybe'}).status_code, 400)
+        self.assertEqual(self.client.get('/courses/', {'status': 'archived'}).status_code, 400)
+
+
+class StudentCountersTest(TestCase):
+    """
+    Enrollments are counted in sharded counters, folded into Course.number_of_students by a delayed job.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        teacher = User.objects.create_user(phone_number='09120000001', password='x', username='teacher',
+                                           role='teacher')
+        category = Category.objects.create(name='Python', slug='python')
+        cls.course, cls.other = [
+            Course.objects.create(category=category, teacher=teacher, thumbnail='', title=slug, description='d',
+                                  slug=slug, price=1000, release_status='published')
+            for slug in ('python', 'django')
+        ]
+        cls.students = [
+            User.objects.create_user(phone_number=f'0913000000{index}', password='x', username=f'student{index}')
+            for index in range(6)
+        ]
+
+    def shard_total(self, course):
+        return sum(CourseStudentCounter.objects.filter(course=course).values_list('count', flat=True))
+
+    def number_of_students(self, course):
+        return Course.objects.values_list('number_of_students', flat=True).get(pk=course.pk)
+
+    def run_fold_jobs(self):
+        while (job := claim_job('test')) is not None:
+            self.assertEqual(run_job(job).status, 'done')
+
+    def test_enrollments_are_folded_by_one_job(self):
+        for student in self.students[:3]:
+            Enrollment.objects.create(student=student, course=self.course)
+        self.assertEqual(self.shard_total(self.course), 3)
+        # not folded yet
+        self.assertEqual(self.number_of_students(self.course), 0)
+        jobs = Job.objects.filter(name='courses.tasks.fold_student_counters')
+        self.assertEqual(list(jobs.values_list('payload', flat=True)), [{'course_ids': [self.course.pk]}])
+
+        jobs.update(run_at=timezone.now())
+        self.run_fold_jobs()
+        self.assertEqual(self.number_of_students(self.course), 3)
+
+        # the fold released the pending key, the next change schedules a new fold
+        Enrollment.objects.filter(student=self.students[0]).delete()
+        self.assertEqual(jobs.filter(status='pending').count(), 1)
+        jobs.update(run_at=timezone.now())
+        self.run_fold_jobs()
+        self.assertEqual(self.number_of_students(self.course), 2)
+
+    def test_batch_increment(self):
+        add_students([self.course.pk, self.other.pk, self.course.pk])
+        self.assertEqual((self.shard_total(self.course), self.shard_total(self.other)), (2, 1))
+        self.assertEqual(CourseStudentCounter.objects.filter(course=self.course).count(), 1)
+
+    def test_decrements_are_spread_and_never_negative(self):
+        CourseStudentCounter.objects.bulk_create([
+            CourseStudentCounter(course=self.course, shard=shard, count=2) for shard in range(4)
+        ])
+        add_students([self.course.pk] * 3, -1)
+        counts = list(CourseStudentCounter.objects.filter(course=self.course).values_list('count', flat=True))
+        self.assertEqual(sum(counts), 5)
+        self.assertTrue(all(count >= 0 for count in counts))
+
+        # more decrements than students stop at zero, no shard is created
+        add_students([self.course.pk] * 10, -1)
+        self.assertEqual(self.shard_total(self.course), 0)
+        self.assertEqual(CourseStudentCounter.objects.filter(course=self.course).count(), 4)
+        add_students([self.other.pk], -1)
+        self.assertFalse(CourseStudentCounter.objects.filter(course=self.other).exists())
+
+    def test_increments_use_a_random_shard(self):
+        for _ in range(30):
+            add_students([self.course.pk])
+        shards = CourseStudentCounter.objects.filter(course=self.course).values_list('shard', flat=True)
+        self.assertGreater(len(shards), 1)
+        self.assertTrue(all(0 <= shard < STUDENT_COUNTER_SHARDS for shard in shards))
+        self.assertEqual(self.shard_total(self.course), 30)
+
+    def test_rebuild_command(self):
+        for student in self.students[:4]:
+            Enrollment.objects.create(student=student, course=self.course)
+        Enrollment.objects.create(student=self.students[0], course=self.other)
+        # drifted counters
+        CourseStudentCounter.objects.filter(course=self.course).update(count=40)
+        # the enrollment picked a random shard, a fixed one could collide with it
+        CourseStudentCounter.objects.filter(course=self.other).update(count=7)
+
+        select_for_update = QuerySet.select_for_update
+        with mock.patch.object(QuerySet, 'select_for_update', autospec=True,
+                               side_effect=select_for_update) as lock:
+            out = io.StringIO()
+            call_command('fold_student_counters', '--rebuild', stdout=out)
+        # each course row is locked while its counters are rebuilt
+        self.assertEqual(lock.call_count, 2)
+        self.assertIn('Rebuilt the counters of 2 courses.', out.getvalue())
+        self.assertEqual((self.shard_total(self.course), self.shard_total(self.other)), (4, 1))
+        self.assertEqual((self.number_of_students(self.course), self.number_of_students(self.other)), (4, 1))
+
+
+class ReviewAggregatesTest(TestCase):
+    """
+    Creating, changing and deleting reviews moves the course rating aggregates incrementally.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        teacher = User.objects.create_user(phone_number='09120000001', password='x', username='teacher',
+                                           role='teacher')
+        category = Category.objects.create(name='Python', slug='python')
+        cls.course = Course.objects.create(category=category, teacher=teacher, thumbnail='', title='Python',
+                                           description='d', slug='python', price=1000, release_status='published')
+        cls.students = [
+            User.objects.create_user(phone_number=f'0913000000{index}', password='x', username=f'student{index}')
+            for index in range(4)
+        ]
+        for student in cls.students[:3]:
+            Enrollment.objects.create(student=student, course=cls.course)
+
+    def client_for(self, student):
+        return Client(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(student).access_token}')
+
+    def review(self, student, rating):
+        return self.client_for(student).post('/courses/python/reviews', {'rating': rating, 'comment': 'ok'},
+                                             content_type='application/json')
+
+    def assertAggregates(self, histogram, rating):
+        course = Course.objects.get(pk=self.course.pk)
+        self.assertEqual(course.rating_histogram, {value: histogram.get(value, 0) for value in range(1, 6)})
+        self.assertEqual(course.rating, rating)
+        # the stored aggregates match the reviews
+        totals = CourseReview.objects.filter(course=course).aggregate(
+            count=Count('id'), total=Sum('rating'), average=Avg('rating'))
+        self.assertEqual((course.rating_count, course.rating_sum), (totals['count'], totals['total'] or 0))
+        if totals['count']:
+            self.assertEqual(course.rating_average, Decimal(totals['average']).quantize(Decimal('0.01')))
+        else:
+            self.assertIsNone(course.rating_average)
+
+    def test_create_update_delete(self):
+        self.assertEqual(self.review(self.students[0], 5).status_code, 201)
+        self.assertEqual(self.review(self.students[1], 4).status_code, 201)
+        self.assertEqual(self.review(self.students[2], 2).status_code, 201)
+        self.assertAggregates({5: 1, 4: 1, 2: 1}, 4)
+
+        client = self.client_for(self.students[2])
+        response = client.patch('/courses/python/reviews/mine', {'rating': 1}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertAggregates({5: 1, 4: 1, 1: 1}, 3)
+
+        # a comment change leaves the aggregates alone
+        client.patch('/courses/python/reviews/mine', {'comment': 'better'}, content_type='application/json')
+        self.assertAggregates({5: 1, 4: 1, 1: 1}, 3)
+
+        self.assertEqual(self.client_for(self.students[0]).delete('/courses/python/reviews/mine').status_code, 204)
+        self.assertAggregates({4: 1, 1: 1}, 3)  # 2.5 rounded half up
+        self.assertEqual(self.client.get('/courses/python').json()['rating_average'], '2.50')
+
+        CourseReview.objects.all().delete()
+        self.assertAggregates({}, Course._meta.get_field('rating').default)
+
+    def test_rejected_reviews_do_not_count(self):
+        self.assertEqual(self.review(self.students[0], 5).status_code, 201)
+        self.assertEqual(self.review(self.students[0], 1).status_code, 400)  # already reviewed
+        self.assertEqual(self.review(self.students[3], 1).status_code, 400)  # not enrolled
+        self.assertAggregates({5: 1}, 5)
+
+    def test_course_delete_cascades_reviews(self):
+        self.review(self.students[0], 5)
+        self.course.delete()
+        self.assertFalse(CourseReview.objects.exists())
@@ -6,5 +6,12 @@ app_name = 'courses'
 
 urlpatterns = [
     path('', views.CourseListView.as_view(), name='course_list'),
+    path('search', views.CourseSearchView.as_view(), name='course_search'),
+    path('categories', views.CategoryListView.as_view(), name='category_list'),
     path('<slug:slug>', views.CourseDetailView.as_view(), name='course_detail'),
+    path('videos/<int:pk>/stream', views.VideoStreamView.as_view(), name='video_stream'),
+    path('videos/<int:pk>/hls/<str:name>', views.VideoHlsView.as_view(), name='video_hls'),
+    path('<slug:slug>/curriculum', views.CourseCurriculumView.as_view(), name='course_curriculum'),
+    path('<slug:slug>/reviews', views.CourseReviewListView.as_view(), name='course_reviews'),
+    path('<slug:slug>/reviews/mine', views.CourseReviewView.as_view(), name='course_review'),
 ]
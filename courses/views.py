@@ -1,20 +1,113 @@
+import os
+from datetime import datetime, timezone
+
 from django.db.models import Q
+from django.db.models.fields.files import FieldFile
+from django.http import Http404
+from django.shortcuts import get_object_or_404
 from rest_framework import permissions, generics, views, status
+from rest_framework.exceptions import NotAuthenticated, PermissionDenied
 from rest_framework.response import Response
 
-from .models import Course
-from .serializers import CourseListSerializer, CourseDetailSerializer
+from utils import hls
+from utils.conditional import make_etag, get_not_modified_response, set_validators
+from utils.streaming import stream_file
+
+from .cache import get_course_document, get_course_document_version, get_catalog_version, get_categories
+from .filters import CourseFacetFilterBackend
+from .models import Course, SeasonVideos, Enrollment, CourseReview, get_content_updated
+from .pagination import (
+    CourseCursorPagination, HeadlineCursorPagination, CourseSearchPagination, ReviewCursorPagination
+)
+from .search import search_courses
+from .serializers import CourseListSerializer, CourseHeadlineSerializer, CourseReviewSerializer
 
 # Create your views here.
 
 
+def get_visible_course(user, slug, with_content_updated=False):
+    """
+    Returns the course with the given slug if the user is allowed to see it, otherwise None.
+    - Public users can only see published courses.
+    - Teachers can see their own courses even if unpublished.
+    With `with_content_updated` the course is annotated with `content_updated`, the latest change
+    of the course and its children, in the same query.
+    """
+    queryset = Course.objects.all()
+    if with_content_updated:
+        queryset = queryset.annotate(content_updated=get_content_updated())
+    if user.is_authenticated:
+        return queryset.filter(
+            Q(slug=slug) & (Q(release_status="published") | Q(teacher=user))
+        ).first()
+    return queryset.filter(slug=slug, release_status="published").first()
+
+
 class CourseListView(generics.ListAPIView):
     """
     API view for listing all published courses.
+    Paginated with a (created, id) cursor, category and teacher are joined in the same query.
+    Supports faceted filtering and returns the facet counts of the filtered catalog.
+    Conditional requests are validated against the catalog version before any query.
+    The page is serialized from a values() query.
     """
     permission_classes = [permissions.AllowAny]  # Accessible to all users
     serializer_class = CourseListSerializer  # Serializer for course listing
-    queryset = Course.objects.filter(release_status='published')  # Only published courses
+    pagination_class = CourseCursorPagination
+    filter_backends = [CourseFacetFilterBackend]
+    queryset = Course.objects.filter(release_status='published').select_related('category', 'teacher')
+
+    def list(self, request, *args, **kwargs):
+        # any course change moves the catalog version, unchanged pages are answered without a query
+        version = get_catalog_version()
+        etag = make_etag('catalog', version, request.get_full_path(), request.accepted_renderer.format)
+        last_modified = datetime.fromtimestamp(version / 1_000_000_000, tz=timezone.utc)
+        not_modified = get_not_modified_response(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        queryset = self.filter_queryset(self.get_queryset())
+        # read as values() rows, no Course instances are built for the page
+        compiler = self.get_serializer_class().get_values_compiler(self.get_serializer_context())
+        page = self.paginate_queryset(compiler.values(queryset, extra=['created', 'id']))
+        response = self.get_paginated_response(compiler.represent(page))
+        response.data['facets'] = CourseFacetFilterBackend().get_facet_counts(request, self.get_queryset())
+        return set_validators(response, etag, last_modified)
+
+
+class CourseSearchView(generics.GenericAPIView):
+    """
+    API view for full-text search over published courses.
+    Matches course titles, descriptions, sub descriptions and video titles through the search index,
+    results are ranked with BM25 and paginated.
+    """
+    permission_classes = [permissions.AllowAny]
+    serializer_class = CourseListSerializer
+    pagination_class = CourseSearchPagination
+
+    def get(self, request):
+        ranked = search_courses(request.query_params.get('q', ''))
+        page = self.paginate_queryset(ranked)
+
+        course_ids = [course_id for course_id, _ in page]
+        courses = Course.objects.select_related('category', 'teacher').in_bulk(course_ids)
+        # keep the ranking order, skips courses deleted since the lookup
+        results = [courses[course_id] for course_id in course_ids if course_id in courses]
+
+        serializer = self.get_serializer(results, many=True)
+        return self.get_paginated_response(serializer.data)
+
+
+class CategoryListView(views.APIView):
+    """
+    API view for listing the categories with their number of published courses.
+    Served from the process memory, a new version is loaded when a course is published, unpublished or
+    recategorized.
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        return Response(get_categories(), status=status.HTTP_200_OK)
 
 
 class CourseDetailView(views.APIView):
@@ -22,22 +115,151 @@ class CourseDetailView(views.APIView):
     API view for retrieving course details.
     - Public users can only see published courses.
     - Teachers can see their own courses even if unpublished.
+    The course document is served from the cache and rebuilt only after the course content changes.
+    Conditional requests are answered with 304 from the document version and the latest content change.
     """
 
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
     def get(self, request, slug):
-        user = request.user
-
-        if user.is_authenticated:
-            course = Course.objects.filter(
-                Q(slug=slug) & (Q(release_status="published") | Q(teacher=user))
-            ).first()
-        else:
-            course = Course.objects.filter(slug=slug, release_status="published").first()
+        course = get_visible_course(request.user, slug, with_content_updated=True)
 
         if not course:
             return Response({"detail": "Course not found."}, status=status.HTTP_404_NOT_FOUND)
 
-        serializer = CourseDetailSerializer(instance=course)
-        return Response(serializer.data, status=status.HTTP_200_OK)
\ No newline at end of file
+        etag = make_etag('course', course.pk, get_course_document_version(course.pk), request.accepted_renderer.format)
+        not_modified = get_not_modified_response(request, etag, course.content_updated)
+        if not_modified is not None:
+            return not_modified
+
+        response = Response(get_course_document(course), status=status.HTTP_200_OK)
+        return set_validators(response, etag, course.content_updated)
+
+
+class CourseCurriculumView(generics.ListAPIView):
+    """
+    API view for paging through the active headlines of a course with their videos.
+    The videos of a page are loaded in one batched query.
+    Conditional requests are answered with 304 from the document version and the latest content change.
+    """
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    serializer_class = CourseHeadlineSerializer
+    pagination_class = HeadlineCursorPagination
+
+    def list(self, request, *args, **kwargs):
+        self.course = get_visible_course(request.user, self.kwargs['slug'], with_content_updated=True)
+        if not self.course:
+            raise Http404("Course not found.")
+
+        # the course document version moves with every headline and video change
+        etag = make_etag('curriculum', self.course.pk, get_course_document_version(self.course.pk),
+                         request.get_full_path(), request.accepted_renderer.format)
+        not_modified = get_not_modified_response(request, etag, self.course.content_updated)
+        if not_modified is not None:
+            return not_modified
+
+        response = super().list(request, *args, **kwargs)
+        return set_validators(response, etag, self.course.content_updated)
+
+    def get_queryset(self):
+        return self.course.headlines.filter(is_active=True).prefetch_related('videos')
+
+
+class CourseReviewListView(generics.ListCreateAPIView):
+    """
+    API view for listing the reviews of a course and for reviewing it.
+    - Everyone can read the reviews of a visible course.
+    - Enrolled students can post one review per course.
+    The course rating aggregates are updated with the review, so they are never recomputed on read.
+    """
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    serializer_class = CourseReviewSerializer
+    pagination_class = ReviewCursorPagination
+
+    def get_course(self):
+        if not hasattr(self, '_course'):
+            self._course = get_visible_course(self.request.user, self.kwargs['slug'])
+            if not self._course:
+                raise Http404("Course not found.")
+        return self._course
+
+    def get_queryset(self):
+        return CourseReview.objects.filter(course=self.get_course()).select_related('student')
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if 'slug' in self.kwargs:
+            context['course'] = self.get_course()
+        return context
+
+
+class CourseReviewView(generics.RetrieveUpdateDestroyAPIView):
+    """
+    API view for retrieving, updating and deleting the authenticated student's review of a course.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = CourseReviewSerializer
+
+    def get_object(self):
+        return get_object_or_404(
+            CourseReview.objects.select_related('student'), course__slug=self.kwargs['slug'], student=self.request.user
+        )
+
+
+class VideoAccessMixin:
+    """
+    Checks the access to a season video.
+    - Free videos of published courses can be watched by everyone.
+    - Other videos require an enrollment in the course.
+    - Teachers can watch the videos of their own courses.
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def perform_content_negotiation(self, request, force=False):
+        # video players send Accept headers no renderer matches, the response is not rendered anyway
+        return super().perform_content_negotiation(request, force=True)
+
+    def get_video(self, request, pk):
+        video = get_object_or_404(SeasonVideos.objects.select_related('headline__course'), pk=pk)
+        course = video.headline.course
+        user = request.user
+
+        is_teacher = user.is_authenticated and course.teacher_id == user.id
+        if not is_teacher:
+            if course.release_status != Course.CourseReleaseStatus.published or not video.headline.is_active:
+                raise Http404("Video not found.")
+            if not video.is_free:
+                if not user.is_authenticated:
+                    raise NotAuthenticated()
+                if not Enrollment.objects.filter(student=user, course=course).exists():
+                    raise PermissionDenied("You are not enrolled in this course.")
+        return video
+
+
+class VideoStreamView(VideoAccessMixin, views.APIView):
+    """
+    API view for streaming a season video.
+    Supports HTTP Range requests for seeking, the transfer is offloaded to the front proxy when configured.
+    """
+
+    def get(self, request, pk):
+        video = self.get_video(request, pk)
+        return stream_file(request, video.video_file)
+
+
+class VideoHlsView(VideoAccessMixin, views.APIView):
+    """
+    API view serving the HLS playlists and segments of a season video, with the access rules of the stream view.
+    The playlists reference their renditions and segments by relative URLs, so the player resolves them here.
+    """
+
+    def get(self, request, pk, name):
+        video = self.get_video(request, pk)
+        if video.hls_status != SeasonVideos.HlsStatus.ready or not video.hls_playlist or \
+                not hls.HLS_FILE_RE.match(name):
+            raise Http404("Playlist not found.")
+
+        field_file = FieldFile(video, video.video_file.field, f'{os.path.dirname(video.hls_playlist)}/{name}')
+        if not field_file.storage.exists(field_file.name):
+            raise Http404("Playlist not found.")
+        return stream_file(request, field_file)
@@ -0,0 +1,11 @@
+from django.contrib import admin
+from .models import Job
+
+# Register your models here.
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['name', 'status', 'attempts', 'run_at', 'locked_by']
+    list_filter = ['status', 'name']
+    search_fields = ['name']
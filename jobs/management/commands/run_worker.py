@@ -0,0 +1,64 @@
+import os
+import signal
+import socket
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from jobs.queue import claim_job, run_job, release_stale_jobs
+
+
+class Command(BaseCommand):
+    help = 'Runs background job workers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=1, help='Number of concurrent workers.')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to wait when the queue is empty.')
+        parser.add_argument('--burst', action='store_true', help='Exit once the queue is empty.')
+
+    def handle(self, *args, **options):
+        self.stop = threading.Event()
+        signal.signal(signal.SIGINT, self.shutdown)
+        signal.signal(signal.SIGTERM, self.shutdown)
+
+        release_stale_jobs()
+
+        host = f'{socket.gethostname()}:{os.getpid()}'
+        workers = [
+            threading.Thread(target=self.work, args=(f'{host}:{index}', options), daemon=True)
+            for index in range(options['concurrency'])
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(self.style.SUCCESS(f'Started {len(workers)} workers on {host}.'))
+
+        while any(worker.is_alive() for worker in workers):
+            for worker in workers:
+                worker.join(timeout=0.5)
+
+    def shutdown(self, signum, frame):
+        self.stdout.write('Stopping workers after their current job...')
+        self.stop.set()
+
+    def work(self, worker_id, options):
+        try:
+            while not self.stop.is_set():
+                close_old_connections()
+                job = claim_job(worker_id)
+                if job is None:
+                    # the jobs of a worker that died meanwhile are picked up without a restart
+                    if release_stale_jobs():
+                        continue
+                    if options['burst']:
+                        return
+                    self.stop.wait(options['poll_interval'])
+                    continue
+
+                started = time.monotonic()
+                job = run_job(job)
+                self.stdout.write(f'[{worker_id}] {job} in {time.monotonic() - started:.2f}s')
+        finally:
+            connection.close()
@@ -0,0 +1,51 @@
+from django.db import models
+from django.utils import timezone
+
+
+# Create your models here.
+
+
+class Job(models.Model):
+    """
+    A unit of background work stored in the project database.
+    Jobs are enqueued by the request thread and executed by the `run_worker` command.
+    """
+
+    class JobStatus(models.TextChoices):
+        """
+        choices a status of the job
+        """
+        pending = ('pending', 'Pending')
+        running = ('running', 'Running')
+        done = ('done', 'Done')
+        failed = ('failed', 'Failed')
+
+    # registered task name
+    name = models.CharField(max_length=200)
+    # keyword arguments of the task
+    payload = models.JSONField(default=dict, blank=True)
+
+    status = models.CharField(max_length=7, choices=JobStatus.choices, default=JobStatus.pending)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    # the job is not claimed before this time, moved forward on retries
+    run_at = models.DateTimeField(default=timezone.now)
+
+    locked_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.name} #{self.pk} ({self.status})'
+
+    class Meta:
+        ordering = ['run_at', 'id']
+        indexes = [
+            # claiming scans pending jobs in run_at order
+            models.Index(fields=['status', 'run_at', 'id'], name='job_claim_idx'),
+        ]
+        verbose_name = 'Job'
+        verbose_name_plural = 'Jobs'
@@ -0,0 +1,175 @@
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+# registered tasks by name
+registry = {}
+
+# retry delays grow as BACKOFF_BASE * 2 ** (attempt - 1) seconds, up to BACKOFF_MAX
+BACKOFF_BASE = 10
+BACKOFF_MAX = 60 * 60
+# seconds between the refreshes of a running job's lock by its worker
+HEARTBEAT_INTERVAL = 60
+# running jobs whose lock was not refreshed for this long are considered abandoned by a dead worker,
+# a long job (HLS packaging) keeps its lock as long as its worker is alive
+STALE_LOCK_TIMEOUT = timedelta(minutes=5)
+# candidates tried per claim when the database can not skip locked rows
+CLAIM_BATCH_SIZE = 10
+
+
+def task(func=None, *, name=None, max_attempts=5):
+    """
+    Registers a function as a background task.
+    The function receives the job payload as keyword arguments, so the payload must be JSON serializable.
+    Adds an `enqueue(**payload)` attribute to the function:
+
+        @task
+        def send_sms_otp(otp_id):
+            ...
+
+        send_sms_otp.enqueue(otp_id=otp.pk)
+    """
+
+    def register(func):
+        task_name = name or f'{func.__module__}.{func.__name__}'
+        registry[task_name] = func
+        func.task_name = task_name
+        func.enqueue = lambda delay=None, **payload: enqueue(
+            task_name, delay=delay, max_attempts=max_attempts, **payload
+        )
+        return func
+
+    if func is not None:
+        return register(func)
+    return register
+
+
+def enqueue(name, delay=None, max_attempts=5, **payload):
+    """
+    Stores a job for the named task, it runs once the current transaction commits.
+    With the JOBS_ALWAYS_EAGER setting the task runs inline after commit instead.
+    """
+    if name not in registry:
+        raise KeyError(f'Unknown task {name}')
+
+    if getattr(settings, 'JOBS_ALWAYS_EAGER', False):
+        transaction.on_commit(lambda: registry[name](**payload))
+        return None
+
+    run_at = timezone.now() + (delay or timedelta())
+    return Job.objects.create(name=name, payload=payload, run_at=run_at, max_attempts=max_attempts)
+
+
+def claim_job(worker_id):
+    """
+    Claims the next due job for the worker and marks it running, returns None if there is nothing to do.
+    Uses SELECT ... FOR UPDATE SKIP LOCKED when the database supports it, otherwise a
+    compare-and-set UPDATE on the job status (SQLite), so a job is never claimed twice.
+    """
+    now = timezone.now()
+    due = Job.objects.filter(status=Job.JobStatus.pending, run_at__lte=now).order_by('run_at', 'id')
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            job = due.select_for_update(skip_locked=True).first()
+            if job is None:
+                return None
+            job.status = Job.JobStatus.running
+            job.attempts += 1
+            job.locked_at = now
+            job.locked_by = worker_id
+            job.save(update_fields=['status', 'attempts', 'locked_at', 'locked_by', 'updated'])
+            return job
+
+    for job_id in due.values_list('id', flat=True)[:CLAIM_BATCH_SIZE]:
+        claimed = Job.objects.filter(pk=job_id, status=Job.JobStatus.pending).update(
+            status=Job.JobStatus.running, attempts=F('attempts') + 1, locked_at=now, locked_by=worker_id,
+            updated=now,
+        )
+        if claimed:
+            return Job.objects.get(pk=job_id)
+    return None
+
+
+def get_backoff(attempts):
+    return timedelta(seconds=min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX))
+
+
+def refresh_lock(job):
+    """
+    Moves the lock time of a running job forward, returns False when the job is no longer locked by its worker.
+    """
+    return bool(Job.objects.filter(pk=job.pk, status=Job.JobStatus.running, locked_by=job.locked_by).update(
+        locked_at=timezone.now()
+    ))
+
+
+class Heartbeat(threading.Thread):
+    """
+    Refreshes the lock of a running job every `interval` seconds until stopped,
+    so release_stale_jobs does not hand a long job to a second worker.
+    """
+
+    def __init__(self, job, interval):
+        super().__init__(daemon=True)
+        self.job = job
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(self.interval):
+                refresh_lock(self.job)
+        finally:
+            connection.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def run_job(job, heartbeat_interval=HEARTBEAT_INTERVAL):
+    """
+    Executes a claimed job, failed jobs are retried with exponential backoff until max_attempts.
+    The job lock is refreshed every heartbeat_interval seconds while it runs.
+    """
+    func = registry.get(job.name)
+    heartbeat = Heartbeat(job, heartbeat_interval)
+    heartbeat.start()
+    try:
+        if func is None:
+            raise KeyError(f'Unknown task {job.name}')
+        func(**job.payload)
+    except Exception:
+        job.last_error = traceback.format_exc()
+        if func is None or job.attempts >= job.max_attempts:
+            job.status = Job.JobStatus.failed
+        else:
+            job.status = Job.JobStatus.pending
+            job.run_at = timezone.now() + get_backoff(job.attempts)
+    else:
+        job.status = Job.JobStatus.done
+        job.last_error = ''
+    finally:
+        heartbeat.stop()
+
+    job.locked_at = None
+    job.locked_by = ''
+    job.save(update_fields=['status', 'run_at', 'last_error', 'locked_at', 'locked_by', 'updated'])
+    return job
+
+
+def release_stale_jobs(timeout=STALE_LOCK_TIMEOUT):
+    """
+    Puts running jobs whose worker died, their lock not refreshed for `timeout`, back in the queue.
+    """
+    return Job.objects.filter(
+        status=Job.JobStatus.running, locked_at__lt=timezone.now() - timeout
+    ).update(status=Job.JobStatus.pending, locked_at=None, locked_by='')
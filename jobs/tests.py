@@ -0,0 +1,138 @@
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.db import connection
+from django.db.models import QuerySet
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .models import Job
+from .queue import claim_job, enqueue, get_backoff, refresh_lock, release_stale_jobs, run_job, task
+
+calls = []
+
+
+@task(name='jobs.tests.record')
+def record(value):
+    calls.append(value)
+
+
+@task(name='jobs.tests.fail', max_attempts=2)
+def fail():
+    raise ValueError('failed')
+
+
+@task(name='jobs.tests.sleep')
+def sleep(seconds):
+    time.sleep(seconds)
+
+
+class QueueTest(TestCase):
+
+    def setUp(self):
+        calls.clear()
+
+    def test_enqueue(self):
+        job = record.enqueue(delay=timedelta(minutes=1), value=1)
+        self.assertEqual((job.name, job.payload, job.status), ('jobs.tests.record', {'value': 1}, 'pending'))
+        self.assertGreater(job.run_at, timezone.now())
+        with self.assertRaises(KeyError):
+            enqueue('jobs.tests.unknown')
+
+    @override_settings(JOBS_ALWAYS_EAGER=True)
+    def test_eager_jobs_run_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertIsNone(record.enqueue(value=1))
+            self.assertEqual(calls, [])
+        self.assertEqual(calls, [1])
+        self.assertFalse(Job.objects.exists())
+
+    def test_claim(self):
+        for skip_locked in (True, False):
+            with self.subTest(skip_locked=skip_locked), mock.patch.object(
+                    connection.features, 'has_select_for_update_skip_locked', skip_locked):
+                Job.objects.all().delete()
+                later = record.enqueue(value=2)
+                Job.objects.filter(pk=later.pk).update(run_at=timezone.now() - timedelta(seconds=1))
+                first = record.enqueue(value=1)
+                Job.objects.filter(pk=first.pk).update(run_at=timezone.now() - timedelta(seconds=2))
+                record.enqueue(delay=timedelta(minutes=1), value=3)  # not due
+
+                job = claim_job('worker-1')
+                self.assertEqual((job.pk, job.status, job.attempts, job.locked_by),
+                                 (first.pk, 'running', 1, 'worker-1'))
+                self.assertIsNotNone(job.locked_at)
+                self.assertEqual(claim_job('worker-2').pk, later.pk)
+                self.assertIsNone(claim_job('worker-3'))
+
+    def test_claim_skips_job_taken_by_another_worker(self):
+        # without SKIP LOCKED (SQLite) a candidate claimed between the read and the update is skipped
+        first, second = record.enqueue(value=1), record.enqueue(value=2)
+        values_list = QuerySet.values_list
+
+        def candidates(queryset, *args, **kwargs):
+            ids = list(values_list(queryset, *args, **kwargs))
+            Job.objects.filter(pk=first.pk).update(status=Job.JobStatus.running, locked_by='other')
+            return ids
+
+        with mock.patch.object(connection.features, 'has_select_for_update_skip_locked', False), \
+                mock.patch.object(QuerySet, 'values_list', candidates):
+            job = claim_job('worker-1')
+        self.assertEqual(job.pk, second.pk)
+        self.assertEqual(Job.objects.get(pk=first.pk).locked_by, 'other')
+
+    def test_run(self):
+        record.enqueue(value=1)
+        job = run_job(claim_job('worker-1'))
+        self.assertEqual(calls, [1])
+        self.assertEqual((job.status, job.locked_at, job.locked_by), ('done', None, ''))
+
+    def test_retry_with_backoff(self):
+        fail.enqueue()
+        job = run_job(claim_job('worker-1'))
+        self.assertEqual((job.status, job.attempts), ('pending', 1))
+        self.assertIn('ValueError: failed', job.last_error)
+        self.assertAlmostEqual((job.run_at - timezone.now()).total_seconds(), 10, delta=1)
+        self.assertIsNone(claim_job('worker-1'))  # not due before the backoff
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        job = run_job(claim_job('worker-1'))
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+
+    def test_unknown_task_fails_without_retry(self):
+        job = Job.objects.create(name='jobs.tests.removed')
+        self.assertEqual(run_job(claim_job('worker-1')).status, 'failed')
+        self.assertIn('Unknown task', Job.objects.get(pk=job.pk).last_error)
+
+    def test_backoff(self):
+        self.assertEqual([get_backoff(attempt).total_seconds() for attempt in (1, 2, 3)], [10, 20, 40])
+        self.assertEqual(get_backoff(20), timedelta(hours=1))
+
+    def test_release_stale_jobs(self):
+        record.enqueue(value=1)
+        job = claim_job('worker-1')
+        self.assertEqual(release_stale_jobs(), 0)
+
+        Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(minutes=10))
+        self.assertEqual(release_stale_jobs(), 1)
+        self.assertEqual(Job.objects.values_list('status', 'locked_by').get(pk=job.pk), ('pending', ''))
+
+    def test_refreshed_lock_is_not_stale(self):
+        record.enqueue(value=1)
+        job = claim_job('worker-1')
+        Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(minutes=10))
+        self.assertTrue(refresh_lock(job))
+        self.assertEqual(release_stale_jobs(), 0)
+
+        # released meanwhile, the lock belongs to nobody
+        job.locked_by = 'worker-2'
+        self.assertFalse(refresh_lock(job))
+
+    def test_heartbeat_refreshes_the_lock_while_the_job_runs(self):
+        sleep.enqueue(seconds=0.2)
+        with mock.patch('jobs.queue.refresh_lock') as refresh:
+            job = run_job(claim_job('worker-1'), heartbeat_interval=0.05)
+        self.assertEqual(job.status, 'done')
+        self.assertGreaterEqual(refresh.call_count, 2)
+        refresh.assert_called_with(job)
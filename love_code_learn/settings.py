@@ -40,6 +40,7 @@ INSTALLED_APPS = [
     'accounts.apps.AccountsConfig',
     'cart.apps.CartConfig',
     'order.apps.OrderConfig',
+    'jobs.apps.JobsConfig',
 
     # External Apps
     'django_cleanup',
@@ -98,6 +99,27 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# The cache must be shared by every web process and the `run_worker` processes: it holds the course document
+# and catalog versions that the jobs and the other workers bump, a per-process cache (LocMemCache) would keep
+# serving stale documents and answering 304 for changed content. The database cache needs no extra service,
+# create its table with `python manage.py createcachetable`; Redis or Memcached work as well.
+# Every hit on the database cache is a query, the hot and small categories list is also kept in each process's
+# memory and only its version is read from here, at most every CATEGORIES_LOCAL_TIMEOUT seconds (courses/cache.py).
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'cache_table',
+    }
+}
+
+# Background jobs
+# jobs are executed by `python manage.py run_worker`, set JOBS_ALWAYS_EAGER to run them inline instead
+
+JOBS_ALWAYS_EAGER = False
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -141,6 +163,39 @@ STATICFILES_DIRS = [
 
 MEDIA_ROOT = 'media'
 MEDIA_URL = '/media/'
+# media directories served publicly, with DEBUG by Django itself. The videos and HLS renditions
+# (courses/videos/, courses/hls/) are only reachable through the enrollment checked stream views.
+PUBLIC_MEDIA_DIRS = ['courses/images/', 'users/avatars/', 'attached_files/']
+
+# Protected media streaming
+# 'nginx' hands the transfer to nginx with X-Accel-Redirect, 'apache' with X-Sendfile,
+# None streams the file from Django. With nginx, SENDFILE_URL must be an internal location
+# aliased to MEDIA_ROOT, e.g. `location /protected-media/ { internal; alias /srv/media/; }`,
+# and the videos directory must not be served publicly.
+
+SENDFILE_BACKEND = None
+SENDFILE_URL = '/protected-media/'
+
+# HLS packaging
+# renditions are (name, height, video kbps, audio kbps), taller ones than the source are skipped.
+# HLS_MAX_WORKERS bounds the cores used by one packaging job, None uses every available core.
+
+HLS_RENDITIONS = [
+    ('360p', 360, 800, 96),
+    ('480p', 480, 1400, 128),
+    ('720p', 720, 2800, 128),
+    ('1080p', 1080, 5000, 192),
+]
+HLS_MAX_WORKERS = None
+HLS_SEGMENT_SECONDS = 6
+
+# Idempotency keys
+# responses of the cart mutations sent with an Idempotency-Key header are replayed for this long,
+# `python manage.py purge_idempotency_keys` removes the expired ones. A request still in flight after
+# IDEMPOTENCY_LOCK_TIMEOUT is considered dead and its key can be reused.
+
+IDEMPOTENCY_KEY_TTL = timedelta(hours=24)
+IDEMPOTENCY_LOCK_TIMEOUT = timedelta(seconds=60)
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
@@ -152,11 +207,18 @@ REST_FRAMEWORK = {
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ],
 
+    # orjson backed JSON, see love_code_learn/settings_production.py for the production renderers
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'utils.renderers.ORJSONRenderer',
         'rest_framework.renderers.BrowsableAPIRenderer',
     ],
 
+    'DEFAULT_PARSER_CLASSES': [
+        'utils.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
 
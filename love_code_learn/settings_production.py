@@ -0,0 +1,21 @@
+"""
+Production settings, extends the development settings.
+
+    DJANGO_SETTINGS_MODULE=love_code_learn.settings_production
+"""
+import os
+
+from .settings import *  # noqa: F401, F403
+from .settings import REST_FRAMEWORK
+
+DEBUG = False
+
+ALLOWED_HOSTS = [host for host in os.environ.get('DJANGO_ALLOWED_HOSTS', '').split(',') if host]
+
+# JSON only, the browsable API renders an HTML page per request
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    'DEFAULT_RENDERER_CLASSES': [
+        'utils.renderers.ORJSONRenderer',
+    ],
+}
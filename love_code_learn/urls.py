@@ -14,10 +14,13 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import os
+import re
+
 from django.contrib import admin
-from django.urls import path, include
-from django.conf.urls.static import static
+from django.urls import path, include, re_path
 from django.conf import settings
+from django.views.static import serve
 
 # schema modules
 from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView, SpectacularSwaggerView
@@ -42,5 +45,18 @@ urlpatterns += [
     path('schema/redoc/', SpectacularRedocView.as_view(url_name='schema'), name='redoc'),
 ]
 
+
+def public_media_urlpatterns():
+    """
+    Serves the PUBLIC_MEDIA_DIRS for development, each rooted at its own directory
+    so a `..` in the path can not reach the protected videos.
+    """
+    return [
+        re_path(rf'^{re.escape(settings.MEDIA_URL.lstrip("/") + directory)}(?P<path>.*)$', serve,
+                {'document_root': os.path.join(settings.MEDIA_ROOT, directory)})
+        for directory in settings.PUBLIC_MEDIA_DIRS
+    ]
+
+
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    urlpatterns += public_media_urlpatterns()
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Order, OrderItem
+from .models import Order, OrderItem, DailyCourseSales
 
 # Register your models here.
 
@@ -9,10 +9,18 @@ class OrderItemInline(admin.TabularInline):
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ['student', 'is_paid', 'get_total_cost']
+    list_display = ['student', 'is_paid', 'total_cost']
+    list_select_related = ['student']
     inlines = [OrderItemInline]
 
 
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
-    list_display = ['order']
\ No newline at end of file
+    list_display = ['order']
+
+
+@admin.register(DailyCourseSales)
+class DailyCourseSalesAdmin(admin.ModelAdmin):
+    list_display = ['course', 'teacher', 'day', 'sales_count', 'revenue']
+    list_filter = ['day']
+    raw_id_fields = ['teacher', 'course']
@@ -0,0 +1,92 @@
+import csv
+from datetime import datetime, time, timedelta
+
+import orjson
+from django.utils import timezone
+
+from courses.models import Enrollment
+from utils.renderers import DEFAULT_OPTIONS, default
+from .models import Order, OrderItem
+
+# rows fetched from the database per round trip
+EXPORT_CHUNK_SIZE = 2000
+
+# dataset: (model, date field filtered by the range, exported values)
+EXPORTS = {
+    'orders': (Order, 'created', [
+        'id', 'created', 'student', 'student__username', 'student__phone_number', 'is_paid', 'total_cost',
+    ]),
+    'order-items': (OrderItem, 'order__created', [
+        'id', 'order', 'order__created', 'order__student', 'order__is_paid', 'course', 'course__title',
+        'course__teacher', 'price',
+    ]),
+    'enrollments': (Enrollment, 'purchased_at', [
+        'id', 'purchased_at', 'student', 'student__username', 'course', 'course__title',
+    ]),
+}
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson',
+}
+
+
+def get_export_rows(dataset, start=None, end=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yields the `.values()` rows of the dataset in id order, optionally limited to the days from start to end
+    (inclusive). The rows are read with a chunked iterator, the memory used does not grow with the export.
+    """
+    model, date_field, fields = EXPORTS[dataset]
+    queryset = model.objects.order_by('pk')
+    # bounds on the column itself, so the filter can use its index
+    if start is not None:
+        queryset = queryset.filter(**{f'{date_field}__gte': _start_of_day(start)})
+    if end is not None:
+        queryset = queryset.filter(**{f'{date_field}__lt': _start_of_day(end + timedelta(days=1))})
+    return queryset.values(*fields).iterator(chunk_size=chunk_size)
+
+
+def _start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+class _Echo:
+    """
+    File-like object returning what is written, lets csv.writer produce one line at a time.
+    """
+
+    def write(self, value):
+        return value
+
+
+def render_csv(dataset, rows):
+    """
+    Yields the CSV export as UTF-8 encoded lines, a header line first.
+    """
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORTS[dataset][2]).encode()
+    for row in rows:
+        yield writer.writerow(
+            [value.isoformat() if isinstance(value, datetime) else value for value in row.values()]
+        ).encode()
+
+
+def render_jsonl(dataset, rows):
+    """
+    Yields the JSON Lines export, one JSON object per row, encoded like the API responses.
+    """
+    for row in rows:
+        yield orjson.dumps(row, default=default, option=DEFAULT_OPTIONS | orjson.OPT_APPEND_NEWLINE)
+
+
+RENDERERS = {
+    'csv': render_csv,
+    'jsonl': render_jsonl,
+}
+
+
+def render_export(dataset, export_format, start=None, end=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Returns a generator of the encoded export.
+    """
+    rows = get_export_rows(dataset, start, end, chunk_size)
+    return RENDERERS[export_format](dataset, rows)
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from order.models import Order, OrderItem
+
+
+class Command(BaseCommand):
+    help = 'Writes Order.total_cost from the order items, for the orders created before the column existed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Orders updated per query.')
+
+    def handle(self, *args, **options):
+        totals = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order').annotate(
+            total=Sum('price')).values('total')
+        order_ids = Order.objects.order_by('pk').values_list('pk', flat=True)
+        updated = 0
+        last_id = 0
+        while True:
+            chunk = list(order_ids.filter(pk__gt=last_id)[:options['chunk_size']])
+            if not chunk:
+                break
+            last_id = chunk[-1]
+            updated += Order.objects.filter(pk__in=chunk).update(total_cost=Coalesce(Subquery(totals), Value(0)))
+        self.stdout.write(self.style.SUCCESS(f'Updated the total cost of {updated} orders.'))
@@ -0,0 +1,39 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from order.exports import EXPORTS, EXPORT_FORMATS, EXPORT_CHUNK_SIZE, render_export
+
+
+def _date(value):
+    day = parse_date(value)
+    if day is None:
+        raise ValueError(value)
+    return day
+
+
+class Command(BaseCommand):
+    help = 'Streams an export of orders, order items or enrollments as CSV or JSON Lines.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(EXPORTS))
+        parser.add_argument('--format', dest='export_format', choices=sorted(EXPORT_FORMATS), default='csv')
+        parser.add_argument('--start', type=_date, help='First day included, YYYY-MM-DD.')
+        parser.add_argument('--end', type=_date, help='Last day included, YYYY-MM-DD.')
+        parser.add_argument('--output', help='File to write, standard output by default.')
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE,
+                            help='Rows fetched from the database per round trip.')
+
+    def handle(self, *args, **options):
+        if options['start'] and options['end'] and options['start'] > options['end']:
+            raise CommandError('--start must not be after --end')
+
+        chunks = render_export(options['dataset'], options['export_format'], options['start'], options['end'],
+                               options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'wb') as output:
+                output.writelines(chunks)
+        else:
+            sys.stdout.buffer.writelines(chunks)
+            sys.stdout.flush()
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from order.rollups import REBUILD_CHUNK_SIZE, rebuild_sales_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the daily course sales rollups of the teacher dashboard from the paid orders.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=REBUILD_CHUNK_SIZE,
+                            help='Courses rebuilt per transaction.')
+
+    def handle(self, *args, **options):
+        written = rebuild_sales_rollups(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} daily sales rollups.'))
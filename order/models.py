@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import Sum, Value
+from django.db.models.functions import Coalesce
 from courses.models import Course
 from accounts.models import User
 
@@ -14,6 +16,8 @@ class Order(models.Model):
     student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='orders')
     is_paid = models.BooleanField(default=False)
     created = models.DateTimeField(auto_now_add=True)
+    # sum of the item prices, written at checkout
+    total_cost = models.PositiveBigIntegerField(default=0)
 
     def __str__(self):
         return str(self.student)
@@ -25,14 +29,22 @@ class Order(models.Model):
         ordering = ['created']
         verbose_name = 'Order'
         verbose_name_plural = 'Orders'
+        indexes = [
+            models.Index(fields=['student', 'created', 'id'], name='order_student_created_idx'),
+        ]
 
     @property
     def get_total_cost(self):
         """
-        Calculates the total cost of the order by summing the final prices of all items.
+        The total cost of the order, the sum of the final prices of its items stored at checkout.
         """
-        total = sum(item.price for item in self.items.all())
-        return total
+        return self.total_cost
+
+    def compute_total_cost(self):
+        """
+        Sums the item prices, to check or repair the stored total.
+        """
+        return self.items.aggregate(total=Coalesce(Sum('price'), Value(0)))['total']
 
 
 class OrderItem(models.Model):
@@ -56,3 +68,26 @@ class OrderItem(models.Model):
         verbose_name_plural = 'Order items'
 
 
+class DailyCourseSales(models.Model):
+    """
+    Daily sales rollup of a course, the source of the teacher dashboard.
+    Incremented at checkout and rebuilt from the paid orders by `rebuild_sales_rollups`.
+    """
+    teacher = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_sales')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='daily_sales')
+    day = models.DateField()
+    sales_count = models.PositiveIntegerField(default=0)
+    revenue = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.course_id} - {self.day}'
+
+    class Meta:
+        verbose_name = 'Daily course sales'
+        verbose_name_plural = 'Daily course sales'
+        constraints = [
+            models.UniqueConstraint(fields=['teacher', 'course', 'day'], name='daily_sales_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['teacher', 'day'], name='daily_sales_teacher_day_idx'),
+        ]
@@ -0,0 +1,10 @@
+from utils.pagination import KeysetPagination
+
+
+class OrderCursorPagination(KeysetPagination):
+    """
+    Cursor pagination for the order history of a student, newest orders first.
+    Backed by the `order_student_created_idx` index on Order.
+    """
+    ordering = ('-created', '-id')
+    page_size = 10
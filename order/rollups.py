@@ -0,0 +1,75 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, Count, F, Q, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from courses.models import Course
+from .models import DailyCourseSales, OrderItem
+
+# courses rebuilt per transaction by `rebuild_sales_rollups`
+REBUILD_CHUNK_SIZE = 200
+
+
+def add_sales(sales, day=None):
+    """
+    Adds sales to the daily rollups, `sales` is an iterable of (teacher_id, course_id, price).
+    The missing rollup rows are created and all the rows are incremented with F() expressions,
+    two queries however many courses were sold.
+    """
+    totals = defaultdict(lambda: [0, 0])
+    for teacher_id, course_id, price in sales:
+        totals[teacher_id, course_id][0] += 1
+        totals[teacher_id, course_id][1] += price
+    if not totals:
+        return
+
+    day = day or timezone.localdate()
+    DailyCourseSales.objects.bulk_create(
+        [DailyCourseSales(teacher_id=teacher_id, course_id=course_id, day=day) for teacher_id, course_id in totals],
+        ignore_conflicts=True,
+    )
+
+    rows = Q()
+    count_cases = []
+    revenue_cases = []
+    for (teacher_id, course_id), (count, revenue) in totals.items():
+        row = Q(teacher_id=teacher_id, course_id=course_id)
+        rows |= row
+        count_cases.append(When(row, then=Value(count)))
+        revenue_cases.append(When(row, then=Value(revenue)))
+    DailyCourseSales.objects.filter(rows, day=day).update(
+        sales_count=F('sales_count') + Case(*count_cases, default=Value(0)),
+        revenue=F('revenue') + Case(*revenue_cases, default=Value(0)),
+    )
+
+
+def rebuild_sales_rollups(chunk_size=REBUILD_CHUNK_SIZE):
+    """
+    Rebuilds the daily rollups from the items of the paid orders, `chunk_size` courses per transaction.
+    Returns the number of rollup rows written.
+    """
+    written = 0
+    course_ids = Course.objects.order_by('pk').values_list('pk', flat=True)
+    last_id = 0
+    while True:
+        chunk = list(course_ids.filter(pk__gt=last_id)[:chunk_size])
+        if not chunk:
+            return written
+        last_id = chunk[-1]
+
+        totals = OrderItem.objects.filter(course_id__in=chunk, order__is_paid=True).annotate(
+            day=TruncDate('order__created')
+        ).order_by().values('course__teacher', 'course', 'day').annotate(
+            sales_count=Count('id'), revenue=Sum('price')
+        )
+        rollups = [
+            DailyCourseSales(teacher_id=row['course__teacher'], course_id=row['course'], day=row['day'],
+                             sales_count=row['sales_count'], revenue=row['revenue'])
+            for row in totals
+        ]
+        with transaction.atomic():
+            DailyCourseSales.objects.filter(course_id__in=chunk).delete()
+            DailyCourseSales.objects.bulk_create(rollups, batch_size=1000)
+        written += len(rollups)
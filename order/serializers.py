@@ -1,9 +1,10 @@
 from rest_framework import serializers
 from .models import Order, OrderItem
 from courses.serializers import CourseListSerializer
+from utils.serializers import ValuesSerializerMixin
 
 
-class OrderItemSerializer(serializers.ModelSerializer):
+class OrderItemSerializer(ValuesSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for displaying order item details including the course information.
     Each item includes the course associated with the order.
@@ -16,22 +17,42 @@ class OrderItemSerializer(serializers.ModelSerializer):
         fields = ['course', 'price']
 
 
-class OrderListSerializer(serializers.ModelSerializer):
+class OrderListSerializer(ValuesSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for displaying general order details including items, total cost,
     payment status, and the creation date of the order.
     """
 
+    CREATED_FORMAT = '%d/%m/%Y %H:%M'
+
     items = OrderItemSerializer(many=True) # get order items
     student = serializers.StringRelatedField() # display student name
+    get_total_cost = serializers.IntegerField(source='total_cost', read_only=True)
     created = serializers.SerializerMethodField()
 
     class Meta:
         model = Order
         fields = ['student', 'items', 'get_total_cost', 'is_paid', 'created']
+        values_sources = {
+            'student': 'student__username',
+            'created': ('created', lambda created: created.strftime(OrderListSerializer.CREATED_FORMAT)),
+        }
 
     def get_created(self, obj):
         """
         the add formated created date
         """
-        return obj.created.strftime('%d/%m/%Y %H:%M')
+        return obj.created.strftime(self.CREATED_FORMAT)
+
+
+class ExportQuerySerializer(serializers.Serializer):
+    """
+    Validates the optional date range of a finance export, both days included.
+    """
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+
+    def validate(self, data):
+        if data.get('start') and data.get('end') and data['start'] > data['end']:
+            raise serializers.ValidationError({'message': 'start must not be after end'})
+        return data
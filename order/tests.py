@@ -1,3 +1,344 @@
-from django.test import TestCase
+import csv
+import json
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.test import Client, TestCase
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.models import User
+from cart.models import Cart, CartItem
+from courses.models import Category, Course, Enrollment
+from .exports import render_export
+from .models import DailyCourseSales, Order, OrderItem
+
+
+def auth_client(user):
+    return Client(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+
+
+class OrderTestCase(TestCase):
+    """
+    Two teachers selling three published courses and two students.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user(phone_number='09120000001', password='x', username='teacher',
+                                               role='teacher')
+        cls.other_teacher = User.objects.create_user(phone_number='09120000002', password='x',
+                                                     username='other-teacher', role='teacher')
+        cls.students = [
+            User.objects.create_user(phone_number=f'0912000001{index}', password='x', username=f'student-{index}')
+            for index in range(2)
+        ]
+        category = Category.objects.create(name='Python', slug='python')
+        cls.courses = [
+            Course.objects.create(
+                category=category, teacher=teacher, thumbnail='', title=f'Course {index}', description='d',
+                slug=f'course-{index}', price=1000 * index, release_status='published',
+            )
+            for index, teacher in enumerate([cls.teacher, cls.teacher, cls.other_teacher], start=1)
+        ]
+
+    def buy(self, student, courses):
+        cart = Cart.objects.create(user=student)
+        CartItem.objects.bulk_create([CartItem(cart=cart, course=course) for course in courses])
+        return auth_client(student).post('/cart/buy/', json.dumps({'cart_id': cart.pk}),
+                                         content_type='application/json')
+
+    def create_order(self, student, courses, created, is_paid=True):
+        """
+        An order written straight to the tables, as the old orders without rollups.
+        """
+        order = Order.objects.create(student=student, is_paid=is_paid)
+        OrderItem.objects.bulk_create([OrderItem(order=order, course=course, price=course.price)
+                                       for course in courses])
+        Order.objects.filter(pk=order.pk).update(created=created)
+        return order
+
+
+class SalesRollupTest(OrderTestCase):
+
+    def raw_sales(self):
+        rows = OrderItem.objects.filter(order__is_paid=True).annotate(day=TruncDate('order__created')).order_by(
+        ).values('course__teacher', 'course', 'day').annotate(sales_count=Count('id'), revenue=Sum('price'))
+        return {(row['course__teacher'], row['course'], row['day']): (row['sales_count'], row['revenue'])
+                for row in rows}
+
+    def rollups(self):
+        return {(row.teacher_id, row.course_id, row.day): (row.sales_count, row.revenue)
+                for row in DailyCourseSales.objects.all()}
+
+    def test_purchases_match_raw_orders(self):
+        self.assertEqual(self.buy(self.students[0], self.courses).status_code, 201)
+        self.assertEqual(self.buy(self.students[1], self.courses[:2]).status_code, 201)
+
+        today = timezone.localdate()
+        self.assertEqual(self.rollups(), {
+            (self.teacher.pk, self.courses[0].pk, today): (2, 2000),
+            (self.teacher.pk, self.courses[1].pk, today): (2, 4000),
+            (self.other_teacher.pk, self.courses[2].pk, today): (1, 3000),
+        })
+        self.assertEqual(self.rollups(), self.raw_sales())
+
+        # the rebuild writes the rollups the purchases kept up to date
+        call_command('rebuild_sales_rollups', stdout=StringIO())
+        self.assertEqual(self.rollups(), self.raw_sales())
+
+    def test_rebuild_from_raw_orders(self):
+        now = timezone.now()
+        self.create_order(self.students[0], self.courses, now - timedelta(days=2))
+        self.create_order(self.students[1], self.courses[:1], now - timedelta(days=2))
+        self.create_order(self.students[1], self.courses[1:], now - timedelta(days=1))
+        # not paid, not a sale
+        self.create_order(self.students[1], self.courses, now - timedelta(days=1), is_paid=False)
+        # a stale rollup is replaced
+        DailyCourseSales.objects.create(teacher=self.teacher, course=self.courses[0], day=timezone.localdate(),
+                                        sales_count=5, revenue=5000)
+
+        call_command('rebuild_sales_rollups', '--chunk-size', '2', stdout=StringIO())
+        self.assertEqual(self.rollups(), self.raw_sales())
+        self.assertEqual(DailyCourseSales.objects.count(), 5)
+        self.assertEqual(DailyCourseSales.objects.aggregate(revenue=Sum('revenue'))['revenue'], 12000)
+
+
+class TeacherDashboardTest(OrderTestCase):
+
+    def setUp(self):
+        self.today = timezone.localdate()
+        for course, days_ago, sales_count in [
+            (self.courses[0], 0, 1), (self.courses[1], 0, 2), (self.courses[0], 3, 4),
+            (self.courses[1], 40, 1), (self.courses[2], 0, 7),
+        ]:
+            DailyCourseSales.objects.create(
+                teacher=course.teacher, course=course, day=self.today - timedelta(days=days_ago),
+                sales_count=sales_count, revenue=sales_count * course.price,
+            )
+        self.client = auth_client(self.teacher)
+
+    def dashboard(self, **params):
+        return self.client.get('/accounts/teacher/dashboard/', params)
+
+    def test_default_range(self):
+        response = self.dashboard()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'start': str(self.today - timedelta(days=29)),
+            'end': str(self.today),
+            'sales_count': 7,
+            'revenue': 9000,
+            'days': [
+                {'day': str(self.today - timedelta(days=3)), 'sales_count': 4, 'revenue': 4000},
+                {'day': str(self.today), 'sales_count': 3, 'revenue': 5000},
+            ],
+            'courses': [
+                {'id': self.courses[0].pk, 'title': 'Course 1', 'slug': 'course-1', 'sales_count': 5,
+                 'revenue': 5000},
+                {'id': self.courses[1].pk, 'title': 'Course 2', 'slug': 'course-2', 'sales_count': 2,
+                 'revenue': 4000},
+            ],
+        })
+
+    def test_custom_range(self):
+        response = self.dashboard(start=str(self.today - timedelta(days=45)),
+                                  end=str(self.today - timedelta(days=1)))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data['sales_count'], data['revenue']), (5, 6000))
+        self.assertEqual([day['day'] for day in data['days']],
+                         [str(self.today - timedelta(days=40)), str(self.today - timedelta(days=3))])
+        self.assertEqual([course['id'] for course in data['courses']], [self.courses[0].pk, self.courses[1].pk])
+
+        # a single day
+        data = self.dashboard(start=str(self.today), end=str(self.today)).json()
+        self.assertEqual((data['sales_count'], data['revenue']), (3, 5000))
+
+    def test_empty_range(self):
+        data = self.dashboard(start='2000-01-01', end='2000-01-31').json()
+        self.assertEqual((data['sales_count'], data['revenue'], data['days'], data['courses']), (0, 0, [], []))
+
+    def test_invalid_range(self):
+        response = self.dashboard(start=str(self.today), end=str(self.today - timedelta(days=1)))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'message': ['start must not be after end']})
+
+        response = self.dashboard(start=str(self.today - timedelta(days=366)), end=str(self.today))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'message': ['The range can not exceed 366 days']})
+        self.assertEqual(self.dashboard(start=str(self.today - timedelta(days=365))).status_code, 200)
+
+        self.assertEqual(self.dashboard(start='yesterday').status_code, 400)
+
+    def test_permissions(self):
+        self.assertEqual(Client().get('/accounts/teacher/dashboard/').status_code, 401)
+        self.client = auth_client(self.students[0])
+        self.assertEqual(self.dashboard().status_code, 403)
+
+
+class OrderTotalTest(OrderTestCase):
+
+    def test_total_stored_at_purchase(self):
+        self.assertEqual(self.buy(self.students[0], self.courses).status_code, 201)
+        order = Order.objects.get(student=self.students[0])
+        self.assertEqual(order.total_cost, 6000)
+        self.assertEqual(order.total_cost, order.compute_total_cost())
+        self.assertEqual(auth_client(self.students[0]).get('/orders/').json()['results'][0]['get_total_cost'], 6000)
+
+    def test_backfill(self):
+        now = timezone.now()
+        orders = [
+            self.create_order(self.students[0], self.courses, now),
+            self.create_order(self.students[0], self.courses[:1], now),
+            self.create_order(self.students[1], [], now),
+            self.create_order(self.students[1], self.courses[1:], now, is_paid=False),
+        ]
+        # a total written wrong is repaired as well
+        Order.objects.filter(pk=orders[2].pk).update(total_cost=500)
+
+        out = StringIO()
+        call_command('backfill_order_totals', '--chunk-size', '3', stdout=out)
+        self.assertIn('Updated the total cost of 4 orders.', out.getvalue())
+        for order in orders:
+            order.refresh_from_db()
+            self.assertEqual(order.total_cost, order.compute_total_cost())
+        self.assertEqual([order.total_cost for order in orders], [6000, 1000, 0, 5000])
+
+
+class UserOrdersTest(OrderTestCase):
+
+    def setUp(self):
+        # pairs of orders created at the same time, the id breaks the tie
+        now = timezone.now()
+        self.orders = []
+        for index in range(13):
+            order = Order.objects.create(student=self.students[0], is_paid=True, total_cost=index)
+            OrderItem.objects.create(order=order, course=self.courses[index % 3], price=index)
+            Order.objects.filter(pk=order.pk).update(created=now - timedelta(minutes=index // 2))
+            self.orders.append(order)
+        # not listed
+        Order.objects.create(student=self.students[1], total_cost=100)
+        self.client = auth_client(self.students[0])
+
+    def walk(self, path):
+        pages = [self.client.get(path).json()]
+        while pages[-1]['next']:
+            pages.append(self.client.get(pages[-1]['next']).json())
+        return pages
+
+    def test_pages(self):
+        pages = self.walk('/accounts/user/orders/')
+        self.assertEqual([len(page['results']) for page in pages], [10, 3])
+        self.assertIsNone(pages[0]['previous'])
+        self.assertIsNotNone(pages[1]['previous'])
+
+        totals = [order['get_total_cost'] for page in pages for order in page['results']]
+        # newest first, the later of two orders created together first
+        self.assertEqual(totals, [1, 0, 3, 2, 5, 4, 7, 6, 9, 8, 11, 10, 12])
+
+        previous = self.client.get(pages[1]['previous']).json()
+        self.assertEqual(previous['results'], pages[0]['results'])
+
+    def test_same_orders_as_order_list(self):
+        self.assertEqual([page['results'] for page in self.walk('/accounts/user/orders/')],
+                         [page['results'] for page in self.walk('/orders/')])
+
+    def test_queries(self):
+        # the orders and their items, whatever the page size
+        with self.assertNumQueries(3):
+            self.client.get('/accounts/user/orders/')
+        with self.assertNumQueries(3):
+            self.client.get('/accounts/user/orders/?page_size=2')
+
+    def test_anonymous(self):
+        self.assertEqual(Client().get('/accounts/user/orders/').status_code, 401)
+
+
+class FinanceExportTest(OrderTestCase):
+
+    def setUp(self):
+        now = timezone.now()
+        self.today = timezone.localdate()
+        self.orders = [
+            self.create_order(self.students[0], self.courses, now - timedelta(days=3)),
+            self.create_order(self.students[1], self.courses[:1], now - timedelta(days=1)),
+            self.create_order(self.students[1], self.courses[1:], now, is_paid=False),
+        ]
+        Enrollment.objects.create(student=self.students[0], course=self.courses[0])
+        self.admin = User.objects.create_superuser(phone_number='09120000009', password='x', username='admin')
+        self.client = auth_client(self.admin)
+
+    def export(self, path, **params):
+        response = self.client.get(f'/orders/exports/{path}', params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_csv(self):
+        response = self.export('orders.csv')
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="orders.csv"')
+
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(rows[0], ['id', 'created', 'student', 'student__username', 'student__phone_number',
+                                   'is_paid', 'total_cost'])
+        self.assertEqual([row[0] for row in rows[1:]], [str(order.pk) for order in self.orders])
+        order = Order.objects.get(pk=self.orders[0].pk)
+        self.assertEqual(rows[1], [str(order.pk), order.created.isoformat(), str(self.students[0].pk),
+                                   'student-0', '09120000010', 'True', '0'])
+
+    def test_jsonl(self):
+        response = self.export('order-items.jsonl')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="order-items.jsonl"')
+
+        lines = b''.join(response.streaming_content).splitlines()
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual([row['id'] for row in rows],
+                         list(OrderItem.objects.order_by('pk').values_list('pk', flat=True)))
+        self.assertEqual(sum(row['price'] for row in rows), 12000)
+        self.assertEqual(rows[0]['course__title'], 'Course 1')
+        self.assertEqual(rows[0]['order'], self.orders[0].pk)
+        self.assertTrue(rows[0]['order__created'].endswith('Z'))
+
+        rows = [json.loads(line) for line in b''.join(self.export('enrollments.jsonl').streaming_content).splitlines()]
+        self.assertEqual([(row['student__username'], row['course__title']) for row in rows],
+                         [('student-0', 'Course 1')])
+
+    def test_date_range(self):
+        def exported_orders(**params):
+            rows = b''.join(self.export('orders.jsonl', **params).streaming_content).splitlines()
+            return [json.loads(row)['id'] for row in rows]
+
+        self.assertEqual(exported_orders(start=str(self.today - timedelta(days=1))),
+                         [self.orders[1].pk, self.orders[2].pk])
+        self.assertEqual(exported_orders(end=str(self.today - timedelta(days=1))),
+                         [self.orders[0].pk, self.orders[1].pk])
+        # both days included
+        self.assertEqual(exported_orders(start=str(self.today - timedelta(days=3)),
+                                         end=str(self.today - timedelta(days=3))), [self.orders[0].pk])
+        self.assertEqual(exported_orders(start='2000-01-01', end='2000-01-02'), [])
+
+        response = self.client.get('/orders/exports/orders.csv', {'start': str(self.today),
+                                                                  'end': str(self.today - timedelta(days=1))})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get('/orders/exports/orders.csv', {'start': 'today'}).status_code, 400)
+
+    def test_streamed_in_chunks(self):
+        # a header line, then one line per row as it is read
+        chunks = list(render_export('order-items', 'csv', chunk_size=2))
+        self.assertEqual(len(chunks), 1 + OrderItem.objects.count())
+
+    def test_unknown_export(self):
+        self.assertEqual(self.client.get('/orders/exports/users.csv').status_code, 404)
+        self.assertEqual(self.client.get('/orders/exports/orders.xml').status_code, 404)
+
+    def test_admin_only(self):
+        self.assertEqual(Client().get('/orders/exports/orders.csv').status_code, 401)
+        for user in [self.students[0], self.teacher]:
+            self.client = auth_client(user)
+            self.assertEqual(self.client.get('/orders/exports/orders.csv').status_code, 403)
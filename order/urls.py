@@ -7,4 +7,5 @@ app_name = 'order'
 urlpatterns = [
     path('orders/', views.OrderListView.as_view(), name='order-list'),
     path('orders/<int:pk>/', views.OrderDetailView.as_view(), name='order-detail'),
+    path('orders/exports/<slug:dataset>.<slug:extension>', views.FinanceExportView.as_view(), name='order-export'),
 ]
\ No newline at end of file
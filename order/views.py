@@ -1,8 +1,17 @@
-from rest_framework import generics, permissions
-from order.models import Order
-from order.serializers import OrderListSerializer
+from django.db.models import Prefetch
+from django.http import Http404, StreamingHttpResponse
+from rest_framework import generics, permissions, views
+from order.exports import EXPORTS, EXPORT_FORMATS, render_export
+from order.models import Order, OrderItem
+from order.pagination import OrderCursorPagination
+from order.serializers import OrderListSerializer, ExportQuerySerializer
 from utils.permissions import IsAuthAndOwner
 
+# orders with their items, courses, categories and teachers, loaded with one prefetch query
+ORDERS_WITH_ITEMS = Order.objects.select_related('student').prefetch_related(
+    Prefetch('items', queryset=OrderItem.objects.select_related('course__category', 'course__teacher').order_by('pk'))
+)
+
 
 # Create your views here.
 
@@ -10,17 +19,18 @@ from utils.permissions import IsAuthAndOwner
 class OrderListView(generics.ListCreateAPIView):
     """
     API view to list all orders for the authenticated user order.
-    Only orders belonging to the current user are returned.
+    Only orders belonging to the current user are returned, newest first and paginated.
     """
-    queryset = Order.objects.all()
+    queryset = ORDERS_WITH_ITEMS
     serializer_class = OrderListSerializer
     permission_classes = [IsAuthAndOwner]
+    pagination_class = OrderCursorPagination
 
     def get_queryset(self):
         """
         Restrict the queryset to only orders associated with the authenticated user.
         """
-        return Order.objects.filter(student=self.request.user)
+        return ORDERS_WITH_ITEMS.filter(student=self.request.user)
 
 
 class OrderDetailView(generics.RetrieveAPIView):
@@ -28,6 +38,32 @@ class OrderDetailView(generics.RetrieveAPIView):
     API view to retrieve detailed information about a specific order for the authenticated user.
     Only allows access to orders belonging to the current user.
     """
-    queryset = Order.objects.all()
+    queryset = ORDERS_WITH_ITEMS
     serializer_class = OrderListSerializer
     permission_classes = [IsAuthAndOwner]
+
+
+class FinanceExportView(views.APIView):
+    """
+    Streams a full export of orders, order items or enrollments as CSV or JSON Lines, for admins only.
+    Accepts `start` and `end` days (inclusive) to limit the range. The rows are read in chunks
+    and written as they are read, so memory stays constant however large the export is.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def perform_content_negotiation(self, request, force=False):
+        # the export format comes from the URL, any Accept header is served
+        return super().perform_content_negotiation(request, force=True)
+
+    def get(self, request, dataset, extension):
+        if dataset not in EXPORTS or extension not in EXPORT_FORMATS:
+            raise Http404
+        query = ExportQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+
+        response = StreamingHttpResponse(
+            render_export(dataset, extension, query.validated_data.get('start'), query.validated_data.get('end')),
+            content_type=EXPORT_FORMATS[extension],
+        )
+        response['Content-Disposition'] = f'attachment; filename="{dataset}.{extension}"'
+        return response
@@ -0,0 +1,32 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+def make_etag(*parts):
+    """
+    Builds a strong ETag from the parts that identify a representation.
+    """
+    digest = hashlib.md5(':'.join(str(part) for part in parts).encode(), usedforsecurity=False).hexdigest()
+    return f'"{digest}"'
+
+
+def get_not_modified_response(request, etag=None, last_modified=None):
+    """
+    Evaluates If-None-Match / If-Modified-Since against the validators before the response is built.
+    Returns the 304 (or 412) response to send, None when the full response is needed.
+    """
+    timestamp = int(last_modified.timestamp()) if last_modified is not None else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag=None, last_modified=None):
+    if etag is not None:
+        response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    return response
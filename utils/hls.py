@@ -0,0 +1,123 @@
+import mimetypes
+import os
+import re
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from utils.video import available_cores
+
+MASTER_PLAYLIST = 'master.m3u8'
+# names of the playlists and segments written by ffmpeg, anything else is rejected when serving
+HLS_FILE_RE = re.compile(r'^\w+\.(m3u8|ts)$')
+VIDEO_SIZE_RE = re.compile(r'Stream #.*Video: .*?\b(\d{2,5})x(\d{2,5})\b')
+
+# not registered on every system, .ts is sometimes mapped to Qt translation files
+mimetypes.add_type('application/vnd.apple.mpegurl', '.m3u8')
+mimetypes.add_type('video/mp2t', '.ts')
+
+
+class PackagingError(Exception):
+    pass
+
+
+def get_ffmpeg():
+    """
+    Returns the path of the ffmpeg binary shipped with moviepy (imageio-ffmpeg).
+    """
+    import imageio_ffmpeg
+
+    return imageio_ffmpeg.get_ffmpeg_exe()
+
+
+def probe_stream(ffmpeg, source_path):
+    """
+    Returns (width, height, has_audio) of the first video stream of a file.
+    """
+    result = subprocess.run([ffmpeg, '-hide_banner', '-i', source_path], capture_output=True, text=True)
+    match = VIDEO_SIZE_RE.search(result.stderr)
+    if not match:
+        raise PackagingError(f'No video stream found in {source_path}')
+    return int(match.group(1)), int(match.group(2)), 'Audio:' in result.stderr
+
+
+def select_renditions(renditions, source_height):
+    """
+    Drops the renditions taller than the source, the smallest one is always kept.
+    """
+    renditions = sorted(renditions, key=lambda rendition: rendition[1])
+    selected = [rendition for rendition in renditions if rendition[1] <= source_height]
+    return selected or renditions[:1]
+
+
+def _transcode(ffmpeg, source_path, output_dir, rendition, has_audio, threads, segment_seconds):
+    name, height, video_kbps, audio_kbps = rendition
+    command = [
+        ffmpeg, '-hide_banner', '-loglevel', 'error', '-y', '-i', source_path,
+        '-map', '0:v:0', '-vf', f'scale=-2:{height}', '-c:v', 'libx264', '-preset', 'veryfast',
+        '-profile:v', 'main', '-pix_fmt', 'yuv420p',
+        '-b:v', f'{video_kbps}k', '-maxrate', f'{int(video_kbps * 1.07)}k', '-bufsize', f'{video_kbps * 2}k',
+        # fixed keyframe interval so every segment starts on a keyframe in all renditions
+        '-force_key_frames', f'expr:gte(t,n_forced*{segment_seconds})', '-sc_threshold', '0',
+    ]
+    if has_audio:
+        command += ['-map', '0:a:0', '-c:a', 'aac', '-b:a', f'{audio_kbps}k', '-ac', '2']
+    command += [
+        '-threads', str(threads),
+        '-f', 'hls', '-hls_time', str(segment_seconds), '-hls_playlist_type', 'vod',
+        '-hls_segment_filename', os.path.join(output_dir, f'{name}_%04d.ts'),
+        os.path.join(output_dir, f'{name}.m3u8'),
+    ]
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise PackagingError(f'ffmpeg failed for {name}: {result.stderr.strip()[-2000:]}')
+
+
+def package_hls(source_path, output_dir, renditions=None, max_workers=None, segment_seconds=None):
+    """
+    Transcodes a video into HLS renditions with a master playlist, written to output_dir.
+    The renditions are encoded in parallel, max_workers defaults to the HLS_MAX_WORKERS setting
+    or the number of available cores, which are shared between the ffmpeg processes.
+    Returns the names of the written files, the master playlist first.
+    """
+    ffmpeg = get_ffmpeg()
+    renditions = renditions or settings.HLS_RENDITIONS
+    max_workers = max_workers or getattr(settings, 'HLS_MAX_WORKERS', None) or available_cores()
+    segment_seconds = segment_seconds or getattr(settings, 'HLS_SEGMENT_SECONDS', 6)
+
+    width, height, has_audio = probe_stream(ffmpeg, source_path)
+    renditions = select_renditions(renditions, height)
+
+    workers = min(len(renditions), max_workers)
+    threads = max(1, max_workers // workers)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(_transcode, ffmpeg, source_path, output_dir, rendition, has_audio, threads,
+                            segment_seconds)
+            for rendition in renditions
+        ]
+        for future in futures:
+            future.result()
+
+    lines = ['#EXTM3U', '#EXT-X-VERSION:3']
+    for name, rendition_height, video_kbps, audio_kbps in renditions:
+        rendition_width = round(width * rendition_height / height / 2) * 2
+        bandwidth = (video_kbps + (audio_kbps if has_audio else 0)) * 1000
+        lines.append(f'#EXT-X-STREAM-INF:BANDWIDTH={bandwidth},RESOLUTION={rendition_width}x{rendition_height}')
+        lines.append(f'{name}.m3u8')
+    with open(os.path.join(output_dir, MASTER_PLAYLIST), 'w') as file:
+        file.write('\n'.join(lines) + '\n')
+
+    names = sorted(name for name in os.listdir(output_dir) if name != MASTER_PLAYLIST)
+    return [MASTER_PLAYLIST] + names
+
+
+def delete_hls_files(storage, directory):
+    """
+    Deletes the playlists and segments stored in a HLS directory.
+    """
+    if not directory or not storage.exists(directory):
+        return
+    for name in storage.listdir(directory)[1]:
+        storage.delete(f'{directory}/{name}')
@@ -0,0 +1,130 @@
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from PIL import Image, ImageOps
+from rest_framework import serializers
+
+# encoders of each variant: (key, Pillow format, file extension, save options)
+VARIANT_FORMATS = (
+    ('webp', 'WEBP', 'webp', {'quality': 80, 'method': 4}),
+    ('jpeg', 'JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+
+
+def needs_variants(instance, field_name, variants_field):
+    """
+    Checks whether the variants of an image field are missing or were built from another upload.
+    """
+    name = getattr(instance, field_name).name or None
+    variants = getattr(instance, variants_field) or {}
+    return variants.get('source') != name
+
+
+def delete_image_variants(storage, variants):
+    for variant, files in (variants or {}).items():
+        if variant == 'source':
+            continue
+        for name in files.values():
+            storage.delete(name)
+
+
+def remember_image_variants(instance, variants_field):
+    """
+    Reads the stored variants before the instance is deleted, the in-memory value may predate
+    the background build. Call from pre_delete.
+    """
+    stored = type(instance).objects.filter(pk=instance.pk).values_list(variants_field, flat=True).first()
+    setattr(instance, f'_stored_{variants_field}', stored)
+
+
+def delete_image_variants_on_commit(instance, field_name, variants_field):
+    """
+    Deletes the variant files of a deleted instance once the transaction commits. Call from post_delete.
+    """
+    variants = getattr(instance, f'_stored_{variants_field}', None) or getattr(instance, variants_field)
+    if variants:
+        storage = getattr(instance, field_name).storage
+        transaction.on_commit(lambda: delete_image_variants(storage, variants))
+
+
+def build_image_variants(instance, field_name, variants_field, specs):
+    """
+    Generates fixed-size WebP and JPEG variants of an image field next to the original
+    and stores their names in the variants JSON field:
+
+        {'source': 'original.png', 'card': {'webp': 'original_card.webp', 'jpeg': 'original_card.jpg'}, ...}
+
+    specs maps a variant name to its (width, height), images are cropped to fill the size.
+    The previous variants are deleted.
+    """
+    field_file = getattr(instance, field_name)
+    storage = field_file.storage
+    delete_image_variants(storage, getattr(instance, variants_field))
+
+    variants = {}
+    if field_file:
+        with field_file.open('rb') as file:
+            image = ImageOps.exif_transpose(Image.open(file))
+            image.load()
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+        base = os.path.splitext(field_file.name)[0]
+        variants['source'] = field_file.name
+        for variant, size in specs.items():
+            resized = ImageOps.fit(image, size, Image.Resampling.LANCZOS)
+            variants[variant] = {}
+            for key, image_format, extension, options in VARIANT_FORMATS:
+                output = resized.convert('RGB') if image_format == 'JPEG' else resized
+                buffer = BytesIO()
+                output.save(buffer, image_format, **options)
+                name = storage.save(f'{base}_{variant}.{extension}', ContentFile(buffer.getvalue()))
+                variants[variant][key] = name
+
+    # update() skips save() and the post_save signal that scheduled this build
+    type(instance).objects.filter(pk=instance.pk).update(**{variants_field: variants})
+    setattr(instance, variants_field, variants)
+    return variants
+
+
+class ImageVariantsField(serializers.Field):
+    """
+    Read-only field returning the URLs of the image variants:
+
+        {'card': {'webp': url, 'jpeg': url}, 'detail': {...}, ...}
+
+    Returns an empty dict while the variants of the current image are not generated yet.
+    """
+
+    def __init__(self, image_field, **kwargs):
+        self.image_field = image_field
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def get_attribute(self, instance):
+        field_file = getattr(instance, self.image_field)
+        return field_file, super().get_attribute(instance)
+
+    def to_representation(self, value):
+        field_file, variants = value
+        return self.represent(field_file.storage, field_file.name, variants)
+
+    def represent(self, storage, image_name, variants):
+        """
+        Builds the URLs from the stored image name and variants, shared with the values() serializers.
+        """
+        if not image_name or not variants or variants.get('source') != image_name:
+            return {}
+
+        request = self.context.get('request')
+        urls = {}
+        for variant, files in variants.items():
+            if variant == 'source':
+                continue
+            urls[variant] = {}
+            for key, name in files.items():
+                url = storage.url(name)
+                urls[variant][key] = request.build_absolute_uri(url) if request is not None else url
+        return urls
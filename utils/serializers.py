@@ -0,0 +1,259 @@
+import re
+
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.db.models import Expression
+from rest_framework import serializers
+from rest_framework.settings import api_settings
+
+from utils.images import ImageVariantsField
+
+# lookup values that reverse() puts in a URL unchanged, only they can reuse a URL template
+URL_SAFE_RE = re.compile(r'^[A-Za-z0-9_-]+$')
+URL_PLACEHOLDER = 'values-url-placeholder'
+
+# fields whose representation only needs the raw column value
+PLAIN_FIELDS = (
+    serializers.BooleanField, serializers.CharField, serializers.IntegerField, serializers.FloatField,
+    serializers.DecimalField, serializers.DateTimeField, serializers.DateField, serializers.TimeField,
+    serializers.ChoiceField, serializers.JSONField, serializers.DictField, serializers.ReadOnlyField,
+)
+
+
+class ValuesSerializerMixin:
+    """
+    Adds a read-only values() mode to a ModelSerializer.
+
+    The declared fields are compiled into a single `.values()` query, with joins for the related fields
+    and one extra query per nested `many=True` serializer, and rows are turned into dicts by a tight loop.
+    The output is identical to `.data`, without building model instances.
+
+    Fields the compiler can not derive from a column (method fields, properties, `__str__` of a relation)
+    are declared in `Meta.values_sources`:
+
+        values_sources = {
+            'teacher': 'teacher__username',                             # path, represented by the field
+            'created': ('created', lambda value: value.strftime(...)),  # paths and a function of their values
+            'total': Sum('items__price'),                               # expression, represented by the field
+        }
+
+    Function results are represented by the field too, except for SerializerMethodFields.
+    """
+
+    @classmethod
+    def get_values_compiler(cls, context=None):
+        return ValuesCompiler(cls(context=context or {}))
+
+    @classmethod
+    def values_data(cls, queryset, context=None):
+        """
+        Returns the representation of the queryset, like `Serializer(queryset, many=True).data`.
+        """
+        compiler = cls.get_values_compiler(context)
+        return compiler.represent(compiler.values(queryset))
+
+
+class ValuesCompiler:
+    """
+    Compiles the fields of a serializer into the paths of a `.values()` query and the readers building
+    the representation from a row.
+    """
+
+    def __init__(self, serializer, prefix=''):
+        self.serializer = serializer
+        self.model = serializer.Meta.model
+        self.prefix = prefix
+        self.context = serializer.context
+        self.request = self.context.get('request')
+        self.paths = []
+        self.expressions = {}
+        self.children = []
+        self.readers = []
+
+        sources = getattr(serializer.Meta, 'values_sources', {})
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            self.readers.append((name, self.compile_field(name, field, sources.get(name))))
+
+    def path(self, source):
+        path = self.prefix + source.replace('.', '__')
+        if path not in self.paths:
+            self.paths.append(path)
+        return path
+
+    def compile_field(self, name, field, source):
+        if source is not None:
+            return self.compile_source(name, field, source)
+        if isinstance(field, serializers.HyperlinkedIdentityField):
+            return self.compile_url(field)
+        if isinstance(field, ImageVariantsField):
+            return self.compile_image_variants(field)
+        if isinstance(field, serializers.ListSerializer):
+            return self.compile_many(name, field)
+        if isinstance(field, serializers.Serializer):
+            return self.compile_nested(name, field)
+        if isinstance(field, serializers.FileField):
+            return self.compile_file(field)
+        if isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None:
+            return self.compile_value(self.path(field.source), lambda value: value)
+        if isinstance(field, PLAIN_FIELDS) and self.is_column(field.source):
+            return self.compile_value(self.path(field.source), field.to_representation)
+        raise ImproperlyConfigured(
+            f'{type(self.serializer).__name__}.{name} can not be read from a column, '
+            f'declare it in Meta.values_sources.'
+        )
+
+    def is_column(self, source):
+        model = self.model
+        parts = source.split('.')
+        for index, part in enumerate(parts):
+            try:
+                model_field = model._meta.get_field(part)
+            except FieldDoesNotExist:
+                return False
+            if index < len(parts) - 1:
+                if not model_field.many_to_one and not model_field.one_to_one:
+                    return False
+                model = model_field.related_model
+            elif model_field.is_relation:
+                return False
+        return True
+
+    def compile_source(self, name, field, source):
+        if isinstance(source, Expression):
+            if self.prefix:
+                raise ImproperlyConfigured(f'{name}: expressions are not supported in nested serializers.')
+            alias = f'_values_{name}'
+            self.expressions[alias] = source
+            return self.compile_value(alias, field.to_representation)
+
+        if isinstance(source, str):
+            return self.compile_value(self.path(source), field.to_representation)
+
+        *paths, function = source
+        paths = [self.path(path) for path in paths]
+        if isinstance(field, serializers.SerializerMethodField):
+            return lambda row: function(*[row[path] for path in paths])
+
+        def read(row):
+            value = function(*[row[path] for path in paths])
+            return None if value is None else field.to_representation(value)
+        return read
+
+    @staticmethod
+    def compile_value(path, to_representation):
+        def read(row):
+            value = row[path]
+            return None if value is None else to_representation(value)
+        return read
+
+    def compile_file(self, field):
+        path = self.path(field.source)
+        storage = self.model_field(field.source).storage
+        use_url = getattr(field, 'use_url', api_settings.UPLOADED_FILES_USE_URL)
+        request = self.request
+
+        def read(row):
+            name = row[path]
+            if not name:
+                return None
+            if not use_url:
+                return name
+            url = storage.url(name)
+            return request.build_absolute_uri(url) if request is not None else url
+        return read
+
+    def compile_image_variants(self, field):
+        image_path = self.path(field.image_field)
+        variants_path = self.path(field.source)
+        storage = self.model_field(field.image_field).storage
+        return lambda row: field.represent(storage, row[image_path], row[variants_path])
+
+    def compile_url(self, field):
+        path = self.path(field.lookup_field)
+        kwargs_name = field.lookup_url_kwarg
+        format = self.context.get('format')
+
+        def reverse(value):
+            return field.reverse(field.view_name, kwargs={kwargs_name: value}, request=self.request, format=format)
+
+        # one reverse() for the whole result, the lookup value is put in its place in the URL
+        template = reverse(URL_PLACEHOLDER)
+        if template.count(URL_PLACEHOLDER) != 1:
+            template = None
+
+        def read(row):
+            value = row[path]
+            if value in (None, ''):
+                return None
+            value = str(value)
+            if template is not None and URL_SAFE_RE.match(value):
+                return template.replace(URL_PLACEHOLDER, value)
+            return reverse(value)
+        return read
+
+    def compile_nested(self, name, field):
+        if not isinstance(field, ValuesSerializerMixin):
+            raise ImproperlyConfigured(f'{name}: nested serializers must use ValuesSerializerMixin.')
+        nested = ValuesCompiler(field, prefix=f'{self.prefix}{field.source}__')
+        pk_path = self.path(f'{field.source}__pk')
+        for path in nested.paths:
+            if path not in self.paths:
+                self.paths.append(path)
+        self.children.extend(nested.children)
+        return lambda row: None if row[pk_path] is None else nested.represent_row(row)
+
+    def compile_many(self, name, field):
+        child = field.child
+        if self.prefix:
+            raise ImproperlyConfigured(f'{name}: nested many=True serializers are only supported at the top level.')
+        if not isinstance(child, ValuesSerializerMixin):
+            raise ImproperlyConfigured(f'{name}: nested serializers must use ValuesSerializerMixin.')
+
+        relation = self.model._meta.get_field(field.source)
+        foreign_key = relation.field.name
+        compiler = ValuesCompiler(child)
+        pk_path = self.path('pk')
+        many = {'compiler': compiler, 'model': relation.related_model, 'foreign_key': foreign_key, 'rows': {}}
+        self.children.append(many)
+        return lambda row: [compiler.represent_row(item) for item in many['rows'].get(row[pk_path], ())]
+
+    def model_field(self, source):
+        model = self.model
+        parts = source.split('.')
+        for part in parts[:-1]:
+            model = model._meta.get_field(part).related_model
+        return model._meta.get_field(parts[-1])
+
+    def values(self, queryset, extra=()):
+        """
+        Returns the `.values()` queryset of the compiled paths, `extra` adds columns such as the pagination keys.
+        """
+        paths = list(self.paths)
+        for path in extra:
+            if path not in paths:
+                paths.append(path)
+        if self.expressions:
+            queryset = queryset.annotate(**self.expressions)
+            paths.extend(self.expressions)
+        return queryset.values(*paths)
+
+    def represent_row(self, row):
+        return {name: read(row) for name, read in self.readers}
+
+    def represent(self, rows):
+        """
+        Builds the representation of the rows, loading the nested `many=True` relations first.
+        """
+        rows = list(rows)
+        for many in self.children:
+            foreign_key = many['foreign_key']
+            pks = {row['pk'] for row in rows}
+            related = many['model']._default_manager.filter(**{f'{foreign_key}__in': pks})
+            if not related.ordered:
+                related = related.order_by('pk')
+            grouped = {}
+            for item in many['compiler'].values(related, extra=[foreign_key]):
+                grouped.setdefault(item[foreign_key], []).append(item)
+            many['rows'] = grouped
+        return [self.represent_row(row) for row in rows]
@@ -0,0 +1,131 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeFile:
+    """
+    File wrapper that reads at most `length` bytes starting at `start`.
+    Keeps `fileno()` so WSGI servers with sendfile support (e.g. gunicorn) still send the
+    range zero-copy from the current offset, bounded by the Content-Length header.
+    """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.name = file.name
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    Parses a single `bytes=start-end` range.
+    Returns (start, end) inclusive, None when the header should be ignored,
+    or False when the range can not be satisfied.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        # malformed or multiple ranges: serve the whole file
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+
+    if not first:
+        # suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def if_range_matches(request, etag, last_modified):
+    """
+    Checks the If-Range validator, a missing header always matches.
+    """
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == int(last_modified)
+
+
+def stream_file(request, field_file):
+    """
+    Serves a stored file with conditional GET and HTTP Range support.
+    With the SENDFILE_BACKEND setting the transfer is handed to the front proxy
+    (`nginx`: X-Accel-Redirect, `apache`: X-Sendfile), which handles ranges itself.
+    Otherwise the file, or the requested byte range, is returned as a FileResponse.
+    """
+    path = field_file.path
+    stat = os.stat(path)
+    size, last_modified = stat.st_size, stat.st_mtime
+    etag = f'"{size:x}-{int(last_modified * 1_000_000):x}"'
+
+    response = get_conditional_response(request, etag=etag, last_modified=int(last_modified))
+    if response is not None:
+        return response
+
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    backend = getattr(settings, 'SENDFILE_BACKEND', None)
+
+    if backend == 'nginx':
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = f"{settings.SENDFILE_URL.rstrip('/')}/{quote(field_file.name)}"
+    elif backend == 'apache':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = path
+    else:
+        byte_range = None
+        range_header = request.META.get('HTTP_RANGE')
+        if range_header and if_range_matches(request, etag, last_modified):
+            byte_range = parse_range(range_header, size)
+
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+        if byte_range is None:
+            response = FileResponse(open(path, 'rb'), content_type=content_type)
+        else:
+            start, end = byte_range
+            length = end - start + 1
+            response = FileResponse(RangeFile(open(path, 'rb'), start, length), status=206,
+                                    content_type=content_type)
+            response['Content-Length'] = length
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
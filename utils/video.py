@@ -0,0 +1,219 @@
+import logging
+import multiprocessing
+import os
+import struct
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Matroska / WebM element ids
+EBML_HEADER_ID = 0x1A45DFA3
+SEGMENT_ID = 0x18538067
+INFO_ID = 0x1549A966
+CLUSTER_ID = 0x1F43B675
+TIMECODE_SCALE_ID = 0x2AD7B1
+DURATION_ID = 0x4489
+
+
+def available_cores():
+    """
+    Returns the number of cores this process may run on.
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def _iter_mp4_boxes(file, start, end):
+    """
+    Yields (type, body_start, box_end) for the ISO BMFF boxes between start and end.
+    """
+    offset = start
+    while offset + 8 <= end:
+        file.seek(offset)
+        size, kind = struct.unpack('>I4s', file.read(8))
+        header_size = 8
+        if size == 1:
+            size = struct.unpack('>Q', file.read(8))[0]
+            header_size = 16
+        elif size == 0:
+            size = end - offset
+        if size < header_size:
+            return
+        yield kind, offset + header_size, offset + size
+        offset += size
+
+
+def _mp4_duration(file, end):
+    """
+    Reads the duration in seconds from the `moov/mvhd` box of an MP4/MOV file.
+    """
+    for kind, body_start, box_end in _iter_mp4_boxes(file, 0, end):
+        if kind != b'moov':
+            continue
+        for child, child_start, _ in _iter_mp4_boxes(file, body_start, box_end):
+            if child != b'mvhd':
+                continue
+            file.seek(child_start)
+            version = file.read(4)[0]
+            if version == 1:
+                file.seek(16, os.SEEK_CUR)  # creation and modification time
+                timescale, duration = struct.unpack('>IQ', file.read(12))
+            else:
+                file.seek(8, os.SEEK_CUR)
+                timescale, duration = struct.unpack('>II', file.read(8))
+            return duration / timescale if timescale else None
+        return None
+    return None
+
+
+def _read_ebml_id(file):
+    first = file.read(1)
+    if not first:
+        raise EOFError
+    length = 1
+    while length <= 4 and not first[0] & (0x80 >> (length - 1)):
+        length += 1
+    if length > 4:
+        raise ValueError('invalid EBML id')
+    return int.from_bytes(first + file.read(length - 1), 'big')
+
+
+def _read_ebml_size(file):
+    """
+    Returns the element data size, None for an unknown size.
+    """
+    first = file.read(1)
+    if not first:
+        raise EOFError
+    length = 1
+    while length <= 8 and not first[0] & (0x80 >> (length - 1)):
+        length += 1
+    if length > 8:
+        raise ValueError('invalid EBML size')
+    value = first[0] & (0xFF >> length)
+    rest = file.read(length - 1)
+    value = int.from_bytes(bytes([value]) + rest, 'big')
+    if value == (1 << (7 * length)) - 1:
+        return None
+    return value
+
+
+def _matroska_duration(file, end):
+    """
+    Reads the duration in seconds from the Segment Info of a Matroska/WebM file.
+    """
+    file.seek(0)
+    while file.tell() < end:
+        element_id, size = _read_ebml_id(file), _read_ebml_size(file)
+        if element_id == SEGMENT_ID:
+            # descend into the segment, its size may be unknown for live recordings
+            continue
+        if element_id == CLUSTER_ID or size is None:
+            return None
+        if element_id != INFO_ID:
+            file.seek(size, os.SEEK_CUR)
+            continue
+
+        info_end = file.tell() + size
+        timecode_scale, duration = 1_000_000, None
+        while file.tell() < info_end:
+            child_id, child_size = _read_ebml_id(file), _read_ebml_size(file)
+            if child_size is None:
+                return None
+            data = file.read(child_size)
+            if child_id == TIMECODE_SCALE_ID:
+                timecode_scale = int.from_bytes(data, 'big')
+            elif child_id == DURATION_ID:
+                duration = struct.unpack('>f' if child_size == 4 else '>d', data)[0]
+        if duration is None:
+            return None
+        return duration * timecode_scale / 1_000_000_000
+    return None
+
+
+def read_container_duration(file):
+    """
+    Returns the duration in seconds of an MP4/MOV or Matroska/WebM file object by reading only
+    the container metadata, None when the format is not recognized or carries no duration.
+    The file position is restored afterwards.
+    """
+    position = file.tell()
+    try:
+        file.seek(0, os.SEEK_END)
+        end = file.tell()
+        file.seek(0)
+        head = file.read(8)
+        if len(head) < 8:
+            return None
+        if struct.unpack('>I', head[:4])[0] == EBML_HEADER_ID:
+            return _matroska_duration(file, end)
+        if head[4:8] in (b'ftyp', b'moov', b'mdat', b'free', b'skip', b'wide', b'pnot'):
+            return _mp4_duration(file, end)
+        return None
+    except (EOFError, ValueError, IndexError, struct.error):
+        return None
+    finally:
+        file.seek(position)
+
+
+def _to_minutes(seconds):
+    return round(seconds / 60, 2)
+
+
+def probe_file_duration(file):
+    """
+    Returns the duration in minutes of an open video file object from its container metadata,
+    None if the container can not be parsed.
+    """
+    duration = read_container_duration(file)
+    return None if duration is None else _to_minutes(duration)
+
+
+def probe_duration(path):
+    """
+    Returns the duration of the video at path in minutes, rounded to two decimals.
+    Reads the container metadata and falls back to decoding with moviepy for other formats.
+    Returns 0 if the file can not be read.
+    """
+    try:
+        with open(path, 'rb') as file:
+            duration = probe_file_duration(file)
+        if duration is not None:
+            return duration
+
+        from moviepy import VideoFileClip
+
+        clip = VideoFileClip(path)
+        duration = clip.duration
+        clip.close()
+        return _to_minutes(duration)
+    except Exception:
+        logger.exception('Error processing video file %s', path)
+        return 0
+
+
+def probe_durations(paths, max_workers=None):
+    """
+    Probes the durations of several videos.
+    Container metadata is read in process, only the files that need decoding are probed
+    in parallel on a process pool sized to the available cores.
+    Returns the durations in minutes, in the order of paths.
+    """
+    paths = list(paths)
+    durations = []
+    for path in paths:
+        with open(path, 'rb') as file:
+            durations.append(probe_file_duration(file))
+
+    pending = [index for index, duration in enumerate(durations) if duration is None]
+    if len(pending) == 1:
+        durations[pending[0]] = probe_duration(paths[pending[0]])
+    elif pending:
+        max_workers = min(len(pending), max_workers or available_cores())
+        # spawn instead of fork, forking a multithreaded worker can deadlock the children
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as executor:
+            for index, duration in zip(pending, executor.map(probe_duration, [paths[i] for i in pending])):
+                durations[index] = duration
+    return durations